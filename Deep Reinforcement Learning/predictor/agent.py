@@ -2,19 +2,28 @@ import random
 import numpy as np
 import pandas as pd
 from collections import deque
-import tensorflow as tf
-print("Num GPUs Available: ", len(tf.config.list_physical_devices('GPU')))
-tf.config.optimizer.set_jit(True)
-from tensorflow import keras
-from keras.layers import Dense, LSTM
-from keras.models import Sequential, clone_model
-import keras.backend as K
 import os
 
+# TensorFlow takes seconds to import: it is imported by the first DQLAgent, not with this module
+tf = keras = Dense = LSTM = Sequential = clone_model = K = None
+
+def import_tensorflow():
+    global tf, keras, Dense, LSTM, Sequential, clone_model, K
+    if tf is not None:
+        return
+    import tensorflow as tf
+    print("Num GPUs Available: ", len(tf.config.list_physical_devices('GPU')))
+    tf.config.optimizer.set_jit(True)
+    from tensorflow import keras
+    from keras.layers import Dense, LSTM
+    from keras.models import Sequential, clone_model
+    import keras.backend as K
+
 
 class DQLAgent:
     def __init__(self, hidden_units, learning_rate, batch,
                  train_env, test_env):
+        import_tensorflow()
         self.train_env = train_env
         self.test_env = test_env
         self.epsilon = 1.0 # Représente la probabilité de décision aléatoire
@@ -7,8 +7,6 @@ from pathlib import Path
 #from .enums import *
 import numpy as np
 import pandas as pd
-import yfinance as yf
-from scipy.stats import t
 from datetime import *
 import urllib.request
 import zipfile
@@ -49,6 +47,9 @@ class YahooDownloader:
             7 columns: A date, open, high, low, close, volume and tick symbol
             for the specified stock ticker
         """
+        # yfinance is only needed (and imported) when data is downloaded from Yahoo
+        import yfinance as yf
+
         # Download and save the data in a pandas DataFrame:
         data_df = pd.DataFrame()
         num_failures = 0
@@ -295,6 +296,7 @@ class LocalDataLoader:
       std_dev = int(self.ticker.split('_')[-1])
 
             # Generate returns
+      from scipy.stats import t  # scipy is only needed for the noisy artificial series
       noise = t.rvs(dof, size=n_points)
 
             # Scale and shift the returns
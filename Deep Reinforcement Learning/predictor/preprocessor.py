@@ -6,16 +6,24 @@ import re
 import numpy as np
 import pandas as pd
 from .utils import min_max_scaling, z_scaling, no_scaling
-import talib
 import pandas as pd
 import numpy as np
 import re
 import logging
 logger = logging.getLogger(__name__)
 
+# TA-Lib is imported by the first UserStatsCalculator, not with this module
+talib = None
+
+def import_talib():
+    global talib
+    if talib is None:
+        import talib
+
 
 class UserStatsCalculator:
     def __init__(self):
+        import_talib()
         self.features_dict = {
             'deltaSma': self._compute_delta_sma,
             'ratioSma': self._compute_ratio_sma,
@@ -1,5 +1,4 @@
 import os
-import altair as alt
 import pandas as pd
 
 
@@ -23,6 +22,9 @@ def min_max_scaling(df, feature):
     return df
 
 def visualize(data, title="Trading Session"):
+    # altair is only needed (and imported) to draw the charts
+    import altair as alt
+
     # Ensure data is a DataFrame and has the necessary columns
     #if not isinstance(data, pd.DataFrame) or not all(col in data.columns for col in ['close', 'date', 'position', 'action']):
     #    raise ValueError("Data must be a DataFrame with 'close', 'date', 'position', and 'action' columns")
@@ -3,46 +3,389 @@ This script contains the code for the API communication.
 """
 from datetime import datetime
 import os
-import ccxt
+import json
+import time
+import queue
+import atexit
 import logging
 import sqlite3
+import threading
 import pandas as pd
-import plotly.graph_objects as go
 
-import dontshare_config as dc
+import events
+import exchanges
+from lazy import lazy_import
+from balance import BalanceCache
+from candle_store import (CandleStore, arrays_to_dataframe, candles_to_arrays, get_candle_start,
+                          timeframe_to_milliseconds, to_milliseconds)
+
+# ccxt and plotly are only imported when an exchange is called or a figure is drawn
+ccxt = lazy_import('ccxt')
+go = lazy_import('plotly.graph_objects')
+
+DATABASE = 'log_base.db'
+
+class LogWriter:
+    def __init__(self, path=DATABASE, batch_size=500, flush_interval=0.5, max_queue=10000):
+        """
+        Initialize a LogWriter object, which writes to the database from a background thread.
+
+        Writes are queued and inserted in batches over one long-lived connection in WAL
+        mode, committed when batch_size rows are waiting or every flush_interval seconds.
+
+        :param path: Path of the SQLite database.
+        :param batch_size: Maximum number of rows per transaction.
+        :param flush_interval: Maximum time, in seconds, a row waits before being committed.
+        :param max_queue: Maximum number of waiting rows, callers block when it is reached.
+        """
+        self.path = path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, sql, params):
+        """
+        Queue a statement to be executed by the writer thread.
+
+        :param sql: SQL statement with ? placeholders.
+        :param params: Tuple of parameters.
+        """
+        self._queue.put((sql, [params]))
+
+    def write_many(self, sql, rows):
+        """
+        Queue a statement to be executed once per row by the writer thread.
+
+        :param sql: SQL statement with ? placeholders.
+        :param rows: List of tuples of parameters.
+        """
+        self._queue.put((sql, list(rows)))
+
+    def flush(self):
+        """
+        Wait until every queued statement is committed.
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """
+        Commit the queued statements and stop the writer thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        batch = []
+        waiters = []
+        running = True
+
+        while running:
+            try:
+                item = self._queue.get()
+                deadline = time.monotonic() + self._flush_interval
+                rows = 0
+                while item is not None and not isinstance(item, threading.Event):
+                    batch.append(item)
+                    rows += len(item[1])
+                    if rows >= self._batch_size:
+                        break
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                running = False
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+
+            self._commit(conn, batch)
+            batch = []
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+        conn.close()
+
+    def _commit(self, conn, batch):
+        # Consecutive rows of the same statement are inserted with a single executemany
+        try:
+            start = 0
+            for end in range(1, len(batch) + 1):
+                if end == len(batch) or batch[end][0] != batch[start][0]:
+                    conn.executemany(batch[start][0], [params for _, rows in batch[start:end] for params in rows])
+                    start = end
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.warning(f"Could not write {sum(len(rows) for _, rows in batch)} rows to the database: {e}")
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def get_log_writer():
+    """
+    Get the log writer of the database of the current directory, starting it if needed.
 
-def create_database():
-    conn = sqlite3.connect('log_base.db')
-    cursor = conn.cursor()
+    :return: LogWriter object.
+    """
+    global _log_writer
+    path = os.path.abspath(DATABASE)
+    with _log_writer_lock:
+        if _log_writer is None or _log_writer.path != path:
+            if _log_writer is not None:
+                _log_writer.close()
+            _log_writer = LogWriter(path)
+        return _log_writer
+
+def flush_logs():
+    """
+    Wait until every queued log is written to the database.
+    """
+    if _log_writer is not None:
+        _log_writer.flush()
 
-    cursor.execute(f"DROP TABLE IF EXISTS logs")
+def close_logs():
+    """
+    Write the queued logs and stop the log writer.
+    """
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is not None:
+            _log_writer.close()
+            _log_writer = None
+
+atexit.register(close_logs)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS logs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+        name TEXT NOT NULL,
+        date TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS backtest_runs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        strategy TEXT NOT NULL,
+        pair TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        params TEXT NOT NULL,
+        since INTEGER,
+        until INTEGER,
+        initial_value REAL NOT NULL,
+        final_value REAL,
+        trades INTEGER,
+        created_at INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS signals(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id INTEGER REFERENCES backtest_runs(id),
+        pair TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        side TEXT NOT NULL CHECK (side IN ('buy', 'sell')),
+        price REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS signals_run_timestamp ON signals(run_id, timestamp);
+    CREATE INDEX IF NOT EXISTS signals_pair_timestamp ON signals(pair, timestamp);
+
+    CREATE TABLE IF NOT EXISTS equity_points(
+        run_id INTEGER NOT NULL REFERENCES backtest_runs(id),
+        timestamp INTEGER NOT NULL,
+        value REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS equity_points_run_timestamp ON equity_points(run_id, timestamp);
+
+    CREATE TABLE IF NOT EXISTS orders(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_order_id TEXT UNIQUE NOT NULL,
+        exchange_order_id TEXT,
+        pair TEXT NOT NULL,
+        side TEXT NOT NULL CHECK (side IN ('buy', 'sell')),
+        type TEXT NOT NULL,
+        amount REAL NOT NULL,
+        price REAL,
+        status TEXT NOT NULL,
+        timestamp INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS orders_pair_timestamp ON orders(pair, timestamp);
+
+    CREATE TABLE IF NOT EXISTS fills(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_order_id TEXT NOT NULL REFERENCES orders(client_order_id),
+        pair TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        price REAL NOT NULL,
+        amount REAL NOT NULL,
+        fee REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS fills_pair_timestamp ON fills(pair, timestamp);
+    CREATE INDEX IF NOT EXISTS fills_order ON fills(client_order_id);
+'''
 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS logs(
-            id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
-            name TEXT NOT NULL,
-            date TEXT NOT NULL
-        );
-    ''')
+def create_database():
+    """
+    Create the tables and indexes of the database if they do not exist yet.
 
+    The data of the previous runs is kept.
+    """
+    flush_logs()
+    conn = sqlite3.connect(DATABASE)
+    conn.executescript(SCHEMA)
     conn.commit()
     conn.close()
 
 def add_data(name, date):
-    # Establish connection to the database
-    conn = sqlite3.connect('log_base.db')
-    cursor = conn.cursor()
+    # Queue the row, the writer thread inserts it with the next batch
+    get_log_writer().write('''INSERT INTO logs (name, date) VALUES (?, ?)''', (name, date))
 
-    # Insert data into the table
-    cursor.execute('''INSERT INTO logs (name, date) VALUES (?, ?)''', (name, date))
+def add_backtest_run(strategy, pair, timeframe, params, since=None, until=None, initial_value=1000):
+    """
+    Insert a backtest run and get its id.
 
-    # Commit the changes and close the connection
+    :param strategy: Name of the strategy class.
+    :param pair: Trading pair symbol.
+    :param timeframe: Timeframe of the backtest.
+    :param params: Dictionary of the strategy parameters.
+    :param since: Start of the backtest in milliseconds.
+    :param until: End of the backtest in milliseconds.
+    :param initial_value: Portfolio value before the first trade.
+    :return: Id of the run.
+    """
+    create_database()
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.execute(
+        '''INSERT INTO backtest_runs (strategy, pair, timeframe, params, since, until, initial_value, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+        (strategy, pair, timeframe, json.dumps(params, sort_keys=True), since, until, initial_value,
+         int(time.time() * 1000)))
     conn.commit()
     conn.close()
+    return cursor.lastrowid
+
+def finish_backtest_run(run_id, final_value, trades):
+    """
+    Record the result of a backtest run.
+
+    :param run_id: Id of the run.
+    :param final_value: Portfolio value after the last trade.
+    :param trades: Number of closed trades.
+    """
+    get_log_writer().write('''UPDATE backtest_runs SET final_value = ?, trades = ? WHERE id = ?''',
+                           (float(final_value), int(trades), run_id))
+
+def add_signals(run_id, pair, signals):
+    """
+    Queue buy and sell signals.
+
+    :param run_id: Id of the backtest run, None for live trading.
+    :param pair: Trading pair symbol.
+    :param signals: Iterable of (timestamp in milliseconds, 'buy' or 'sell', price) tuples.
+    """
+    get_log_writer().write_many('''INSERT INTO signals (run_id, pair, timestamp, side, price) VALUES (?, ?, ?, ?, ?)''',
+                                [(run_id, pair, int(timestamp), side, float(price)) for timestamp, side, price in signals])
+
+def add_equity_points(run_id, points):
+    """
+    Queue points of the equity curve of a backtest run.
+
+    :param run_id: Id of the backtest run.
+    :param points: Iterable of (timestamp in milliseconds, portfolio value) tuples.
+    """
+    rows = [(run_id, int(timestamp), float(value)) for timestamp, value in points]
+    get_log_writer().write_many('''INSERT INTO equity_points (run_id, timestamp, value) VALUES (?, ?, ?)''', rows)
+    if rows:
+        events.publish('equity', {'run_id': run_id, 'timestamp': rows[-1][1], 'value': rows[-1][2]})
+
+def add_order(client_order_id, pair, side, order_type, amount, price, status, timestamp, exchange_order_id=None):
+    """
+    Queue an order, or update its status if the client order id is already known.
+
+    :param client_order_id: Unique id of the order on our side.
+    :param pair: Trading pair symbol.
+    :param side: 'buy' or 'sell'.
+    :param order_type: 'market' or 'limit'.
+    :param amount: Amount of the order.
+    :param price: Limit price, None for market orders.
+    :param status: Status of the order (e.g., 'submitted', 'open', 'closed').
+    :param timestamp: Time of the status in milliseconds.
+    :param exchange_order_id: Id of the order on the exchange.
+    """
+    get_log_writer().write(
+        '''INSERT INTO orders (client_order_id, exchange_order_id, pair, side, type, amount, price, status, timestamp)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(client_order_id) DO UPDATE SET
+               status = excluded.status,
+               timestamp = excluded.timestamp,
+               exchange_order_id = coalesce(excluded.exchange_order_id, exchange_order_id)''',
+        (client_order_id, exchange_order_id, pair, side, order_type, amount, price, status, int(timestamp)))
+    balances.invalidate()
+    events.publish('order', {'client_order_id': client_order_id, 'pair': pair, 'side': side, 'status': status,
+                             'timestamp': int(timestamp)})
+
+def add_fill(client_order_id, pair, timestamp, price, amount, fee=0.0):
+    """
+    Queue a fill of an order.
+
+    :param client_order_id: Unique id of the order on our side.
+    :param pair: Trading pair symbol.
+    :param timestamp: Time of the fill in milliseconds.
+    :param price: Price of the fill.
+    :param amount: Amount filled.
+    :param fee: Fee paid for the fill.
+    """
+    get_log_writer().write('''INSERT INTO fills (client_order_id, pair, timestamp, price, amount, fee) VALUES (?, ?, ?, ?, ?, ?)''',
+                           (client_order_id, pair, int(timestamp), float(price), float(amount), float(fee)))
+    balances.invalidate()
+    events.publish('fill', {'client_order_id': client_order_id, 'pair': pair, 'timestamp': int(timestamp),
+                            'price': float(price), 'amount': float(amount)})
+
+def query(sql, params=()):
+    """
+    Run a read query on the database, once the queued writes are committed.
+
+    :param sql: SQL query with ? placeholders.
+    :param params: Tuple of parameters.
+    :return: Pandas DataFrame with the result.
+    """
+    flush_logs()
+    conn = sqlite3.connect(DATABASE)
+    df = pd.read_sql_query(sql, conn, params=params)
+    conn.close()
+    return df
+
+def get_equity_curve(run_id):
+    """
+    Get the equity curve of a backtest run.
+
+    :param run_id: Id of the backtest run.
+    :return: Pandas DataFrame with timestamp and value columns.
+    """
+    return query('''SELECT timestamp, value FROM equity_points WHERE run_id = ? ORDER BY timestamp''', (int(run_id),))
+
+def get_signals(pair, since, until):
+    """
+    Get the signals of a pair in a [since, until) range.
+
+    :param pair: Trading pair symbol.
+    :param since: Start of the range in milliseconds.
+    :param until: End of the range in milliseconds, excluded.
+    :return: Pandas DataFrame of signals.
+    """
+    return query('''SELECT * FROM signals WHERE pair = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp''',
+                 (pair, int(since), int(until)))
 
 def print_dataset():
-    # Establish connection to the database
-    conn = sqlite3.connect('log_base.db')
+    # Establish connection to the database, once the queued logs are written
+    flush_logs()
+    conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
 
     # Execute a SELECT query to retrieve data from the database
@@ -59,8 +402,9 @@ def print_dataset():
     conn.close()
 
 def get_last_data():
-    # Establish connection to the database
-    conn = sqlite3.connect('log_base.db')
+    # Establish connection to the database, once the queued logs are written
+    flush_logs()
+    conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
 
     # Execute a SELECT query to retrieve data from the database
@@ -75,37 +419,45 @@ def get_last_data():
     # Close the connection
     conn.close()
 
-# Create an instance of the Mexc client
-mexc = ccxt.mexc({
-    'apiKey': dc.API_KEY_MEXC,  # Public API key
-    'secret': dc.API_SECRET_MEXC,  # Private API key
-    'enableRateLimit': True,
-})
-
-# Create an instance of the Mexc FUTURES client
-mexc_futures = ccxt.mexc({
-    'apiKey': dc.API_KEY_MEXC,
-    'secret': dc.API_SECRET_MEXC,
-    'enableRateLimit': True,
-    "options": {'defaultType': 'swap'}  # Set account type to FUTURES
-})
-
-# Create an instance of the Binance client
-binance = ccxt.binance({
-    'apiKey': dc.API_KEY_BINANCE,
-    'secret': dc.API_SECRET_BINANCE,
-    'enableRateLimit': True,
-})
-
-# Create an instance of the Coinbase client
-coinbase = ccxt.coinbase({
-    'apiKey': dc.API_KEY_COINBASE,
-    'secret': dc.API_SECRET_COINBASE,
-    'enableRateLimit': True,
-})
-
-# Choose the exchange on which operations are performed
-exchange = mexc
+# The exchange clients (mexc, mexc_futures, binance, coinbase) are built on first use
+# by exchanges.registry; api.exchange, api.mexc... are still available (see __getattr__)
+def __getattr__(name):
+    if name == 'exchange':
+        return exchanges.registry.get()
+    if name in exchanges.registry.get_names():
+        return exchanges.registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_exchange(client=None):
+    """
+    Get the exchange client on which an operation is performed.
+
+    :param client: Name of a client of exchanges.registry (e.g., 'binance'), a ccxt exchange,
+                   or None for the default exchange (api.exchange if it was assigned).
+    :return: ccxt exchange.
+    """
+    if client is None:
+        return globals().get('exchange') or exchanges.registry.get()
+    if isinstance(client, str):
+        return exchanges.registry.get(client)
+    return client
+
+# Local storage of the historical candles, one series per (exchange, pair, timeframe)
+candle_store = CandleStore()
+
+def fetch_balance(client=None):
+    """
+    Fetch the balance of the account, sharing the call with the concurrent callers (see market_data.cache).
+
+    :param client: Exchange to use (see get_exchange), the default one if None.
+    :return: Balance in the ccxt format.
+    """
+    # market_data imports this module
+    import market_data
+    return market_data.cache.fetch_balance(client)
+
+# Balance of the account on the exchange, fetched again after 5 s or after one of our orders
+balances = BalanceCache(fetch_balance)
 
 def get_info_account():
     """
@@ -117,21 +469,15 @@ def get_info_account():
     add_data("Plotting info account", str(datetime.now()))
     
     try:
-        balance = exchange.fetch_balance()
+        rows = balances.get_all()
 
         account_info = {
-            'Currency': [],
-            'Total': [],
-            'Free': [],
-            'Used': [],
+            'Currency': list(rows),
+            'Total': [row['Total'] for row in rows.values()],
+            'Free': [row['Free'] for row in rows.values()],
+            'Used': [row['Used'] for row in rows.values()],
         }
 
-        for currency, data in balance['total'].items():
-            account_info['Currency'].append(currency)
-            account_info['Total'].append(data)
-            account_info['Free'].append(balance['free'][currency])
-            account_info['Used'].append(balance['used'][currency])
-
         df_account = pd.DataFrame(account_info)
 
         return df_account
@@ -152,41 +498,36 @@ def get_info_account():
 def plot_info_account(df_account):
      table_trace = go.Table(
      header=dict(values=df_account.columns),
-     cells=dict(values=[df_account[col] for col in df_account.columns])
+     cells=dict(values=[df_account[col].tolist() for col in df_account.columns])
      )
      figure = go.Figure(data =[table_trace])
      return figure
 
-def get_ohlcv(symbol, timeframe, since: int | None = None, limit: int | None = None):
+def get_ohlcv(symbol, timeframe, since: int | None = None, limit: int | None = None, client=None,
+              arrays: bool = False):
     """
     Get OHLCV data.
 
+    The ccxt candles are decoded in one pass into typed column arrays (see
+    candle_store.candles_to_arrays), the DataFrame being built from those arrays.
+
     :param symbol: Trading pair symbol.
     :param timeframe: Timeframe for OHLCV data.
     :param since: Timestamp indicating the start time for data retrieval.
     :param limit: Limit the number of data points to retrieve.
-    :return: Pandas DataFrame with OHLCV data.
+    :param client: Exchange to use, name or ccxt exchange (see get_exchange), the default one if None.
+    :param arrays: True to return the column arrays, with int64 timestamps in milliseconds, instead of a DataFrame.
+    :return: Pandas DataFrame with OHLCV data, or dictionary of NumPy arrays if arrays is True.
     """
     logging.info("Fetching data...")
     add_data("Fetching data...", str(datetime.now()))
 
     try:
-        candles = exchange.fetch_ohlcv(symbol, timeframe, since, limit)
-
-        candle_data = []
-
-        for candle in candles:
-            timestamp, open_, high, low, close, volume = candle
-            dt_object = datetime.utcfromtimestamp(timestamp / 1000)  # Convert timestamp to datetime object
-            candle_data.append([dt_object, open_, high, low, close, volume])
-
-        # Create a pandas DataFrame
-        columns = ['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']
-        df = pd.DataFrame(candle_data, columns=columns)
+        candles = candles_to_arrays(get_exchange(client).fetch_ohlcv(symbol, timeframe, since, limit))
         logging.info("Data retrieved")
         add_data("Data retrieved.", str(datetime.now()))
 
-        return df
+        return candles if arrays else arrays_to_dataframe(candles)
 
     except ccxt.NetworkError as e:
         logging.info('Connection problem: ', type(e).__name__, str(e))
@@ -227,7 +568,8 @@ def place_order(symbol="BTC/USDT", direction="short", stop_loss=None, take_profi
 
     try:
         # Place the order
-        order = exchange.create_order(**order_params)
+        order = get_exchange().create_order(**order_params)
+        balances.invalidate()
         logging.info('Order placed successfully:', order)
         add_data("Order placed succesfully.", str(datetime.now()))
 
@@ -254,78 +596,155 @@ def get_quantity(pair, side):
     :param side: Order direction ('buy' or 'sell').
     :return: Quantity of the currency.
     """
-    balance = get_info_account()
-    logging.info(balance['Currency'])
-    add_data(str(balance['Currency']), str(datetime.now()))
-
-    quantity = 0
     base_currency, quote_currency = pair.split("/")
+    currency = base_currency if side == "sell" else quote_currency
 
-    if side == "sell":
+    try:
+        # Dictionary lookup in the cached balance, fetched at most once per TTL
+        row = balances.get(currency)
+    except Exception as e:
+        # Exchange errors and malformed balances alike: the trade loop goes on without funds
+        logging.info(f"Could not get the balance: {type(e).__name__} {e}")
+        add_data("Could not get the balance.", str(datetime.now()))
+        return 0
 
-        if base_currency not in balance['Currency'].values:
-            logging.info(f"{base_currency} not found in the balance.")
-            add_data(f"{base_currency} not found in the balance.", str(datetime.now()))
+    if row is None:
+        logging.info(f"{currency} not found in the balance.")
+        add_data(f"{currency} not found in the balance.", str(datetime.now()))
 
-            return 0
+        return 0
 
-        quantity = balance['Free'][balance['Currency'] == base_currency].values[0]
-        logging.info(f"Quantity of {base_currency} for {side}: {quantity}")
-        add_data(f"Quantity of {base_currency} for {side}: {quantity}", str(datetime.now()))
+    quantity = row['Free'] or 0
+    logging.info(f"Quantity of {currency} for {side}: {quantity}")
+    add_data(f"Quantity of {currency} for {side}: {quantity}", str(datetime.now()))
 
-    elif side == "buy":
+    return quantity
 
-        if quote_currency not in balance['Currency'].values:
-            logging.info(f"{quote_currency} not found in the balance.")
-            add_data(f"{base_currency} not found in the balance.", str(datetime.now()))
+def fetch_range(pair, timeframe, start, end, client=None):
+    """
+    Fetch the candles of [start, end) from the exchange.
 
-            return 0
+    :param pair: Trading pair symbol.
+    :param timeframe: Timeframe for historical data.
+    :param start: Start of the range in milliseconds.
+    :param end: End of the range in milliseconds, excluded.
+    :param client: Exchange to use, name or ccxt exchange (see get_exchange), the default one if None.
+    :return: ccxt OHLCV list.
+    """
+    client = get_exchange(client)
+    duration = timeframe_to_milliseconds(timeframe)
+    from_ts = start
+    ohlcv = []
 
-        quantity = balance['Free'][balance['Currency'] == quote_currency].values[0]
-        logging.info(f"Quantity of {quote_currency} for {side}: {quantity}")
-        add_data(f"Quantity of {base_currency} for {side}: {quantity}", str(datetime.now()))
+    while from_ts < end:
+        logging.info("Downloading...")
+        add_data("Downloading...", str(datetime.now()))
+        new_ohlcv = client.fetch_ohlcv(pair, timeframe, since=from_ts, limit=1000)
+        new_ohlcv = [candle for candle in new_ohlcv if from_ts <= candle[0] < end]
 
+        # Nothing left in the range: the exchange has no candle there
+        if not new_ohlcv:
+            break
 
-    return quantity
+        ohlcv.extend(new_ohlcv)
+        from_ts = new_ohlcv[-1][0] + duration
+
+    return ohlcv
 
-def get_historical_data(pair, timeframe, since):# TODO add gestion of out of range (missing values)
+def get_covered_ranges(ohlcv, timeframe, start, end):
     """
-    Get historical data for backtesting.
+    Get the part of [start, end) which fetch_range really asked the exchange for.
+
+    Paging stops at the first empty page, so the range is only known up to the last
+    candle received: the holes between the received candles are covered, the rest
+    of the range is not.
+
+    :param ohlcv: ccxt OHLCV list returned by fetch_range.
+    :param timeframe: Timeframe of the candles.
+    :param start: Start of the range in milliseconds.
+    :param end: End of the range in milliseconds, excluded.
+    :return: List with the covered (start, end) range, empty if no candle was received.
+
+    Example:
+    >>> get_covered_ranges([[0, 1, 1, 1, 1, 1], [120000, 1, 1, 1, 1, 1]], '1m', 0, 600000)
+    [(0, 180000)]
+    >>> get_covered_ranges([], '1m', 0, 600000)
+    []
+    """
+    if not ohlcv:
+        return []
+    return [(start, min(end, ohlcv[-1][0] + timeframe_to_milliseconds(timeframe)))]
+
+def download_range(pair, timeframe, start, end, client=None):
+    """
+    Download the candles of [start, end) and save them in the candle store.
+
+    :param pair: Trading pair symbol.
+    :param timeframe: Timeframe for historical data.
+    :param start: Start of the range in milliseconds.
+    :param end: End of the range in milliseconds, excluded.
+    :param client: Exchange to use, name or ccxt exchange (see get_exchange), the default one if None.
+    :return: Number of candles downloaded.
+    """
+    client = get_exchange(client)
+    ohlcv = fetch_range(pair, timeframe, start, end, client)
+    candle_store.write(client.id, pair, timeframe, ohlcv,
+                       covered=get_covered_ranges(ohlcv, timeframe, start, end))
+    return len(ohlcv)
+
+def get_missing_ranges(pair, timeframe, since, until=None, client=None):
+    """
+    Get the ranges of [since, until) missing from the candle store.
 
     :param pair: Trading pair symbol.
     :param timeframe: Timeframe for historical data.
     :param since: Start date for data retrieval.
+    :param until: End date (excluded) for data retrieval, None for the last closed candle.
+    :param client: Exchange to use, name or ccxt exchange (see get_exchange), the default one if None.
+    :return: List of missing (start, end) ranges in milliseconds.
+    """
+    client = get_exchange(client)
+    # Same alignment as the stored and the resampled candles (weeks start on Monday)
+    last_close = get_candle_start(client.milliseconds(), timeframe)
+    since = get_candle_start(to_milliseconds(since), timeframe)
+    until = last_close if until is None else min(to_milliseconds(until), last_close)
+    return candle_store.get_missing_ranges(client.id, pair, timeframe, since, until)
+
+def sync_historical_data(pair, timeframe, since, until=None, client=None):
     """
-    from_ts = exchange.parse8601(since)
-    ohlcv_list = []
-    ohlcv = exchange.fetch_ohlcv(pair, timeframe, since=from_ts, limit=1000)
-    ohlcv_list.append(ohlcv)
+    Download only the candles of [since, until) that are missing from the candle store.
 
-    # Download historical values from "since"
-    while True:
-        logging.info("Downloading...")
-        add_data("Downloading...", str(datetime.now()))
-        from_ts = ohlcv[-1][0]
-        new_ohlcv = exchange.fetch_ohlcv(pair, timeframe, since=from_ts, limit=1000)
-        ohlcv.extend(new_ohlcv)
+    The ranges already downloaded are recorded in the store, so gaps are detected
+    and filled and the candles we already have are never fetched again. Missing
+    candles which can be computed from a finer series of the store (e.g. 1h from 5m)
+    are computed locally instead of being downloaded.
 
-        if len(new_ohlcv) != 1000:
-            break
+    :param pair: Trading pair symbol.
+    :param timeframe: Timeframe for historical data.
+    :param since: Start date for data retrieval.
+    :param until: End date (excluded) for data retrieval, None for the last closed candle.
+    :param client: Exchange to use, name or ccxt exchange (see get_exchange), the default one if None.
+    :return: Number of candles downloaded.
+    """
+    client = get_exchange(client)
+    missing = get_missing_ranges(pair, timeframe, since, until, client)
 
-    df = pd.DataFrame(ohlcv, columns=['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'], unit='ms')
-    df.set_index('Timestamp', inplace=True)
-    df = df.sort_index(ascending=True)
-    pair_dir = pair.replace('/', '_')
+    if missing:
+        computed = candle_store.resample(client.id, pair, timeframe, missing)
+        if computed:
+            logging.info(f"{computed} {pair} {timeframe} candles computed from the stored candles")
+            add_data(f"{computed} {pair} {timeframe} candles computed from the stored candles", str(datetime.now()))
+        missing = get_missing_ranges(pair, timeframe, since, until, client)
 
-    # Generate output directory based on pair and timeframe
-    output_dir = os.path.join(pair_dir + '_data')
-    os.makedirs(output_dir, exist_ok=True)
+    return sum(download_range(pair, timeframe, start, end, client) for start, end in missing)
 
-    # Generate output filename based on pair, timeframe, and start date
-    filename_prefix = f"{pair_dir}_{timeframe}_{since.replace(':', '-').replace(' ', '_')}"
-    output_filename = os.path.join(output_dir, f"{filename_prefix}.csv")
+def get_historical_data(pair, timeframe, since):
+    """
+    Get historical data for backtesting and save it in the candle store.
 
-    # Save DataFrame to CSV file
-    df.to_csv(output_filename)
-    return
+    :param pair: Trading pair symbol.
+    :param timeframe: Timeframe for historical data.
+    :param since: Start date for data retrieval.
+    :return: Number of candles downloaded.
+    """
+    return sync_historical_data(pair, timeframe, since)
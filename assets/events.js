@@ -0,0 +1,126 @@
+// Live events of the dashboard (see events.py).
+// The server pushes the log lines, bot status, fills and equity points on a
+// Server-Sent Events stream. If the stream can not be opened, the same events are
+// read by long polling, and if that fails too the polling interval of main.py is
+// enabled.
+// Event ids restart with the server, so the stream and the polls also give the
+// epoch of the server: when it changes, the ids received before are forgotten.
+(function () {
+    var MAX_LOG_LINES = 7;
+    var CHANNELS = ['log', 'bots', 'order', 'fill', 'equity'];
+    var MAX_FAILURES = 3;
+
+    var lastId = 0;
+    var epoch = null;
+    var logLines = [];
+
+    function setProps(id, props) {
+        if (window.dash_clientside && window.dash_clientside.set_props && document.getElementById(id)) {
+            window.dash_clientside.set_props(id, props);
+        }
+    }
+
+    function addLogLine(line) {
+        logLines.push(line);
+        logLines = logLines.slice(-MAX_LOG_LINES);
+        setProps('log-output', {value: logLines.join('\n') + '\n'});
+    }
+
+    function formatBot(status) {
+        var line = status.bot_id + ' : ' + status.state + ', ' + status.evaluations + ' candles evaluated';
+        if (status.error) {
+            line += ' (' + status.error + ')';
+        }
+        return {type: 'Div', namespace: 'dash_html_components', props: {children: line}};
+    }
+
+    function setEpoch(value) {
+        if (value !== epoch) {
+            epoch = value;
+            lastId = 0;
+        }
+    }
+
+    function handle(event) {
+        if (event.id <= lastId) {
+            return;
+        }
+        lastId = event.id;
+
+        if (event.channel === 'log') {
+            addLogLine(event.data);
+        } else if (event.channel === 'bots') {
+            setProps('bot-status', {children: event.data.map(formatBot)});
+        } else if (event.channel === 'order') {
+            addLogLine('Order ' + event.data.client_order_id + ' ' + event.data.side + ' ' + event.data.pair + ' : ' + event.data.status);
+        } else if (event.channel === 'fill') {
+            addLogLine('Fill ' + event.data.client_order_id + ' : ' + event.data.amount + ' ' + event.data.pair + ' at ' + event.data.price);
+        } else if (event.channel === 'equity') {
+            addLogLine('Backtest ' + event.data.run_id + ' equity : ' + event.data.value);
+        }
+    }
+
+    function enableIntervalPolling() {
+        setProps('interval-component', {disabled: false});
+    }
+
+    function longPoll(failures) {
+        var query = '?since=' + lastId + (epoch === null ? '' : '&epoch=' + epoch);
+        fetch('/events/poll' + query)
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function (result) {
+                setEpoch(result.epoch);
+                result.events.forEach(handle);
+                longPoll(0);
+            })
+            .catch(function () {
+                if (failures + 1 >= MAX_FAILURES) {
+                    enableIntervalPolling();
+                    return;
+                }
+                setTimeout(function () { longPoll(failures + 1); }, 1000 * (failures + 1));
+            });
+    }
+
+    function connect() {
+        if (!window.EventSource) {
+            longPoll(0);
+            return;
+        }
+
+        var source = new EventSource('/events/stream');
+        var opened = false;
+        var failures = 0;
+
+        source.onopen = function () {
+            opened = true;
+            failures = 0;
+        };
+        source.addEventListener('epoch', function (message) {
+            setEpoch(JSON.parse(message.data));
+        });
+        CHANNELS.forEach(function (channel) {
+            source.addEventListener(channel, function (message) {
+                // Ids are '<epoch>-<id>'
+                var id = Number(message.lastEventId.split('-').pop());
+                handle({id: id, channel: channel, data: JSON.parse(message.data)});
+            });
+        });
+        // The browser reconnects by itself, resuming after the last event received;
+        // the stream is given up for long polling if it never opened
+        source.onerror = function () {
+            failures += 1;
+            if (!opened && failures >= MAX_FAILURES) {
+                source.close();
+                longPoll(0);
+            }
+        };
+    }
+
+    window.addEventListener('load', connect);
+})();
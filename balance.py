@@ -0,0 +1,167 @@
+"""
+This script contains the code for caching the balance of the account.
+
+BalanceCache keeps the last balance fetched from the exchange as a dictionary
+{currency: row}, so reading the free amount of a currency is a dictionary lookup.
+The balance is fetched again once it is older than the TTL, or at once after one
+of our orders changed it, and optionally by a background thread. Each refresh
+records which rows changed, so the wallet table only receives those rows.
+"""
+import time
+import logging
+import threading
+
+class BalanceCache:
+    def __init__(self, fetch_balance, ttl=5.0, clock=time.monotonic):
+        """
+        Initialize a BalanceCache object.
+
+        :param fetch_balance: Function returning a balance in the ccxt format
+                              ({'total': {...}, 'free': {...}, 'used': {...}}).
+        :param ttl: Seconds during which a fetched balance is used without fetching it again.
+        :param clock: Function returning the current time in seconds.
+        """
+        self._fetch_balance = fetch_balance
+        self._ttl = ttl
+        self._clock = clock
+        self._rows = {}
+        self._row_versions = {}
+        self._removed = {}
+        self._version = 0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = None
+        self.fetches = 0
+
+    def refresh(self):
+        """
+        Fetch the balance from the exchange and record the rows which changed.
+
+        :return: Dictionary {currency: row} of the rows which changed.
+        """
+        balance = self._fetch_balance()
+        rows = {currency: {'Total': total, 'Free': balance['free'].get(currency), 'Used': balance['used'].get(currency)}
+                for currency, total in balance['total'].items()}
+
+        with self._lock:
+            changed = {currency: row for currency, row in rows.items() if self._rows.get(currency) != row}
+            removed = [currency for currency in self._rows if currency not in rows]
+            if changed or removed:
+                self._version += 1
+                for currency in changed:
+                    self._row_versions[currency] = self._version
+                    self._removed.pop(currency, None)
+                for currency in removed:
+                    del self._row_versions[currency]
+                    self._removed[currency] = self._version
+            self._rows = rows
+            self._fetched_at = self._clock()
+            self.fetches += 1
+        return changed
+
+    def _ensure_fresh(self):
+        if not self._is_expired():
+            return
+        # A single fetch at a time: the callers waiting for it use its result
+        with self._refresh_lock:
+            if self._is_expired():
+                self.refresh()
+
+    def _is_expired(self):
+        with self._lock:
+            return self._fetched_at is None or self._clock() - self._fetched_at >= self._ttl
+
+    def invalidate(self):
+        """
+        Mark the balance as outdated, e.g. after one of our orders was placed or filled.
+        """
+        with self._lock:
+            self._fetched_at = None
+
+    def get(self, currency):
+        """
+        Get the balance of a currency.
+
+        :param currency: Currency code (e.g., 'USDT').
+        :return: Dictionary with the 'Total', 'Free' and 'Used' amounts, None if the account has no such currency.
+
+        Example:
+        >>> balances = BalanceCache(lambda: {'total': {'USDT': 10.0}, 'free': {'USDT': 8.0}, 'used': {'USDT': 2.0}})
+        >>> balances.get('USDT')
+        {'Total': 10.0, 'Free': 8.0, 'Used': 2.0}
+        >>> balances.get('BTC') is None
+        True
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return self._rows.get(currency)
+
+    def get_free(self, currency):
+        """
+        Get the free amount of a currency.
+
+        :param currency: Currency code.
+        :return: Free amount, 0 if the account has no such currency.
+        """
+        row = self.get(currency)
+        return (row['Free'] or 0) if row is not None else 0
+
+    def get_all(self):
+        """
+        Get the balance of every currency.
+
+        :return: Dictionary {currency: row}.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return dict(self._rows)
+
+    def get_changes(self, since=0):
+        """
+        Get the rows which changed after a version of the balance.
+
+        :param since: Version already received, 0 to get every row.
+        :return: Tuple (version, {currency: row} of the changed rows, list of the removed currencies).
+
+        Example:
+        >>> balances = BalanceCache(lambda: {'total': {'USDT': 10.0}, 'free': {'USDT': 8.0}, 'used': {'USDT': 2.0}})
+        >>> balances.get_changes()
+        (1, {'USDT': {'Total': 10.0, 'Free': 8.0, 'Used': 2.0}}, [])
+        >>> balances.get_changes(1)
+        (1, {}, [])
+        """
+        self._ensure_fresh()
+        with self._lock:
+            changed = {currency: self._rows[currency]
+                       for currency, version in self._row_versions.items() if version > since}
+            removed = [currency for currency, version in self._removed.items() if version > since and since > 0]
+            return self._version, changed, removed
+
+    def start(self, interval=30.0):
+        """
+        Refresh the balance in a background thread.
+
+        :param interval: Seconds between two refreshes.
+        """
+        if self._stop_event is not None:
+            return
+        self._stop_event = threading.Event()
+        threading.Thread(target=self._run, args=(interval, self._stop_event), name="BalanceCache",
+                         daemon=True).start()
+
+    def stop(self):
+        """
+        Stop the background refresh.
+        """
+        if self._stop_event is not None:
+            self._stop_event.set()
+            self._stop_event = None
+
+    def _run(self, interval, stop_event):
+        while not stop_event.wait(interval):
+            try:
+                with self._refresh_lock:
+                    self.refresh()
+            except Exception as e:
+                logging.warning(f"Could not refresh the balance: {type(e).__name__}: {e}")
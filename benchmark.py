@@ -0,0 +1,382 @@
+"""
+This script contains the benchmarks of the project.
+
+Usage:
+    python benchmark.py            # run every benchmark
+    python benchmark.py backtest   # run only the given benchmark
+"""
+import sys
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+def make_candles(n, seed=0, start='2022-06-11 00:00:00', freq='5min'):
+    """
+    Generate a random walk of OHLCV candles.
+
+    :param n: Number of candles.
+    :param seed: Seed of the random generator.
+    :param start: Timestamp of the first candle.
+    :param freq: Frequency of the candles.
+    :return: DataFrame with Timestamp, Open, High, Low, Close and Volume columns.
+
+    Example:
+    >>> len(make_candles(10))
+    10
+    """
+    rng = np.random.default_rng(seed)
+    close = 20000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.001, n)) * close
+    return pd.DataFrame({
+        'Timestamp': pd.date_range(start, periods=n, freq=freq).astype(str),
+        'Open': open_,
+        'High': np.maximum(open_, close) + spread,
+        'Low': np.minimum(open_, close) - spread,
+        'Close': close,
+        'Volume': rng.uniform(1, 100, n),
+    })
+
+def legacy_sma_backtest(df, sma):
+    """
+    Per-bar SMA backtest loop as it was written before the vectorized engine (without logs).
+
+    :param df: DataFrame of candles.
+    :param sma: Simple Moving Average parameter.
+    :return: List of (timestamp, buy price, portfolio value, price difference) tuples.
+    """
+    portfolio_values = []
+    live_trade = False
+    last_portfolio_value = 1000
+    close_prices = df['Close']
+    timestamps = df['Timestamp']
+    df['SMA'] = close_prices.rolling(sma).mean()
+
+    for i in range(sma, len(df)):
+        close_price = close_prices.iloc[i]
+        timestamp = timestamps.iloc[i]
+        last_sma = df['SMA'].iloc[i - 1]
+        signal = "buy" if close_price > last_sma else "sell" if close_price < last_sma else 0
+
+        if signal == "buy" and not live_trade:
+            live_trade = True
+            prix_achat = close_price
+        elif signal == "sell" and live_trade:
+            live_trade = False
+            difference_de_prix = close_price - prix_achat
+            last_portfolio_value = last_portfolio_value + last_portfolio_value * (difference_de_prix / prix_achat)
+            portfolio_values.append((timestamp, round(prix_achat, 2), round(last_portfolio_value, 2),
+                                     round(difference_de_prix, 2)))
+    return portfolio_values
+
+def legacy_macd_backtest(df, short_window=12, long_window=26, signal_window=9):
+    """
+    Per-bar MACD backtest loop as it was written before the vectorized engine (without logs).
+
+    :param df: DataFrame of candles.
+    :param short_window: Span of the short EMA.
+    :param long_window: Span of the long EMA.
+    :param signal_window: Span of the EMA of the MACD line.
+    :return: List of (timestamp, buy price, portfolio value, price difference) tuples.
+    """
+    portfolio_values = []
+    live_trade = False
+    last_portfolio_value = 1000
+    close_prices = df['Close']
+    timestamps = df['Timestamp']
+    short_ema = close_prices.ewm(span=short_window, adjust=False).mean()
+    long_ema = close_prices.ewm(span=long_window, adjust=False).mean()
+    macd = short_ema - long_ema
+    df['MACD'] = macd - macd.ewm(span=signal_window, adjust=False).mean()
+
+    for i in range(long_window + signal_window, len(df)):
+        close_price = close_prices.iloc[i]
+        timestamp = timestamps.iloc[i]
+        last_macd = df['MACD'].iloc[i - 1]
+        signal = "buy" if last_macd > 0 else "sell" if last_macd < 0 else 0
+
+        if signal == "buy" and not live_trade:
+            live_trade = True
+            prix_achat = close_price
+        elif signal == "sell" and live_trade:
+            live_trade = False
+            difference_de_prix = close_price - prix_achat
+            last_portfolio_value = last_portfolio_value + last_portfolio_value * difference_de_prix / prix_achat
+            portfolio_values.append((timestamp, round(prix_achat, 2), round(last_portfolio_value, 2),
+                                     round(difference_de_prix, 2)))
+    return portfolio_values
+
+def legacy_rsi_backtest(df, rsi, rsi_period=14, overbought_threshold=70, oversold_threshold=30):
+    """
+    Per-bar RSI backtest loop as it was written before the vectorized engine (without logs).
+
+    The RSI column is given: the row-wise RSI of that time was replaced by the Wilder
+    RSI (see indicators.wilder_rsi), only the trading loop is the original one.
+
+    :param df: DataFrame of candles.
+    :param rsi: RSI values aligned with df.
+    :param rsi_period: RSI period, the loop starts at this candle.
+    :return: List of (timestamp, buy price, portfolio value, price difference) tuples.
+    """
+    portfolio_values = []
+    live_trade = False
+    last_portfolio_value = 1000
+    close_prices = df['Close']
+    timestamps = df['Timestamp']
+    df['RSI'] = rsi
+
+    for i in range(rsi_period, len(df)):
+        close_price = close_prices.iloc[i]
+        timestamp = timestamps.iloc[i]
+        last_rsi = df['RSI'].iloc[i - 1]
+        signal = "buy" if last_rsi < oversold_threshold else "sell" if last_rsi > overbought_threshold else 0
+
+        if signal == "buy" and not live_trade:
+            live_trade = True
+            prix_achat = close_price
+        elif signal == "sell" and live_trade:
+            live_trade = False
+            difference_de_prix = close_price - prix_achat
+            last_portfolio_value = last_portfolio_value + last_portfolio_value * difference_de_prix / prix_achat
+            portfolio_values.append((timestamp, round(prix_achat, 2), round(last_portfolio_value, 2),
+                                     round(difference_de_prix, 2)))
+    return portfolio_values
+
+def legacy_sma_rsi_backtest(df, sma, rsi, rsi_period=28, overbought_threshold=70, oversold_threshold=30):
+    """
+    Per-bar SMA and RSI backtest loop as it was written before the vectorized engine (without logs).
+
+    :param df: DataFrame of candles.
+    :param sma: Simple Moving Average parameter.
+    :param rsi: RSI values aligned with df (see legacy_rsi_backtest).
+    :param rsi_period: RSI period, the loop starts at this candle.
+    :return: List of (timestamp, buy price, portfolio value, price difference) tuples.
+    """
+    portfolio_values = []
+    live_trade = False
+    last_portfolio_value = 1000
+    close_prices = df['Close']
+    timestamps = df['Timestamp']
+    df['RSI'] = rsi
+    df['SMA'] = close_prices.rolling(sma).mean()
+
+    for i in range(rsi_period, len(df)):
+        close_price = close_prices.iloc[i]
+        timestamp = timestamps.iloc[i]
+        last_sma = df['SMA'].iloc[i - 1]
+        signal1 = "buy" if close_price > last_sma else "sell" if close_price < last_sma else 0
+        last_rsi = df['RSI'].iloc[i - 1]
+        signal2 = "buy" if last_rsi < oversold_threshold else "sell" if last_rsi > overbought_threshold else 0
+
+        if signal1 == "buy" and signal2 == "buy" and not live_trade:
+            live_trade = True
+            prix_achat = close_price
+        elif signal1 == "sell" and signal2 == "sell" and live_trade:
+            live_trade = False
+            difference_de_prix = close_price - prix_achat
+            frais_de_vente = 0.00
+            difference_de_prix -= prix_achat * frais_de_vente
+            last_portfolio_value = last_portfolio_value + last_portfolio_value * difference_de_prix / prix_achat
+            portfolio_values.append((timestamp, round(prix_achat, 2), round(last_portfolio_value, 2),
+                                     round(difference_de_prix, 2)))
+    return portfolio_values
+
+def timed(function, *args, repeat=1):
+    """
+    Return the best wall-clock time of a call, in seconds, and its result.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def benchmark_backtest(n=105_120, sma=25):
+    """
+    Compare the per-bar SMA loop with the vectorized engine on a year of 5m candles.
+    """
+    import strategies
+
+    df = make_candles(n)
+    strategy = strategies.SimpleSMALive('BTC/USDT', '5m', sma)
+    strategy.set_data(df.copy())
+
+    def vectorized():
+        signals = strategy.compute_signals()
+        return strategies.run_vectorized_backtest(strategy.get_data()['Close'], signals)
+
+    legacy_time, legacy_trades = timed(legacy_sma_backtest, df.copy(), sma)
+    vectorized_time, result = timed(vectorized, repeat=5)
+
+    assert len(legacy_trades) == len(result['exits'])
+    print(f"backtest: {n} bars, {len(legacy_trades)} trades")
+    print(f"  per-bar loop : {legacy_time * 1000:10.1f} ms")
+    print(f"  vectorized   : {vectorized_time * 1000:10.1f} ms  (x{legacy_time / vectorized_time:.0f})")
+
+def benchmark_store(n=105_120):
+    """
+    Compare loading a year of 5m candles from a CSV file and from the candle store.
+    """
+    import os
+    import tempfile
+    from candle_store import CandleStore
+
+    df = make_candles(n)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'BTC_USDT_5m.csv')
+        df.set_index('Timestamp').to_csv(csv_path)
+        store = CandleStore(os.path.join(directory, 'candles'))
+        store.write('mexc', 'BTC/USDT', '5m', df)
+
+        csv_time, _ = timed(pd.read_csv, csv_path, repeat=3)
+        store_time, _ = timed(store.load, 'mexc', 'BTC/USDT', '5m', repeat=3)
+        slice_time, _ = timed(store.read, 'mexc', 'BTC/USDT', '5m', '2022-09-01', '2022-10-01', repeat=3)
+
+    print(f"store: {n} candles")
+    print(f"  read_csv          : {csv_time * 1000:10.1f} ms")
+    print(f"  store (DataFrame) : {store_time * 1000:10.1f} ms  (x{csv_time / store_time:.0f})")
+    print(f"  store (1 month)   : {slice_time * 1000:10.1f} ms")
+
+def benchmark_logs(n=2000):
+    """
+    Compare one connection and commit per log row with the batched log writer.
+    """
+    import os
+    import sqlite3
+    import tempfile
+    import api
+
+    def connection_per_row(path):
+        for i in range(n):
+            conn = sqlite3.connect(path)
+            conn.execute('''INSERT INTO logs (name, date) VALUES (?, ?)''', (f"row {i}", "date"))
+            conn.commit()
+            conn.close()
+
+    def log_writer():
+        for i in range(n):
+            api.add_data(f"row {i}", "date")
+        api.flush_logs()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            api.create_database()
+            per_row_time, _ = timed(connection_per_row, api.DATABASE)
+            writer_time, _ = timed(log_writer)
+            api.close_logs()
+        finally:
+            os.chdir(cwd)
+
+    print(f"logs: {n} rows")
+    print(f"  connection per row : {per_row_time * 1000:10.1f} ms")
+    print(f"  log writer         : {writer_time * 1000:10.1f} ms  (x{per_row_time / writer_time:.0f})")
+
+def benchmark_sweep(n=105_120):
+    """
+    Time the parameter sweep of every strategy on a year of 5m candles.
+    """
+    import sweep
+
+    df = make_candles(n)
+    print(f"sweep: {n} candles")
+    for strategy in sweep.DEFAULT_GRIDS:
+        sweep_time, results = timed(sweep.run_sweep, strategy, None, 'BTC/USDT', '5m', None, None, df)
+        print(f"  {strategy:12} : {len(results):4} configurations in {sweep_time:6.2f} s")
+
+def benchmark_rsi(n=1_000_000, period=14):
+    """
+    Time the vectorized Wilder RSI against the row-wise gains and losses it replaced.
+    """
+    import indicators
+
+    close = pd.Series(make_candles(n)['Close'])
+
+    def row_wise(close_prices):
+        daily_returns = close_prices.diff().dropna()
+        gain = daily_returns.apply(lambda x: x if x > 0 else 0)
+        loss = daily_returns.apply(lambda x: -x if x < 0 else 0)
+        return 100 - (100 / (1 + gain / loss))
+
+    row_wise_time, _ = timed(row_wise, close)
+    vectorized_time, _ = timed(indicators.wilder_rsi, close, period, repeat=3)
+
+    print(f"rsi: {n} bars")
+    print(f"  apply(lambda) : {row_wise_time * 1000:10.1f} ms")
+    print(f"  wilder_rsi    : {vectorized_time * 1000:10.1f} ms  (x{row_wise_time / vectorized_time:.0f})")
+
+def benchmark_ohlcv(n=100_000):
+    """
+    Compare the per-candle decoding of the ccxt candles with the columnar decoding of api.get_ohlcv.
+    """
+    from datetime import datetime
+    from candle_store import arrays_to_dataframe, candles_to_arrays
+
+    df = make_candles(n)
+    timestamps = pd.to_datetime(df['Timestamp']).to_numpy().astype('datetime64[ms]').astype(np.int64)
+    candles = [[int(timestamp), *row] for timestamp, row in
+               zip(timestamps, df[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy().tolist())]
+
+    def per_candle(ccxt_candles):
+        candle_data = []
+        for candle in ccxt_candles:
+            timestamp, open_, high, low, close, volume = candle
+            candle_data.append([datetime.utcfromtimestamp(timestamp / 1000), open_, high, low, close, volume])
+        return pd.DataFrame(candle_data, columns=['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
+
+    per_candle_time, _ = timed(per_candle, candles)
+    arrays_time, _ = timed(candles_to_arrays, candles, repeat=3)
+    dataframe_time, _ = timed(lambda: arrays_to_dataframe(candles_to_arrays(candles)), repeat=3)
+
+    print(f"ohlcv: {n} candles")
+    print(f"  per-candle loop : {per_candle_time * 1000:10.1f} ms")
+    print(f"  arrays          : {arrays_time * 1000:10.1f} ms  (x{per_candle_time / arrays_time:.0f})")
+    print(f"  DataFrame       : {dataframe_time * 1000:10.1f} ms  (x{per_candle_time / dataframe_time:.0f})")
+
+def benchmark_startup(repeat=5):
+    """
+    Time the import of the entry points of the project, each in a new interpreter.
+    """
+    import os
+    import subprocess
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    modules = [('strategies', root), ('main', root),
+               ('predictor.env', os.path.join(root, 'Deep Reinforcement Learning'))]
+    code = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+
+    print(f"startup: best of {repeat} new interpreters")
+    for module, directory in modules:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', code.format(module)], cwd=directory,
+                                    capture_output=True, text=True)
+            process_time = time.perf_counter() - start
+            if result.returncode != 0:
+                print(f"  {module:14} : import failed ({result.stderr.strip().splitlines()[-1]})")
+                break
+            times.append((float(result.stdout.split()[-1]), process_time))
+        else:
+            import_time, process_time = min(times)
+            print(f"  {module:14} : import {import_time * 1000:7.1f} ms, process {process_time * 1000:7.1f} ms")
+
+BENCHMARKS = {
+    'backtest': benchmark_backtest,
+    'store': benchmark_store,
+    'logs': benchmark_logs,
+    'sweep': benchmark_sweep,
+    'rsi': benchmark_rsi,
+    'ohlcv': benchmark_ohlcv,
+    'startup': benchmark_startup,
+}
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
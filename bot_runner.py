@@ -0,0 +1,157 @@
+"""
+This script contains the code for running several live trading bots in the background.
+
+Each bot runs strategy_gestion.start_trade in a worker thread with its own trading
+logic, so starting a bot returns at once, and the status of every bot is published
+to the dashboard when a bot starts, evaluates a candle or stops. The bots trading
+the same pair and timeframe share the candles fetched from the exchange through
+market_data.cache.
+"""
+import time
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import events
+import exchanges
+import strategy_gestion
+from market_data import cache as market_cache
+
+class BotRunner:
+    def __init__(self, max_bots=16, market_data=None, order_manager=None):
+        """
+        Initialize a BotRunner object.
+
+        :param max_bots: Maximum number of bots running at the same time.
+        :param market_data: Function with the signature of api.get_ohlcv shared by the bots,
+                            market_data.cache.get_ohlcv returning column arrays if None.
+        :param order_manager: OrderManager sending the orders of the bots, None to only log their decisions.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_bots, thread_name_prefix="Bot")
+        # The bots only read the columns of the candles: they do not need a DataFrame
+        self._market_data = market_data or functools.partial(market_cache.get_ohlcv, arrays=True)
+        self._order_manager = order_manager
+        self._bots = {}
+        self._lock = threading.Lock()
+
+    def start_bot(self, bot_id, pair, strategy, timeframe='5m', percentage=5, event_source=None, exchange=None):
+        """
+        Start a bot in the background.
+
+        :param bot_id: Unique id of the bot.
+        :param pair: Trading pair for live trading.
+        :param strategy: Trading strategy to use (e.g., 'SimpleSMA').
+        :param timeframe: Timeframe for live trading.
+        :param percentage: Percentage of the wallet used per trade.
+        :param event_source: Object whose wait(trading_logic) returns the next candle close.
+        :param exchange: Name of the exchange client of the bot (see exchanges.registry), the default one if None.
+        :return: Status of the bot.
+        """
+        with self._lock:
+            if bot_id in self._bots and self._bots[bot_id]['state'] == 'running':
+                raise ValueError(f"Bot {bot_id} is already running")
+
+            trading_logic = strategy_gestion.create_trading_logic()
+            trading_logic['on_evaluation'] = self.publish_status
+            bot = {
+                'bot_id': bot_id,
+                'pair': pair,
+                'strategy': strategy,
+                'timeframe': timeframe,
+                'exchange': exchange,
+                'state': 'running',
+                'started_at': time.time(),
+                'error': None,
+                'trading_logic': trading_logic,
+            }
+            self._bots[bot_id] = bot
+            bot['future'] = self._executor.submit(self._run, bot, percentage, event_source)
+
+        logging.info(f"Bot {bot_id} started: {strategy} on {pair} {timeframe}")
+        api.add_data(f"Bot {bot_id} started: {strategy} on {pair} {timeframe}", str(api.datetime.now()))
+        self.publish_status()
+        return self.get_status(bot_id)
+
+    def _run(self, bot, percentage, event_source):
+        try:
+            strategy_gestion.start_trade(bot['trading_logic'], bot['timeframe'], bot['pair'], bot['strategy'],
+                                         percentage, event_source=event_source,
+                                         market_data=self._get_market_data(bot['exchange']),
+                                         order_manager=self._order_manager)
+            bot['state'] = 'stopped'
+        except Exception as e:
+            bot['state'] = 'failed'
+            bot['error'] = f"{type(e).__name__}: {e}"
+            logging.info(f"Bot {bot['bot_id']} failed: {bot['error']}")
+            api.add_data(f"Bot {bot['bot_id']} failed: {bot['error']}", str(api.datetime.now()))
+        self.publish_status()
+
+    def _get_market_data(self, exchange):
+        if exchange is None:
+            return self._market_data
+        # The bots of the same exchange share their candles
+        return functools.partial(market_cache.get_ohlcv, client=exchange, arrays=True)
+
+    def stop_bot(self, bot_id, wait=False):
+        """
+        Ask a bot to stop.
+
+        :param bot_id: Id of the bot.
+        :param wait: If True, wait until the bot is stopped.
+        :return: Status of the bot.
+        """
+        with self._lock:
+            bot = self._bots[bot_id]
+        strategy_gestion.stop_trade(bot['trading_logic'])
+        if wait:
+            bot['future'].result()
+        return self.get_status(bot_id)
+
+    def stop_all(self, wait=False):
+        """
+        Ask every bot to stop.
+
+        :param wait: If True, wait until the bots are stopped.
+        """
+        for bot_id in list(self._bots):
+            self.stop_bot(bot_id, wait)
+
+    def get_status(self, bot_id):
+        """
+        Get the status of a bot without blocking on it.
+
+        :param bot_id: Id of the bot.
+        :return: Dictionary describing the bot, its last candle close and evaluation delay.
+        """
+        with self._lock:
+            bot = self._bots[bot_id]
+        lateness = bot['trading_logic'].get('lateness', [])
+        return {
+            'bot_id': bot_id,
+            'pair': bot['pair'],
+            'strategy': bot['strategy'],
+            'timeframe': bot['timeframe'],
+            'exchange': bot['exchange'] or exchanges.registry.default,
+            'state': bot['state'],
+            'started_at': bot['started_at'],
+            'last_close': bot['trading_logic'].get('last_close'),
+            'evaluations': bot['trading_logic'].get('evaluations', 0),
+            'last_lateness': lateness[-1] if lateness else None,
+            'error': bot['error'],
+        }
+
+    def list_bots(self):
+        """
+        Get the status of every bot.
+
+        :return: List of status dictionaries.
+        """
+        return [self.get_status(bot_id) for bot_id in list(self._bots)]
+
+    def publish_status(self):
+        """
+        Publish the status of every bot on the 'bots' channel of the dashboard events.
+        """
+        events.publish('bots', self.list_bots())
@@ -0,0 +1,433 @@
+"""
+This script contains the code for the local storage of the candles.
+
+Each (exchange, pair, timeframe) series is kept in its own directory, one typed
+NumPy file per column (int64 timestamps in milliseconds, float64 prices and
+volumes), sorted by timestamp and without duplicates. A small meta.json file
+points to the current generation of the column files so that a write only
+becomes visible once every column has been saved.
+
+A higher timeframe is computed from the finest series of the same pair when it
+covers the requested range (e.g. 1h candles from the 5m ones), and saved like a
+downloaded series, so changing the timeframe of a backtest needs no download.
+"""
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+CANDLE_COLUMNS = ['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']
+CANDLE_DTYPES = {'Timestamp': np.int64, 'Open': np.float64, 'High': np.float64,
+                 'Low': np.float64, 'Close': np.float64, 'Volume': np.float64}
+DEFAULT_ROOT = 'candles'
+
+def to_milliseconds(date):
+    """
+    Convert a date to a timestamp in milliseconds.
+
+    :param date: None, a timestamp in milliseconds or a date string (e.g. '2022-06-11 00:00:00').
+    :return: Timestamp in milliseconds, or None.
+
+    Example:
+    >>> to_milliseconds('2022-06-11 00:00:00')
+    1654905600000
+    >>> to_milliseconds(1654905600000)
+    1654905600000
+    """
+    if date is None or isinstance(date, (int, np.integer)):
+        return date
+    return pd.Timestamp(date).value // 10**6
+
+def timeframe_to_milliseconds(timeframe):
+    """
+    Get the duration of a timeframe in milliseconds.
+
+    :param timeframe: Timeframe (e.g., '5m', '1h', '1d').
+    :return: Duration in milliseconds.
+
+    Example:
+    >>> timeframe_to_milliseconds('5m')
+    300000
+    >>> timeframe_to_milliseconds('1h')
+    3600000
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'M': 2592000, 'y': 31536000}
+    return int(timeframe[:-1]) * units[timeframe[-1]] * 1000
+
+def merge_ranges(ranges):
+    """
+    Merge overlapping or touching [start, end) ranges.
+
+    :param ranges: Iterable of (start, end) ranges.
+    :return: Sorted list of disjoint [start, end] ranges.
+
+    Example:
+    >>> merge_ranges([(5, 8), (0, 3), (3, 4), (7, 10)])
+    [[0, 4], [5, 10]]
+    """
+    merged = []
+    for start, end in sorted(tuple(current) for current in ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        elif start < end:
+            merged.append([start, end])
+    return merged
+
+def subtract_ranges(start, end, ranges):
+    """
+    Get the parts of [start, end) that are not in the given ranges.
+
+    :param start: Start of the range.
+    :param end: End of the range, excluded.
+    :param ranges: Sorted list of disjoint [start, end) ranges.
+    :return: List of missing (start, end) ranges.
+
+    Example:
+    >>> subtract_ranges(0, 10, [[2, 4], [6, 7]])
+    [(0, 2), (4, 6), (7, 10)]
+    >>> subtract_ranges(3, 5, [[0, 10]])
+    []
+    """
+    missing = []
+    cursor = start
+    for range_start, range_end in ranges:
+        if range_end <= cursor:
+            continue
+        if range_start >= end:
+            break
+        if range_start > cursor:
+            missing.append((cursor, range_start))
+        cursor = max(cursor, range_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+def can_resample(base_timeframe, timeframe):
+    """
+    Check if the candles of a timeframe can be computed from the candles of a finer one.
+
+    Months and years have no fixed duration, so they are never computed locally.
+
+    :param base_timeframe: Timeframe of the stored candles (e.g., '1m').
+    :param timeframe: Timeframe to compute (e.g., '1h').
+    :return: True if each candle of timeframe is made of whole base candles.
+
+    Example:
+    >>> can_resample('5m', '1h')
+    True
+    >>> can_resample('1h', '5m'), can_resample('7m', '1h'), can_resample('1d', '1M')
+    (False, False, False)
+    """
+    if base_timeframe[-1] in 'My' or timeframe[-1] in 'My':
+        return False
+    base_duration = timeframe_to_milliseconds(base_timeframe)
+    duration = timeframe_to_milliseconds(timeframe)
+    return duration > base_duration and duration % base_duration == 0
+
+def get_candle_start(timestamps, timeframe):
+    """
+    Get the opening time of the candle of a timeframe containing each timestamp.
+
+    Candles are aligned on the Unix epoch (UTC midnight for days), except weeks which
+    start on Monday like those of the exchanges.
+
+    :param timestamps: Timestamp or NumPy array of timestamps in milliseconds.
+    :param timeframe: Timeframe of the candles.
+    :return: Opening times in milliseconds.
+
+    Example:
+    >>> get_candle_start(1654906500000, '1h')
+    1654905600000
+    """
+    duration = timeframe_to_milliseconds(timeframe)
+    # 1970-01-05, the first Monday after the epoch
+    offset = 4 * 86_400_000 if timeframe[-1] == 'w' else 0
+    return (timestamps - offset) // duration * duration + offset
+
+def resample_candles(candles, timeframe):
+    """
+    Aggregate candles into a higher timeframe.
+
+    Each candle of timeframe takes the open of its first base candle, the highest
+    high, the lowest low, the close of its last base candle and the sum of the volumes.
+
+    :param candles: Dictionary of column arrays sorted by timestamp (see candles_to_arrays).
+    :param timeframe: Timeframe of the result.
+    :return: Dictionary of NumPy arrays, one candle per opening time found in candles.
+
+    Example:
+    >>> candles = candles_to_arrays([[0, 1, 3, 1, 2, 5], [60000, 2, 4, 0, 3, 5], [300000, 3, 3, 3, 3, 1]])
+    >>> resample_candles(candles, '5m')['High']
+    array([4., 3.])
+    """
+    candles = candles_to_arrays(candles)
+    if len(candles['Timestamp']) == 0:
+        return candles
+
+    starts = get_candle_start(candles['Timestamp'], timeframe)
+    first = np.flatnonzero(np.concatenate(([True], starts[1:] != starts[:-1])))
+    last = np.concatenate((first[1:], [len(starts)])) - 1
+    return {
+        'Timestamp': starts[first],
+        'Open': candles['Open'][first],
+        'High': np.maximum.reduceat(candles['High'], first),
+        'Low': np.minimum.reduceat(candles['Low'], first),
+        'Close': candles['Close'][last],
+        'Volume': np.add.reduceat(candles['Volume'], first),
+    }
+
+def candles_to_arrays(candles):
+    """
+    Convert candles to a dictionary of typed column arrays.
+
+    :param candles: ccxt OHLCV list, DataFrame or dictionary of columns.
+    :return: Dictionary of NumPy arrays, one per column of CANDLE_COLUMNS.
+
+    Example:
+    >>> candles_to_arrays([[1000, 1, 2, 0.5, 1.5, 10]])['Close']
+    array([1.5])
+    """
+    if isinstance(candles, (pd.DataFrame, dict)):
+        arrays = {column: np.asarray(candles[column]) for column in CANDLE_COLUMNS}
+        if np.issubdtype(arrays['Timestamp'].dtype, np.datetime64):
+            arrays['Timestamp'] = arrays['Timestamp'].astype('datetime64[ms]').astype(np.int64)
+    else:
+        block = np.asarray(candles, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+        arrays = {column: block[:, i] for i, column in enumerate(CANDLE_COLUMNS)}
+    return {column: np.ascontiguousarray(arrays[column], dtype=CANDLE_DTYPES[column])
+            for column in CANDLE_COLUMNS}
+
+def arrays_to_dataframe(arrays):
+    """
+    Convert a dictionary of column arrays to a DataFrame with a datetime Timestamp column.
+
+    :param arrays: Dictionary of NumPy arrays, one per column of CANDLE_COLUMNS.
+    :return: Pandas DataFrame with OHLCV data.
+    """
+    df = pd.DataFrame({column: arrays[column] for column in CANDLE_COLUMNS})
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'], unit='ms')
+    return df
+
+class CandleStore:
+    def __init__(self, root=DEFAULT_ROOT):
+        """
+        Initialize a CandleStore object.
+
+        :param root: Directory holding the candle series.
+        """
+        self._root = root
+        self._lock = threading.Lock()
+
+    def get_path(self, exchange, pair, timeframe):
+        """
+        Get the directory of a candle series.
+
+        :param exchange: Exchange id (e.g., 'mexc').
+        :param pair: Trading pair (e.g., 'BTC/USDT').
+        :param timeframe: Timeframe of the candles (e.g., '5m').
+        :return: Path of the series directory.
+
+        Example:
+        >>> CandleStore('candles').get_path('mexc', 'BTC/USDT', '5m')
+        'candles/mexc/BTC_USDT/5m'
+        """
+        return os.path.join(self._root, exchange, pair.replace('/', '_'), timeframe)
+
+    def read_meta(self, exchange, pair, timeframe):
+        """
+        Read the metadata of a candle series.
+
+        :return: Dictionary of metadata, empty if the series does not exist.
+        """
+        path = os.path.join(self.get_path(exchange, pair, timeframe), 'meta.json')
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as meta_file:
+            return json.load(meta_file)
+
+    def write_meta(self, exchange, pair, timeframe, meta):
+        """
+        Atomically replace the metadata of a candle series.
+        """
+        directory = self.get_path(exchange, pair, timeframe)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f'meta.json.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+    def read(self, exchange, pair, timeframe, since=None, until=None):
+        """
+        Read the candles of the [since, until) range.
+
+        :param since: Start of the range (timestamp in milliseconds or date string), None for the beginning.
+        :param until: End of the range, excluded, None for the end of the series.
+        :return: Dictionary of read-only NumPy arrays, one per column.
+        """
+        meta = self.read_meta(exchange, pair, timeframe)
+        if not meta.get('length'):
+            return {column: np.empty(0, dtype=CANDLE_DTYPES[column]) for column in CANDLE_COLUMNS}
+
+        directory = self.get_path(exchange, pair, timeframe)
+        columns = {column: np.load(os.path.join(directory, f"{column}.{meta['generation']}.npy"), mmap_mode='r')
+                   for column in CANDLE_COLUMNS}
+
+        timestamps = columns['Timestamp']
+        start = 0 if since is None else np.searchsorted(timestamps, to_milliseconds(since), side='left')
+        end = meta['length'] if until is None else np.searchsorted(timestamps, to_milliseconds(until), side='left')
+        return {column: values[start:end] for column, values in columns.items()}
+
+    def load(self, exchange, pair, timeframe, since=None, until=None):
+        """
+        Load the candles of the [since, until) range as a DataFrame.
+
+        :return: Pandas DataFrame with OHLCV data.
+        """
+        return arrays_to_dataframe(self.read(exchange, pair, timeframe, since, until))
+
+    def write(self, exchange, pair, timeframe, candles, covered=None):
+        """
+        Merge candles into a series. New candles replace stored ones with the same timestamp.
+
+        :param candles: ccxt OHLCV list, DataFrame or dictionary of columns.
+        :param covered: Optional list of (start, end) ranges, in milliseconds, now fully known locally.
+        :return: Number of candles in the series after the merge.
+        """
+        new = candles_to_arrays(candles)
+
+        with self._lock:
+            meta = self.read_meta(exchange, pair, timeframe)
+            meta['coverage'] = merge_ranges(self.get_coverage(exchange, pair, timeframe) + list(covered or []))
+            old = self.read(exchange, pair, timeframe)
+            merged = {column: np.concatenate((new[column], old[column])) for column in CANDLE_COLUMNS}
+
+            # Keep the first occurrence of each timestamp, i.e. the newly written candle
+            timestamps, first = np.unique(merged['Timestamp'], return_index=True)
+            merged = {column: values[first] for column, values in merged.items()}
+
+            directory = self.get_path(exchange, pair, timeframe)
+            os.makedirs(directory, exist_ok=True)
+            generation = meta.get('generation', 0) + 1
+            for column in CANDLE_COLUMNS:
+                np.save(os.path.join(directory, f"{column}.{generation}.npy"), merged[column])
+
+            meta['generation'] = generation
+            meta['length'] = len(timestamps)
+            self.write_meta(exchange, pair, timeframe, meta)
+
+            # The previous generation is kept for the readers that already opened it
+            for column in CANDLE_COLUMNS:
+                try:
+                    os.remove(os.path.join(directory, f"{column}.{generation - 2}.npy"))
+                except OSError:
+                    pass
+
+        return len(timestamps)
+
+    def get_version(self, exchange, pair, timeframe):
+        """
+        Get the version of a series, which changes each time candles are written to it.
+
+        :return: Generation of the series, 0 if the series does not exist.
+        """
+        return self.read_meta(exchange, pair, timeframe).get('generation', 0)
+
+    def get_range(self, exchange, pair, timeframe):
+        """
+        Get the first and last timestamps of a series.
+
+        :return: Tuple (first, last) in milliseconds, or None if the series is empty.
+        """
+        timestamps = self.read(exchange, pair, timeframe)['Timestamp']
+        if len(timestamps) == 0:
+            return None
+        return int(timestamps[0]), int(timestamps[-1])
+
+    def get_coverage(self, exchange, pair, timeframe):
+        """
+        Get the ranges of time already downloaded for a series.
+
+        Series written before the coverage was recorded are considered covered
+        from their first candle to the end of their last one.
+
+        :return: Sorted list of disjoint [start, end) ranges in milliseconds.
+        """
+        meta = self.read_meta(exchange, pair, timeframe)
+        if 'coverage' in meta:
+            return meta['coverage']
+        stored_range = self.get_range(exchange, pair, timeframe)
+        if stored_range is None:
+            return []
+        return [[stored_range[0], stored_range[1] + timeframe_to_milliseconds(timeframe)]]
+
+    def get_timeframes(self, exchange, pair):
+        """
+        Get the timeframes stored for a pair.
+
+        :return: List of timeframes, the finest first.
+        """
+        directory = os.path.dirname(self.get_path(exchange, pair, 'timeframe'))
+        if not os.path.isdir(directory):
+            return []
+        timeframes = [timeframe for timeframe in os.listdir(directory)
+                      if os.path.exists(os.path.join(directory, timeframe, 'meta.json'))]
+        return sorted(timeframes, key=timeframe_to_milliseconds)
+
+    def resample(self, exchange, pair, timeframe, ranges):
+        """
+        Compute the candles of ranges of a series from the finer series of the same pair.
+
+        The finest stored series is used first. Only the candles whose whole duration is
+        covered by the finer series are computed; they are written to the series of
+        timeframe with their coverage, so they are read from it the next time.
+
+        :param timeframe: Timeframe of the series to fill.
+        :param ranges: List of (start, end) ranges in milliseconds, aligned on the candles of timeframe.
+        :return: Number of candles computed.
+        """
+        duration = timeframe_to_milliseconds(timeframe)
+        computed = 0
+        missing = merge_ranges(ranges)
+
+        for base_timeframe in self.get_timeframes(exchange, pair):
+            if not missing:
+                break
+            if not can_resample(base_timeframe, timeframe):
+                continue
+
+            # Parts of the missing ranges made of candles fully covered by the base series
+            covered = []
+            for base_start, base_end in self.get_coverage(exchange, pair, base_timeframe):
+                for missing_start, missing_end in missing:
+                    start = get_candle_start(max(missing_start, base_start) + duration - 1, timeframe)
+                    end = get_candle_start(min(missing_end, base_end), timeframe)
+                    if start < end:
+                        covered.append((start, end))
+            if not covered:
+                continue
+
+            base = self.read(exchange, pair, base_timeframe, min(start for start, _ in covered),
+                             max(end for _, end in covered))
+            inside = np.zeros(len(base['Timestamp']), dtype=bool)
+            for start, end in covered:
+                inside |= (base['Timestamp'] >= start) & (base['Timestamp'] < end)
+            candles = resample_candles({column: values[inside] for column, values in base.items()}, timeframe)
+
+            self.write(exchange, pair, timeframe, candles, covered=covered)
+            computed += len(candles['Timestamp'])
+            missing = [list(missing_range) for missing_start, missing_end in missing
+                       for missing_range in subtract_ranges(missing_start, missing_end, merge_ranges(covered))]
+
+        return computed
+
+    def get_missing_ranges(self, exchange, pair, timeframe, since, until):
+        """
+        Get the ranges of [since, until) that are not downloaded yet, gaps included.
+
+        :param since: Start of the range (timestamp in milliseconds or date string).
+        :param until: End of the range, excluded.
+        :return: List of missing (start, end) ranges in milliseconds.
+        """
+        return subtract_ranges(to_milliseconds(since), to_milliseconds(until),
+                               self.get_coverage(exchange, pair, timeframe))
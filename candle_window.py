@@ -0,0 +1,110 @@
+"""
+This script contains the code of the fixed-size candle window used by the live strategies.
+
+The window keeps the last candles of a live series in preallocated NumPy arrays used
+as a ring buffer: the forming candle is updated in place, a new candle overwrites
+the oldest one, so a bot running for weeks uses the same memory as on its first bar.
+"""
+import numpy as np
+
+from candle_store import CANDLE_COLUMNS, CANDLE_DTYPES, arrays_to_dataframe
+
+class CandleWindow:
+    def __init__(self, capacity):
+        """
+        Initialize a CandleWindow object.
+
+        :param capacity: Maximum number of candles kept, the forming one included.
+        """
+        self._capacity = capacity
+        self._columns = {column: np.zeros(capacity, dtype=CANDLE_DTYPES[column]) for column in CANDLE_COLUMNS}
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self._capacity)
+
+    def get_capacity(self):
+        """
+        Get the maximum number of candles kept.
+
+        :return: Capacity of the window.
+        """
+        return self._capacity
+
+    def get_last_timestamp(self):
+        """
+        Get the timestamp of the last (forming) candle.
+
+        :return: Timestamp in milliseconds, or None if the window is empty.
+        """
+        if self._count == 0:
+            return None
+        return int(self._columns['Timestamp'][(self._count - 1) % self._capacity])
+
+    def get_last(self, column='Close'):
+        """
+        Get a value of the last (forming) candle.
+
+        :param column: Column of the value (e.g., 'Close').
+        :return: Value, or None if the window is empty.
+        """
+        if self._count == 0:
+            return None
+        return self._columns[column][(self._count - 1) % self._capacity].item()
+
+    def update(self, candles):
+        """
+        Add live candles, oldest first.
+
+        A candle with the timestamp of the last one replaces it in place, a newer
+        candle is appended and means that the last one closed, an older candle is ignored.
+
+        :param candles: Dictionary of column arrays (see candle_store.candles_to_arrays).
+        :return: List of the close prices of the candles which closed during the update.
+
+        Example:
+        >>> window = CandleWindow(2)
+        >>> window.update({'Timestamp': [0, 60], 'Open': [1, 2], 'High': [1, 2], 'Low': [1, 2],
+        ...                'Close': [1.0, 2.0], 'Volume': [1, 1]})
+        [1.0]
+        >>> window.update({'Timestamp': [60, 120], 'Open': [2, 3], 'High': [2, 3], 'Low': [2, 3],
+        ...                'Close': [2.5, 3.0], 'Volume': [1, 1]})
+        [2.5]
+        >>> window.get_column('Close')
+        array([2.5, 3. ])
+        """
+        closed = []
+        timestamps = candles['Timestamp']
+        for i in range(len(timestamps)):
+            timestamp = int(timestamps[i])
+            last_timestamp = self.get_last_timestamp()
+
+            if last_timestamp is None or timestamp > last_timestamp:
+                if last_timestamp is not None:
+                    closed.append(self.get_last('Close'))
+                self._count += 1
+            elif timestamp < last_timestamp:
+                continue
+
+            position = (self._count - 1) % self._capacity
+            for column in CANDLE_COLUMNS:
+                self._columns[column][position] = candles[column][i]
+        return closed
+
+    def get_column(self, column):
+        """
+        Get a column of the window, oldest candle first.
+
+        :param column: Column name (e.g., 'Close').
+        :return: NumPy array of at most capacity values.
+        """
+        start = self._count % self._capacity if self._count > self._capacity else 0
+        return np.roll(self._columns[column], -start)[:len(self)]
+
+    def to_dataframe(self):
+        """
+        Get the candles of the window as a DataFrame, oldest candle first.
+
+        :return: Pandas DataFrame with OHLCV data.
+        """
+        return arrays_to_dataframe({column: self.get_column(column) for column in CANDLE_COLUMNS})
@@ -0,0 +1,139 @@
+"""
+This script contains the code for downsampling the series drawn in the dashboard.
+
+A figure never needs more points than the graph has pixels: the long series are
+reduced on the server, with LTTB (Largest-Triangle-Three-Buckets, which keeps the
+visual shape of the curve) or min-max (which keeps the extremes of every bucket),
+and the visible range is downsampled again at full resolution when the user zooms.
+"""
+import numpy as np
+import pandas as pd
+
+# Default number of points per trace, about the width of the graph in pixels
+PLOT_POINTS = 2000
+
+def lttb(x, y, max_points):
+    """
+    Select the points of a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are kept, the others are split into max_points - 2
+    buckets and the point of each bucket forming the largest triangle with the
+    previous selected point and the mean of the next bucket is kept.
+
+    :param x: Sorted x values (numbers or datetime64).
+    :param y: y values.
+    :param max_points: Number of points to keep.
+    :return: Sorted array of the indices of the kept points.
+
+    Example:
+    >>> lttb(np.arange(6), np.array([0, 1, 0, 9, 0, 1]), 4)
+    array([0, 2, 3, 5])
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x).astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(max_points - 1) * (n - 2) / (max_points - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+def min_max(x, y, max_points):
+    """
+    Select the minimum and maximum of buckets of a series.
+
+    :param x: Sorted x values.
+    :param y: y values.
+    :param max_points: Maximum number of points to keep.
+    :return: Sorted array of the indices of the kept points, the first and last ones included.
+
+    Example:
+    >>> min_max(np.arange(8), np.array([3, 1, 2, 5, 4, 0, 6, 7]), 6)
+    array([0, 1, 3, 5, 7])
+    """
+    n = len(x)
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+
+    # Two points per bucket, plus the first and last points of the series
+    buckets = np.arange(n) * ((max_points - 2) // 2) // n
+    order = np.lexsort((np.asarray(y), buckets))
+    boundaries = np.flatnonzero(np.diff(buckets[order], prepend=-1, append=max_points))
+    minimums = order[boundaries[:-1]]
+    maximums = order[boundaries[1:] - 1]
+    return np.unique(np.concatenate(([0, n - 1], minimums, maximums)))
+
+METHODS = {'lttb': lttb, 'minmax': min_max}
+
+def downsample(x, y, max_points=PLOT_POINTS, x_range=None, method='lttb'):
+    """
+    Reduce a series to at most max_points points, optionally inside an x range only.
+
+    :param x: Sorted x values (numbers or datetime64).
+    :param y: y values.
+    :param max_points: Maximum number of points to keep.
+    :param x_range: Optional (start, end) range of x values to keep, as drawn by the graph.
+    :param method: 'lttb' or 'minmax'.
+    :return: Tuple (x, y) of NumPy arrays.
+
+    Example:
+    >>> x, y = downsample(np.arange(100), np.arange(100) ** 2, 20, x_range=(10, 20))
+    >>> x.tolist()
+    [9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21]
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x_range is not None:
+        start, end = (_to_x(bound, x.dtype) for bound in x_range)
+        # One point on each side, so the line reaches the edges of the graph
+        first = max(np.searchsorted(x, start, side='left') - 1, 0)
+        last = min(np.searchsorted(x, end, side='right') + 1, len(x))
+        x, y = x[first:last], y[first:last]
+
+    indices = METHODS[method](x, y, max_points)
+    return x[indices], y[indices]
+
+def _to_x(bound, dtype):
+    if np.issubdtype(dtype, np.datetime64):
+        return np.datetime64(pd.Timestamp(bound)).astype(dtype)
+    return bound
+
+def get_x_range(relayout_data):
+    """
+    Get the x range selected by a zoom from the relayoutData of a Dash graph.
+
+    :param relayout_data: relayoutData property of the graph.
+    :return: (start, end) tuple, 'auto' if the zoom was reset, None if the x axis did not change.
+
+    Example:
+    >>> get_x_range({'xaxis3.range[0]': '2023-06-11', 'xaxis3.range[1]': '2023-06-12'})
+    ('2023-06-11', '2023-06-12')
+    >>> get_x_range({'xaxis.autorange': True})
+    'auto'
+    """
+    for key, value in (relayout_data or {}).items():
+        axis, _, attribute = key.partition('.')
+        if not axis.startswith('xaxis'):
+            continue
+        if attribute == 'range[0]':
+            return value, relayout_data[f"{axis}.range[1]"]
+        if attribute == 'range' and isinstance(value, list):
+            return tuple(value)
+        if attribute == 'autorange':
+            return 'auto'
+    return None
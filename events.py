@@ -0,0 +1,223 @@
+"""
+This script contains the code for pushing live events to the dashboard.
+
+The bot runner, the order and fill writers and the logging module publish events
+(log lines, bot status, fills, equity) to an EventBus. The browser receives them
+from a Server-Sent Events endpoint as soon as they are published, or from a
+long-polling endpoint when the EventSource connection can not be opened, so an
+idle dashboard sends no request at all.
+
+Event ids restart at 1 with the process, so each bus also has an epoch, its start
+time: the ids sent to the browser carry it, and a client coming back with an id of
+another epoch (after a restart of the server) receives every event kept again.
+"""
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+# Seconds between two keep-alive comments on an idle event stream
+KEEPALIVE_INTERVAL = 15
+
+# Loggers whose records are not published: the access log of the server writes a
+# line per request, so each long poll would publish the event waking the next one
+IGNORED_LOGGERS = ('werkzeug',)
+
+class EventBus:
+    def __init__(self, max_events=1000):
+        """
+        Initialize an EventBus object, which keeps the last events published.
+
+        :param max_events: Number of events kept for the clients which reconnect.
+        """
+        self._events = deque(maxlen=max_events)
+        self._last_id = 0
+        self._condition = threading.Condition()
+        self.epoch = time.time_ns()
+
+    def publish(self, channel, data):
+        """
+        Publish an event and wake up the clients waiting for one.
+
+        :param channel: Name of the channel (e.g., 'log', 'bots', 'fill', 'equity').
+        :param data: JSON serializable data of the event.
+        :return: Id of the event.
+
+        Example:
+        >>> bus = EventBus()
+        >>> bus.publish('log', 'Live trading is running')
+        1
+        >>> bus.get_events(0)
+        [{'id': 1, 'channel': 'log', 'data': 'Live trading is running'}]
+        """
+        with self._condition:
+            self._last_id += 1
+            self._events.append({'id': self._last_id, 'channel': channel, 'data': data})
+            self._condition.notify_all()
+            return self._last_id
+
+    def get_events(self, since=0):
+        """
+        Get the events kept which were published after an event.
+
+        :param since: Id of the last event already received, every event if it was not published yet
+                      (id of a previous process).
+        :return: List of events, oldest first.
+        """
+        with self._condition:
+            return self._get_events(since)
+
+    def _get_events(self, since):
+        if since > self._last_id:
+            since = 0
+        return [event for event in self._events if event['id'] > since]
+
+    def wait(self, since=0, timeout=25):
+        """
+        Wait for events published after an event.
+
+        :param since: Id of the last event already received, every event if it was not published yet.
+        :param timeout: Maximum waiting time, in seconds.
+        :return: List of events, empty if none was published before the timeout.
+        """
+        with self._condition:
+            if since > self._last_id:
+                since = 0
+            self._condition.wait_for(lambda: self._last_id > since, timeout)
+            return self._get_events(since)
+
+    def get_last_id(self):
+        """
+        Get the id of the last event published.
+
+        :return: Id of the event, 0 if none was published.
+        """
+        with self._condition:
+            return self._last_id
+
+# Bus shared by the publishers of the process and the dashboard
+bus = EventBus()
+
+def publish(channel, data):
+    """
+    Publish an event on the shared bus.
+
+    :param channel: Name of the channel.
+    :param data: JSON serializable data of the event.
+    :return: Id of the event.
+    """
+    return bus.publish(channel, data)
+
+class EventLogHandler(logging.Handler):
+    def __init__(self, event_bus=None):
+        """
+        Initialize an EventLogHandler object, which publishes the log records on the 'log' channel,
+        except those of IGNORED_LOGGERS.
+
+        :param event_bus: EventBus to publish to, the shared bus if None.
+        """
+        super().__init__()
+        self._bus = event_bus or bus
+
+    def filter(self, record):
+        if record.name.startswith(IGNORED_LOGGERS):
+            return False
+        return super().filter(record)
+
+    def emit(self, record):
+        try:
+            self._bus.publish('log', self.format(record))
+        except Exception:
+            self.handleError(record)
+
+def format_sse(event, epoch=None):
+    """
+    Format an event for a Server-Sent Events stream.
+
+    :param event: Event of an EventBus.
+    :param epoch: Epoch of the bus, written before the id of the event if given.
+
+    Example:
+    >>> format_sse({'id': 3, 'channel': 'log', 'data': 'hello'})
+    'id: 3\\nevent: log\\ndata: "hello"\\n\\n'
+    >>> format_sse({'id': 3, 'channel': 'log', 'data': 'hello'}, epoch=7)
+    'id: 7-3\\nevent: log\\ndata: "hello"\\n\\n'
+    """
+    event_id = event['id'] if epoch is None else f"{epoch}-{event['id']}"
+    return f"id: {event_id}\nevent: {event['channel']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+def parse_event_id(value, epoch):
+    """
+    Get the id of the last event received by a client from the id it sent.
+
+    :param value: Id sent by the client, '<epoch>-<id>' or '<id>', None if it has received nothing.
+    :param epoch: Epoch of the bus.
+    :return: Id of the event, 0 if the client received it from a bus of another epoch.
+
+    Example:
+    >>> parse_event_id('7-3', 7), parse_event_id('6-3', 7), parse_event_id('3', 7), parse_event_id(None, 7)
+    (3, 0, 3, 0)
+    """
+    if not value:
+        return 0
+    client_epoch, _, event_id = str(value).rpartition('-')
+    if client_epoch and client_epoch != str(epoch):
+        return 0
+    return int(event_id)
+
+def stream(since=0, event_bus=None, keepalive=KEEPALIVE_INTERVAL):
+    """
+    Generate the Server-Sent Events stream of the events published after an event.
+
+    The stream starts with an 'epoch' event giving the epoch of the bus, so the
+    client forgets the ids of a previous process.
+
+    :param since: Id of the last event already received.
+    :param event_bus: EventBus to follow, the shared bus if None.
+    :param keepalive: Seconds between two keep-alive comments when no event is published.
+    """
+    event_bus = event_bus or bus
+    yield "retry: 1000\n\n"
+    yield f"event: epoch\ndata: {json.dumps(str(event_bus.epoch))}\n\n"
+    while True:
+        events = event_bus.wait(since, keepalive)
+        if not events:
+            yield ": keep-alive\n\n"
+            continue
+        for event in events:
+            yield format_sse(event, event_bus.epoch)
+        since = events[-1]['id']
+
+def register_routes(server, event_bus=None, poll_timeout=25):
+    """
+    Add the event endpoints to the Flask server of the dashboard.
+
+    GET /events/stream streams the events (Server-Sent Events, the Last-Event-ID
+    header resumes after a reconnection), GET /events/poll?since=<id>&epoch=<epoch>
+    returns the next events and the epoch of the bus as JSON once at least one event
+    is published or after poll_timeout seconds.
+
+    :param server: Flask server (app.server of the Dash app).
+    :param event_bus: EventBus to serve, the shared bus if None.
+    :param poll_timeout: Maximum duration of a long-polling request, in seconds.
+    """
+    from flask import Response, jsonify, request
+
+    event_bus = event_bus or bus
+
+    @server.route('/events/stream')
+    def event_stream():
+        since = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('since'), event_bus.epoch)
+        return Response(stream(since, event_bus), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @server.route('/events/poll')
+    def event_poll():
+        since = int(request.args.get('since', 0))
+        if request.args.get('epoch', str(event_bus.epoch)) != str(event_bus.epoch):
+            since = 0
+        started = time.monotonic()
+        events = event_bus.wait(since, poll_timeout)
+        return jsonify({'events': events, 'last_id': event_bus.get_last_id(), 'epoch': str(event_bus.epoch),
+                        'waited': round(time.monotonic() - started, 3)})
@@ -0,0 +1,165 @@
+"""
+This script contains the code for creating the exchange clients when they are first used.
+
+The ExchangeRegistry knows how to build every configured ccxt client but only
+builds one when it is asked for, so importing the modules of the bot does not
+create any client. The markets loaded by a client (load_markets, a request to the
+exchange made before its first call) are saved on disk and given to the next
+clients of the same exchange while they are younger than the TTL, so a new
+process does not load them again.
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+from lazy import lazy_import
+
+# ccxt is only imported when the first client is built
+ccxt = lazy_import('ccxt')
+
+# Directory of the saved markets, one JSON file per exchange client
+MARKETS_DIRECTORY = 'markets'
+
+# Age, in seconds, after which the saved markets are loaded again from the exchange
+MARKETS_TTL = 24 * 3600
+
+def get_credentials(exchange):
+    """
+    Read the API keys of an exchange from dontshare_config, when its client is built.
+
+    :param exchange: Upper case name used in dontshare_config (e.g., 'MEXC').
+    :return: Dictionary with the 'apiKey' and 'secret' of the ccxt configuration.
+    """
+    import dontshare_config as dc
+    return {'apiKey': getattr(dc, f"API_KEY_{exchange}"), 'secret': getattr(dc, f"API_SECRET_{exchange}")}
+
+# Name of each client: ccxt class and configuration (read when the client is built)
+EXCHANGES = {
+    'mexc': ('mexc', lambda: get_credentials('MEXC')),
+    'mexc_futures': ('mexc', lambda: {**get_credentials('MEXC'), 'options': {'defaultType': 'swap'}}),
+    'binance': ('binance', lambda: get_credentials('BINANCE')),
+    'coinbase': ('coinbase', lambda: get_credentials('COINBASE')),
+}
+
+# Client on which operations are performed when none is chosen
+DEFAULT_EXCHANGE = 'mexc'
+
+class ExchangeRegistry:
+    def __init__(self, exchanges=None, default=DEFAULT_EXCHANGE, directory=MARKETS_DIRECTORY, ttl=MARKETS_TTL,
+                 factory=None, clock=time.time):
+        """
+        Initialize an ExchangeRegistry object.
+
+        :param exchanges: Dictionary {name: (ccxt class name, function returning the configuration)},
+                          EXCHANGES if None.
+        :param default: Name of the client returned when no name is given.
+        :param directory: Directory of the saved markets, None to never save them.
+        :param ttl: Age, in seconds, after which the saved markets are not used anymore.
+        :param factory: Function building a client from a ccxt class name and a configuration,
+                        the ccxt class if None.
+        :param clock: Function returning the current time in seconds.
+        """
+        self._exchanges = dict(EXCHANGES if exchanges is None else exchanges)
+        self.default = default
+        self._directory = directory
+        self._ttl = ttl
+        self._factory = factory or (lambda class_name, config: getattr(ccxt, class_name)(config))
+        self._clock = clock
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get_names(self):
+        """
+        Get the names of the configured clients.
+
+        :return: List of names.
+
+        Example:
+        >>> ExchangeRegistry().get_names()
+        ['mexc', 'mexc_futures', 'binance', 'coinbase']
+        """
+        return list(self._exchanges)
+
+    def get(self, name=None):
+        """
+        Get a client, building it on first use.
+
+        :param name: Name of the client, the default one if None.
+        :return: ccxt exchange.
+        """
+        name = name or self.default
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                if name not in self._exchanges:
+                    raise KeyError(f"Exchange {name} is not configured")
+                client = self._build(name)
+                self._clients[name] = client
+            return client
+
+    def _build(self, name):
+        class_name, get_config = self._exchanges[name]
+        client = self._factory(class_name, {'enableRateLimit': True, **get_config()})
+
+        saved = self.read_markets(name)
+        if saved is not None:
+            client.set_markets(saved['markets'], saved.get('currencies'))
+
+        # The markets loaded from the exchange are saved for the next processes
+        load_markets = client.load_markets
+
+        def load_and_save_markets(reload=False, params={}):
+            loaded = client.markets is not None and not reload
+            markets = load_markets(reload, params)
+            if not loaded:
+                self.write_markets(name, client)
+            return markets
+
+        client.load_markets = load_and_save_markets
+        return client
+
+    def _get_path(self, name):
+        return os.path.join(self._directory, f"{name}.json")
+
+    def read_markets(self, name):
+        """
+        Read the markets saved for a client, if they are younger than the TTL.
+
+        :param name: Name of the client.
+        :return: Dictionary with the 'markets', 'currencies' and 'saved_at' time, None if there is none.
+        """
+        if self._directory is None:
+            return None
+        try:
+            with open(self._get_path(name)) as markets_file:
+                saved = json.load(markets_file)
+        except (OSError, ValueError):
+            return None
+        if self._clock() - saved.get('saved_at', 0) >= self._ttl:
+            return None
+        return saved
+
+    def write_markets(self, name, client):
+        """
+        Save the markets of a client.
+
+        :param name: Name of the client.
+        :param client: ccxt exchange whose markets were loaded.
+        """
+        if self._directory is None or not client.markets:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._get_path(name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as markets_file:
+                json.dump({'saved_at': self._clock(), 'markets': client.markets, 'currencies': client.currencies},
+                          markets_file, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Could not save the markets of {name}: {e}")
+
+# Registry shared by the modules of the process
+registry = ExchangeRegistry()
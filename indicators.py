@@ -0,0 +1,374 @@
+"""
+This script contains the code of the streaming indicators used by the live strategies.
+
+Each indicator is updated with one closed candle at a time in constant time and
+memory, and gives the same values as the batch computation on the whole series:
+SMA as Series.rolling(window).mean(), EMA as Series.ewm(span, adjust=False).mean(),
+RSI with Wilder smoothing and MACD as the MACD line minus its signal line.
+
+The batch indicators of the backtests go through an IndicatorCache, so the same
+indicator over the same candles is computed once per process (or once at all with
+an on-disk cache), whichever strategy or sweep asks for it.
+"""
+import os
+import math
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+class SMA:
+    def __init__(self, window):
+        """
+        Initialize a streaming Simple Moving Average.
+
+        :param window: Number of values averaged.
+        """
+        self.window = window
+        self.count = 0
+        self.value = math.nan
+        self._values = deque(maxlen=window)
+        self._sum = 0.0
+        self._compensation = 0.0
+
+    def update(self, value):
+        """
+        Add a value.
+
+        :param value: New value (e.g. a close price).
+        :return: Average of the last window values, NaN during the warm-up.
+
+        Example:
+        >>> sma = SMA(2)
+        >>> sma.update(1.0), sma.update(3.0), sma.update(5.0)
+        (nan, 2.0, 4.0)
+        """
+        removed = self._values[0] if len(self._values) == self.window else 0.0
+        self._values.append(value)
+        self.count += 1
+
+        # Kahan summation, so the running sum does not drift on long live sessions
+        for term in (value, -removed):
+            corrected = term - self._compensation
+            total = self._sum + corrected
+            self._compensation = (total - self._sum) - corrected
+            self._sum = total
+
+        self.value = self._sum / self.window if self.count >= self.window else math.nan
+        return self.value
+
+class EMA:
+    def __init__(self, span):
+        """
+        Initialize a streaming Exponential Moving Average, seeded with the first value.
+
+        :param span: Span of the average, alpha = 2 / (span + 1).
+        """
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.count = 0
+        self.value = math.nan
+
+    def update(self, value):
+        """
+        Add a value.
+
+        :param value: New value.
+        :return: Current average.
+
+        Example:
+        >>> ema = EMA(3)
+        >>> ema.update(1.0), ema.update(3.0)
+        (1.0, 2.0)
+        """
+        if self.count == 0:
+            self.value = value
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * value
+        self.count += 1
+        return self.value
+
+class RSI:
+    def __init__(self, period=14):
+        """
+        Initialize a streaming Relative Strength Index with Wilder smoothing.
+
+        The first average gain and loss are the means of the first period changes,
+        the next ones are smoothed with alpha = 1 / period.
+
+        :param period: RSI period.
+        """
+        self.period = period
+        self.count = 0
+        self.value = math.nan
+        self._previous = None
+        self._average_gain = 0.0
+        self._average_loss = 0.0
+
+    def update(self, value):
+        """
+        Add a close price.
+
+        :param value: New close price.
+        :return: Current RSI, NaN until period + 1 prices were added.
+
+        Example:
+        >>> rsi = RSI(2)
+        >>> rsi.update(1.0), rsi.update(2.0), rsi.update(3.0), rsi.update(2.0)
+        (nan, nan, 100.0, 50.0)
+        """
+        self.count += 1
+        if self._previous is None:
+            self._previous = value
+            return self.value
+
+        change = value - self._previous
+        self._previous = value
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        if self.count <= self.period + 1:
+            self._average_gain += gain / self.period
+            self._average_loss += loss / self.period
+            if self.count < self.period + 1:
+                return self.value
+        else:
+            self._average_gain = (self._average_gain * (self.period - 1) + gain) / self.period
+            self._average_loss = (self._average_loss * (self.period - 1) + loss) / self.period
+
+        if self._average_loss == 0:
+            self.value = 100.0
+        else:
+            self.value = 100 - 100 / (1 + self._average_gain / self._average_loss)
+        return self.value
+
+class MACD:
+    def __init__(self, short_window=12, long_window=26, signal_window=9):
+        """
+        Initialize a streaming MACD histogram.
+
+        :param short_window: Span of the short EMA.
+        :param long_window: Span of the long EMA.
+        :param signal_window: Span of the EMA of the MACD line (signal line).
+        """
+        self._short = EMA(short_window)
+        self._long = EMA(long_window)
+        self._signal = EMA(signal_window)
+        self.count = 0
+        self.macd = math.nan
+        self.signal = math.nan
+        self.value = math.nan
+
+    def update(self, value):
+        """
+        Add a close price.
+
+        :param value: New close price.
+        :return: MACD line minus signal line.
+
+        Example:
+        >>> macd = MACD(2, 4, 2)
+        >>> macd.update(1.0)
+        0.0
+        """
+        self.macd = self._short.update(value) - self._long.update(value)
+        self.signal = self._signal.update(self.macd)
+        self.value = self.macd - self.signal
+        self.count += 1
+        return self.value
+
+class IndicatorCache:
+    def __init__(self, max_bytes=256 * 2**20, directory=None):
+        """
+        Initialize an IndicatorCache object, which keeps computed indicator columns.
+
+        The entries are keyed by a hash of the content of the input column, the name
+        of the indicator and its parameters, and evicted least recently used first
+        when their total size exceeds max_bytes. With a directory, the entries are
+        also saved as .npy files and reloaded by the next processes.
+
+        :param max_bytes: Maximum total size of the entries kept in memory.
+        :param directory: Directory of the on-disk entries, None to keep them in memory only.
+        """
+        self._max_bytes = max_bytes
+        self._directory = directory
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, name, values, function, **params):
+        """
+        Get an indicator column, computing it only if it is not cached.
+
+        :param name: Name of the indicator (e.g., 'sma').
+        :param values: Input column (e.g., close prices).
+        :param function: Function computing the indicator as function(values, **params).
+        :return: Read-only NumPy array.
+
+        Example:
+        >>> cache = IndicatorCache()
+        >>> cache.get('double', [1.0, 2.0], lambda values, factor: values * factor, factor=2)
+        array([2., 4.])
+        >>> cache.get('double', [1.0, 2.0], lambda values, factor: values * factor, factor=2)
+        array([2., 4.])
+        >>> cache.hits, cache.misses
+        (1, 1)
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        key = (data_hash(values), name, tuple(sorted(params.items())))
+
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        path = self._get_path(key)
+        if path is not None and os.path.exists(path):
+            result = np.load(path)
+            self.disk_hits += 1
+        else:
+            result = np.asarray(function(values, **params), dtype=np.float64)
+            self.misses += 1
+            if path is not None:
+                os.makedirs(self._directory, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp.npy"
+                np.save(tmp_path, result)
+                os.replace(tmp_path, path)
+
+        result.setflags(write=False)
+        self._put(key, result)
+        return result
+
+    def _get_path(self, key):
+        if self._directory is None:
+            return None
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self._directory, f"{key[1]}_{digest}.npy")
+
+    def _put(self, key, result):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = result
+            self._size += result.nbytes
+            while self._size > self._max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def clear(self):
+        """
+        Remove the entries kept in memory.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_size(self):
+        """
+        Get the total size of the entries kept in memory.
+
+        :return: Size in bytes.
+        """
+        return self._size
+
+def data_hash(values):
+    """
+    Hash the content of a column.
+
+    :param values: Contiguous NumPy array.
+    :return: Hexadecimal digest.
+    """
+    digest = hashlib.blake2b(values, digest_size=16)
+    digest.update(f"{values.dtype}{values.shape}".encode())
+    return digest.hexdigest()
+
+# Cache shared by the strategies of the process
+cache = IndicatorCache()
+
+def sma(close, window):
+    """
+    Get the Simple Moving Average of a column, as Series.rolling(window).mean().
+
+    :param close: Close prices.
+    :param window: Number of values averaged.
+    :return: Read-only NumPy array, NaN during the warm-up.
+    """
+    return cache.get('sma', close, lambda values, window: pd.Series(values).rolling(window).mean().to_numpy(),
+                     window=window)
+
+def ema(close, span):
+    """
+    Get the Exponential Moving Average of a column, as Series.ewm(span, adjust=False).mean().
+
+    :param close: Close prices.
+    :param span: Span of the average.
+    :return: Read-only NumPy array.
+    """
+    return cache.get('ema', close, lambda values, span: pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy(),
+                     span=span)
+
+def wilder_rsi(close, period=14):
+    """
+    Calculate the Relative Strength Index with Wilder smoothing, without Python loops.
+
+    The first average gain and loss are the means of the first period changes, the
+    next ones are exponential averages with alpha = 1 / period, computed by ewm on
+    the changes preceded by that first mean.
+
+    :param close: Close prices.
+    :param period: RSI period.
+    :return: float64 NumPy array aligned with close, NaN for the first period values.
+
+    Example:
+    >>> wilder_rsi([1.0, 2.0, 3.0, 2.0], 2)
+    array([ nan,  nan, 100.,  50.])
+    """
+    close = np.asarray(close, dtype=np.float64)
+    rsi = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return rsi
+
+    changes = np.diff(close)
+    averages = []
+    for moves in (np.maximum(changes, 0), np.maximum(-changes, 0)):
+        seeded = np.concatenate(([moves[:period].mean()], moves[period:]))
+        averages.append(pd.Series(seeded).ewm(alpha=1 / period, adjust=False).mean().to_numpy())
+    average_gain, average_loss = averages
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi[period:] = np.where(average_loss == 0, 100.0, 100 - 100 / (1 + average_gain / average_loss))
+    return rsi
+
+def rsi(close, period=14):
+    """
+    Get the Wilder RSI of a column (see wilder_rsi).
+
+    :param close: Close prices.
+    :param period: RSI period.
+    :return: Read-only NumPy array, NaN for the first period values.
+    """
+    return cache.get('wilder_rsi', close, wilder_rsi, period=period)
+
+def macd(close, short_window=12, long_window=26, signal_window=9):
+    """
+    Get the MACD histogram of a column: MACD line minus its signal line.
+
+    :param close: Close prices.
+    :param short_window: Span of the short EMA.
+    :param long_window: Span of the long EMA.
+    :param signal_window: Span of the EMA of the MACD line.
+    :return: Read-only NumPy array.
+    """
+    def compute(values, short_window, long_window, signal_window):
+        line = ema(values, short_window) - ema(values, long_window)
+        return line - pd.Series(line).ewm(span=signal_window, adjust=False).mean().to_numpy()
+
+    return cache.get('macd', close, compute, short_window=short_window, long_window=long_window,
+                     signal_window=signal_window)
@@ -0,0 +1,47 @@
+"""
+This script contains the code for importing the heavy libraries when they are first used.
+
+ccxt and plotly take most of the startup time of the bot but are only needed to
+talk to an exchange or to draw a figure. A module imports them with lazy_import,
+which returns a LazyModule: the library is imported the first time one of its
+attributes is read, so headless backtests and the tests do not pay for it.
+"""
+import importlib
+import threading
+
+class LazyModule:
+    def __init__(self, name):
+        """
+        Initialize a LazyModule object, standing for a module which is not imported yet.
+
+        :param name: Full name of the module (e.g., 'plotly.graph_objects').
+        """
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attribute):
+        # Only called for the attributes of the module, once it is imported by the first one
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = 'imported' if self._module is not None else 'not imported yet'
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name):
+    """
+    Import a module the first time one of its attributes is used.
+
+    :param name: Full name of the module.
+    :return: LazyModule of the module.
+
+    Example:
+    >>> json = lazy_import('json')
+    >>> json.dumps([1])
+    '[1]'
+    """
+    return LazyModule(name)
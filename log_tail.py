@@ -0,0 +1,102 @@
+"""
+This script contains the code for following the end of the log file.
+
+LogTail remembers how far it read the file and only reads what was written since
+the previous poll, so the cost of a poll does not depend on the size of the log.
+The last lines are kept in a ring buffer for the dashboard.
+"""
+import os
+import threading
+from collections import deque
+
+class LogTail:
+    def __init__(self, path, max_lines=1000, initial_bytes=64 * 1024):
+        """
+        Initialize a LogTail object.
+
+        :param path: Path of the log file.
+        :param max_lines: Number of lines kept in memory.
+        :param initial_bytes: Number of bytes read from the end of the file at the first poll.
+        """
+        self._path = path
+        self._lines = deque(maxlen=max_lines)
+        self._initial_bytes = initial_bytes
+        self._offset = None
+        self._inode = None
+        self._partial = b''
+        self._skip_line = False
+        self._last_byte = b''
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """
+        Read the lines written since the previous poll.
+
+        If the file was replaced (rotation) or truncated (smaller, or no longer ending
+        at the offset with the last byte read), it is read again from its beginning.
+        An incomplete last line is kept until it is completed.
+
+        :return: List of the new lines.
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self._path)
+            except OSError:
+                return []
+
+            if self._offset is None:
+                # The first read starts in the middle of a line, which is skipped
+                self._offset = max(stat.st_size - self._initial_bytes, 0)
+                self._skip_line = self._offset > 0
+            elif stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._reset()
+            self._inode = stat.st_ino
+
+            with open(self._path, 'rb') as log_file:
+                if self._last_byte:
+                    log_file.seek(self._offset - 1)
+                    if log_file.read(1) != self._last_byte:
+                        self._reset()
+                if stat.st_size == self._offset:
+                    return []
+                log_file.seek(self._offset)
+                data = log_file.read(stat.st_size - self._offset)
+            self._offset += len(data)
+            self._last_byte = data[-1:]
+
+            if self._skip_line:
+                end_of_line = data.find(b'\n')
+                if end_of_line < 0:
+                    return []
+                data = data[end_of_line + 1:]
+                self._skip_line = False
+
+            complete, newline, self._partial = (self._partial + data).rpartition(b'\n')
+            if not newline:
+                return []
+
+            lines = [line.decode('utf-8', errors='replace') + '\n' for line in complete.split(b'\n')]
+            self._lines.extend(lines)
+            return lines
+
+    def _reset(self):
+        self._offset = 0
+        self._partial = b''
+        self._skip_line = False
+        self._last_byte = b''
+
+    def get_lines(self, count=None):
+        """
+        Get the last lines read.
+
+        :param count: Number of lines, every line kept if None.
+        :return: List of lines, ending with a newline.
+
+        Example:
+        >>> tail = LogTail('app.log', max_lines=3)
+        >>> tail.get_lines()
+        []
+        """
+        with self._lock:
+            lines = list(self._lines)
+        return lines if count is None else lines[-count:]
@@ -5,26 +5,48 @@ This script contains the code for a trading dashboard using Dash.
 from datetime import datetime
 import os
 import api
+import events
 import logging
+import threading
 import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
-from dash import Dash, html, dcc, Input, Output, clientside_callback, callback, State
-from dash_bootstrap_templates import load_figure_template
+from dash import Dash, html, dcc, Input, Output, clientside_callback, callback, State, ctx, Patch, no_update
 from dash.exceptions import PreventUpdate
 
-from strategy_gestion import start_trade, create_trading_logic, backtest, stop_trade, get_investment
+from strategy_gestion import backtest, zoom_backtest, get_investment
+from downsampling import get_x_range
+from log_tail import LogTail
+from bot_runner import BotRunner
 
 # Log file creation
 log_file = os.path.join(os.getcwd(), 'app.log')
 
-# Configure logging
-logging.basicConfig(filename=log_file, filemode='w', format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
-# Load templates for Plotly figures
-load_figure_template(["minty", "minty_dark"])
+log_tail = LogTail(log_file)
+
+def configure_logging():
+    """
+    Write the logs to a new app.log and push them to the dashboard as they are written.
+
+    Called when the dashboard is started, so importing this module has no side effect.
+    """
+    logging.basicConfig(filename=log_file, filemode='w', format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    event_log_handler = events.EventLogHandler()
+    event_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(event_log_handler)
+
+def load_templates():
+    """
+    Load the Plotly templates of the themes of the dashboard, when the dashboard is started.
+    """
+    from dash_bootstrap_templates import load_figure_template
+    load_figure_template(["minty", "minty_dark"])
 
 # Initialize the Dash app
 app = Dash(__name__, external_stylesheets=[dbc.themes.MINTY, dbc.icons.FONT_AWESOME])
 
+# Logs, bot status, fills and equity are pushed to assets/events.js by these endpoints
+events.register_routes(app.server)
+
 # UI elements definition
 color_mode_switch = html.Span(
     [
@@ -62,6 +84,7 @@ logs_switch = html.Div(
 )
 
 backtest_figure = go.Figure()
+displayed_backtest_figure = backtest_figure
 wallet_figure = go.Figure()
 
 trade_button = dbc.Button("Start bot", id="trade-button", n_clicks=0, color="primary",size="lg")
@@ -71,6 +94,8 @@ previous_state = {'trade': 0, 'stop': 0}
 backtest_button = dbc.Button("See backtest", id="backtest-button", n_clicks=0, color="primary",size="lg")
 previous_backtest_button = {'backtest_buton': 0}
 previous_wallet_button = {'wallet_buton': 0}
+# Version of the balance drawn in the wallet table, and currency of each of its rows
+wallet_state = {'version': 0, 'currencies': []}
 
 pair = dcc.Dropdown(
                     options=[
@@ -83,7 +108,7 @@ pair = dcc.Dropdown(
 strat = dcc.Dropdown(
                     options=[
                         {'label': 'SimpleSMA', 'value': 'SimpleSMA'},
-                        {'label': 'RSIStrategy', 'value': 'RSISrategy'},
+                        {'label': 'RSIStrategy', 'value': 'RSIStrategy'},
                         {'label': 'MACD', 'value': 'MACD'},
                         {'label': 'SMA & RSI', 'value': 'SMA_RSI'},
                         {'label': 'Mix', 'value': 'Mix'},
@@ -109,13 +134,28 @@ strat_backtest = dcc.Dropdown(
 
 user_choice = html.Div(id='user-choice')
 trading_status = html.Div(id='trading-status', children='Waiting')
+bot_status = html.Div(id='bot-status')
 percentage_message = html.Div(id='percentage-message')
 
 # Default date
 date = '2022-06-11 00:00:00'
 
-# Initialization of trading logic : no live trade
-trading_logic = create_trading_logic()
+# Live bots run in background threads : no live trade at start, the runner and its
+# thread pool are created by the first bot
+runner = None
+runner_lock = threading.Lock()
+
+def get_runner():
+    """
+    Get the runner of the live bots, creating it on first use.
+
+    :return: BotRunner object.
+    """
+    global runner
+    with runner_lock:
+        if runner is None:
+            runner = BotRunner()
+        return runner
 
 # Dash layout
 app.layout = dbc.Container(
@@ -132,7 +172,9 @@ app.layout = dbc.Container(
             dbc.Col([html.Div([dcc.Interval(
                                         id='interval-component',
                                         interval=0.5*1000,  # in milliseconds
-                                        n_intervals=0
+                                        n_intervals=0,
+                                        # Only enabled by assets/events.js when no event can be received
+                                        disabled=True
                                     ),
                                     dcc.Textarea(id='log-output', style={"width": "100%", "height": "200px"}),
                                 ])
@@ -196,6 +238,7 @@ app.layout = dbc.Container(
                     [
                         dbc.Row(user_choice),
                         dbc.Row(trading_status),
+                        dbc.Row(bot_status),
                     ],style={"position": "relative", "top": "0px", "left": "500px"}, width=10
                 ),
                 dbc.Col(
@@ -237,15 +280,12 @@ def update_logs(n):
     """
     Callback to add or remove the logs window
     """
-    global log_file
     # Max lines in the window
     max_lines = 7
 
-    with open(log_file, 'r') as log_file_handle:
-        logs = log_file_handle.readlines()
-
-    display_logs = logs[-max_lines:]
-    return ''.join(display_logs)
+    # Polling fallback: only the lines written since the previous interval are read
+    log_tail.poll()
+    return ''.join(log_tail.get_lines(max_lines))
 
 @callback(
     Output('trading-status', 'children'),
@@ -260,18 +300,41 @@ def trade(n_clicks_trade, n_clicks_stop, strat_live, pair_live, percentage, prev
     """
     Callback to handle starting and stopping trades.
     """
+    bot_id = f"{pair_live}-{strat_live}-5m"
+
     if n_clicks_trade is not None and n_clicks_trade > previous_state['trade']:
         previous_state['trade'] = n_clicks_trade
-        trading_logic['stop_flag'] = False
-        start_trade(trading_logic, "5m", pair_live, strat_live, percentage) #Ne s'arrête jamais et ne peut donc pas passer au return
-        return 'Trade started' # TODO resolve return
+        try:
+            get_runner().start_bot(bot_id, pair_live, strat_live, "5m", percentage)
+        except ValueError:
+            return f'Bot {bot_id} already running'
+        return f'Bot {bot_id} started'
     elif n_clicks_stop is not None and n_clicks_stop > previous_state['stop']:
         previous_state['stop'] = n_clicks_stop
-        stop_trade(trading_logic)
-        return 'Trade stopped'
+        try:
+            get_runner().stop_bot(bot_id)
+        except KeyError:
+            return f'No bot {bot_id}'
+        return f'Bot {bot_id} stopping'
     else:
         return previous_message
     
+@callback(
+    Output('bot-status', 'children'),
+    Input('interval-component', 'n_intervals'))
+def update_bot_status(n):
+    """
+    Callback to display the state of every bot without waiting for them, when the
+    'bots' events can not be pushed.
+    """
+    lines = []
+    for status in get_runner().list_bots():
+        line = f"{status['bot_id']} : {status['state']}, {status['evaluations']} candles evaluated"
+        if status['error']:
+            line += f" ({status['error']})"
+        lines.append(html.Div(line))
+    return lines
+
 @callback(
     Output('output-date', 'children'),
     Input('input-date', 'value')
@@ -306,6 +369,49 @@ def toggle_graph_visibility(n_clicks):
     style = {"display": "block" if n_clicks % 2 == 1 else "none"}
     return style
 
+def refresh_wallet_figure():
+    """
+    Update the wallet table with the rows of the balance which changed since it was drawn.
+
+    :return: Patch of the wallet figure with the changed cells, no_update if no row changed
+             or the balance could not be fetched, or None if the whole figure was drawn again.
+    """
+    global wallet_figure
+
+    try:
+        version, changed, removed = api.balances.get_changes(wallet_state['version'])
+    except Exception as e:
+        # The last wallet table stays on screen until the exchange answers again
+        logging.info(f"Could not refresh the wallet: {type(e).__name__} {e}")
+        api.add_data("Could not refresh the wallet.", str(api.datetime.now()))
+        return no_update
+    if removed or not wallet_state['currencies']:
+        df_account = api.get_info_account()
+        if df_account is not None:
+            wallet_figure = api.plot_info_account(df_account)
+            wallet_state.update(version=version, currencies=df_account['Currency'].tolist())
+        return None
+    if not changed:
+        return no_update
+
+    patched = Patch()
+    values = [list(column) for column in wallet_figure.data[0].cells.values]
+    for currency, row in changed.items():
+        cells = [currency, row['Total'], row['Free'], row['Used']]
+        if currency in wallet_state['currencies']:
+            index = wallet_state['currencies'].index(currency)
+            for column, cell in enumerate(cells[1:], start=1):
+                values[column][index] = cell
+                patched['data'][0]['cells']['values'][column][index] = cell
+        else:
+            wallet_state['currencies'].append(currency)
+            for column, cell in enumerate(cells):
+                values[column].append(cell)
+                patched['data'][0]['cells']['values'][column].append(cell)
+    wallet_figure.data[0].cells.values = values
+    wallet_state['version'] = version
+    return patched
+
 @callback(
     [Output("backtest-figure", "figure"),
      Output("wallet-figure", "figure")],
@@ -315,31 +421,44 @@ def toggle_graph_visibility(n_clicks):
      Input("backtest-button", "n_clicks"),
      Input('slider', 'value'),
      Input('wallet-button', 'n_clicks'),
-     Input("wallet-figure", "style")],
+     Input("wallet-figure", "style"),
+     Input("backtest-figure", "relayoutData")],
     allow_duplicate=True
 )
-def update_figures(switch_on, selected_strat, selected_pair, n_clicks_backtest, slider_value, n_clicks_wallet, wallet_style):
+def update_figures(switch_on, selected_strat, selected_pair, n_clicks_backtest, slider_value, n_clicks_wallet, wallet_style, relayout_data):
     """
     Callback to update figures based on selected parameters.
     """
     global date
     global backtest_figure
+    global displayed_backtest_figure
     global wallet_figure
 
     if n_clicks_backtest is not None and n_clicks_backtest > previous_backtest_button['backtest_buton']:
         previous_backtest_button['backtest_buton'] = n_clicks_backtest
         backtest_figure = backtest(slider_value, "5m", selected_pair,selected_strat,date)
+        displayed_backtest_figure = backtest_figure
+
+    # Zoom: draw the selected range again at full resolution
+    if ctx.triggered_id == "backtest-figure":
+        x_range = get_x_range(relayout_data)
+        if x_range is None:
+            raise PreventUpdate
+        displayed_backtest_figure = zoom_backtest(backtest_figure, x_range)
         
     if n_clicks_wallet is not None and wallet_style["display"] == "block":
         previous_wallet_button['wallet_buton'] = n_clicks_wallet
-        df_account = api.get_info_account()
-        wallet_figure = api.plot_info_account(df_account)
+        # Only the changed rows are sent when the wallet alone is updated
+        wallet_patch = refresh_wallet_figure()
+        if wallet_patch is not None and ctx.triggered_id in ("wallet-button", "wallet-figure"):
+            return no_update, wallet_patch
 
     template = "minty" if switch_on else "minty_dark"
-    backtest_figure.update_layout(template=template)
+    # The backtest figures are shared by the sessions through the backtest cache: the theme goes on a copy
+    themed_backtest_figure = go.Figure(displayed_backtest_figure).update_layout(template=template)
     wallet_figure.update_layout(template=template)
 
-    return backtest_figure, wallet_figure
+    return themed_backtest_figure, wallet_figure
 
 @callback(
     [Output("analysis", "style"),
@@ -399,5 +518,7 @@ clientside_callback(
 )
 
 if __name__ == "__main__":
+    configure_logging()
+    load_templates()
     api.create_database()
     app.run_server(debug=True)
@@ -0,0 +1,331 @@
+"""
+This script contains the code for the concurrent download of market data.
+
+Every call made to an exchange through this module first takes a token from a
+token bucket shared by all the threads using that exchange, refilled at the
+pace allowed by the exchange `rateLimit` (milliseconds between two requests).
+
+The live requests (candles, balance, tickers) of the bots and the dashboard go
+through a MarketDataCache, where identical concurrent requests share one call
+to the exchange.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import api
+from candle_store import merge_ranges, timeframe_to_milliseconds
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1.0):
+        """
+        Initialize a TokenBucket object.
+
+        :param rate: Number of tokens added per second.
+        :param capacity: Maximum number of tokens kept for bursts.
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        """
+        Take tokens from the bucket, waiting until they are available.
+
+        Tokens are reserved under the lock and the wait happens outside of it, so
+        the callers are served in order and never wait longer than needed.
+
+        :param tokens: Number of tokens to take.
+        :return: Time waited, in seconds.
+
+        Example:
+        >>> bucket = TokenBucket(rate=1000, capacity=1)
+        >>> bucket.acquire()
+        0
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            self._tokens -= tokens
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+        return wait
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(client):
+    """
+    Get the token bucket shared by every user of an exchange.
+
+    :param client: ccxt exchange.
+    :return: TokenBucket refilled at 1000 / client.rateLimit tokens per second.
+    """
+    with _rate_limiters_lock:
+        if client.id not in _rate_limiters:
+            _rate_limiters[client.id] = TokenBucket(rate=1000 / max(client.rateLimit, 1))
+        return _rate_limiters[client.id]
+
+class RateLimitedExchange:
+    def __init__(self, client, limiter=None):
+        """
+        Initialize a RateLimitedExchange object, a ccxt exchange whose requests share a token bucket.
+
+        :param client: ccxt exchange.
+        :param limiter: TokenBucket to use, the one shared by the exchange if None.
+        """
+        self._client = client
+        self._limiter = limiter or get_rate_limiter(client)
+
+    def fetch_ohlcv(self, *args, **kwargs):
+        self._limiter.acquire()
+        return self._client.fetch_ohlcv(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+def split_range(start, end, step):
+    """
+    Split a [start, end) range into consecutive ranges of at most step.
+
+    Example:
+    >>> split_range(0, 25, 10)
+    [(0, 10), (10, 20), (20, 25)]
+    """
+    return [(chunk_start, min(chunk_start + step, end)) for chunk_start in range(start, end, step)]
+
+def fetch_historical_data(jobs, client=None, max_workers=8, page_size=1000):
+    """
+    Download the missing candles of many (pair, timeframe, since, until) jobs at once.
+
+    The missing ranges of every series are split into pages which are fetched by a
+    thread pool, so the total time depends on the number of requests and the rate
+    limit of the exchange, not on the number of jobs. Each series is written once
+    to the candle store, when all of its pages are downloaded. A page which can not
+    be downloaded is logged and skipped: the other pages of its series are still
+    written, only their ranges being recorded as covered, so the next call fetches
+    the failed page again. Likewise, the end of a page after the last candle received
+    is not recorded as covered.
+
+    :param jobs: Iterable of (pair, timeframe, since, until) tuples, until can be None.
+    :param client: Exchange to use, name or ccxt exchange (see api.get_exchange), the default one if None.
+    :param max_workers: Number of concurrent requests.
+    :param page_size: Number of candles requested per call.
+    :return: Tuple (downloaded, failed): dictionary {(pair, timeframe): number of candles downloaded}
+             and dictionary {(pair, timeframe): list of (start, end, error)} of the pages which failed.
+    """
+    client = RateLimitedExchange(api.get_exchange(client))
+
+    missing = {}
+    for pair, timeframe, since, until in jobs:
+        missing.setdefault((pair, timeframe), []).extend(
+            api.get_missing_ranges(pair, timeframe, since, until, client))
+
+    pages = {}
+    for (pair, timeframe), ranges in missing.items():
+        step = page_size * timeframe_to_milliseconds(timeframe)
+        pages[(pair, timeframe)] = [page for start, end in merge_ranges(ranges)
+                                    for page in split_range(start, end, step)]
+
+    logging.info(f"Downloading {sum(map(len, pages.values()))} pages for {len(pages)} series...")
+    api.add_data(f"Downloading {sum(map(len, pages.values()))} pages for {len(pages)} series...",
+                 str(api.datetime.now()))
+
+    downloaded = {series: 0 for series in pages}
+    failed = {}
+    results = {series: [] for series in pages}
+    remaining = {series: len(series_pages) for series, series_pages in pages.items()}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(api.fetch_range, pair, timeframe, start, end, client): (pair, timeframe, start, end)
+                   for (pair, timeframe), series_pages in pages.items() for start, end in series_pages}
+
+        for future in as_completed(futures):
+            pair, timeframe, start, end = futures[future]
+            try:
+                results[(pair, timeframe)].append((start, end, future.result()))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                failed.setdefault((pair, timeframe), []).append((start, end, error))
+                logging.warning(f"Could not download {pair} {timeframe} from {start} to {end}: {error}")
+                api.add_data(f"Could not download {pair} {timeframe} from {start} to {end}: {error}",
+                             str(api.datetime.now()))
+            remaining[(pair, timeframe)] -= 1
+
+            if remaining[(pair, timeframe)] == 0:
+                series_results = results.pop((pair, timeframe))
+                if not series_results:
+                    continue
+                ohlcv = [candle for _, _, candles in series_results for candle in candles]
+                covered = [covered_range for start, end, candles in series_results
+                           for covered_range in api.get_covered_ranges(candles, timeframe, start, end)]
+                api.candle_store.write(client.id, pair, timeframe, ohlcv, covered=covered)
+                downloaded[(pair, timeframe)] = len(ohlcv)
+
+    return downloaded, failed
+
+def warm_universe(pairs, timeframes, since, until=None, client=None, max_workers=8):
+    """
+    Download the missing candles of every pair and timeframe.
+
+    :param pairs: List of trading pairs (e.g., ['BTC/USDT', 'ETH/USDT']).
+    :param timeframes: List of timeframes (e.g., ['5m', '1h']).
+    :param since: Start date for data retrieval.
+    :param until: End date (excluded) for data retrieval, None for the last closed candle.
+    :return: Tuple (downloaded, failed), see fetch_historical_data.
+    """
+    jobs = [(pair, timeframe, since, until) for pair in pairs for timeframe in timeframes]
+    return fetch_historical_data(jobs, client, max_workers)
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Initialize a SingleFlight object, which runs concurrent calls with the same key only once.
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Call a function, or wait for the call with the same key already in flight.
+
+        :param key: Hashable key identifying the call.
+        :param function: Function without arguments making the call.
+        :return: Tuple (result, shared), shared being True if the result came from another caller.
+
+        Example:
+        >>> SingleFlight().do(('ticker', 'BTC/USDT'), lambda: 42)
+        (42, False)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = function()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+        return call['result'], False
+
+class MarketDataCache:
+    def __init__(self, fetch_ohlcv=None, fetch_balance=None, fetch_ticker=None, ticker_ttl=1.0, clock=time.time,
+                 max_entries=256):
+        """
+        Initialize a MarketDataCache object, which shares the market data requests of the bots and the dashboard.
+
+        Identical concurrent requests share one call to the exchange. The candles are
+        also kept until the current candle closes and the tickers for ticker_ttl
+        seconds; the balance is not kept (see balance.BalanceCache).
+
+        :param fetch_ohlcv: Function with the signature of api.get_ohlcv, api.get_ohlcv if None.
+        :param fetch_balance: Function fetch_balance(client), the fetch_balance of the exchange if None.
+        :param fetch_ticker: Function fetch_ticker(symbol, client), the fetch_ticker of the exchange if None.
+        :param ticker_ttl: Seconds during which a ticker is reused.
+        :param clock: Function returning the current time in seconds.
+        :param max_entries: Number of entries above which the expired ones are removed.
+        """
+        self._fetch_ohlcv = fetch_ohlcv or api.get_ohlcv
+        self._fetch_balance = fetch_balance or (lambda client: api.get_exchange(client).fetch_balance())
+        self._fetch_ticker = fetch_ticker or (lambda symbol, client: api.get_exchange(client).fetch_ticker(symbol))
+        self._ticker_ttl = ticker_ttl
+        self._clock = clock
+        self._max_entries = max_entries
+        self._flight = SingleFlight()
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {kind: {'hits': 0, 'shared': 0, 'misses': 0} for kind in ('ohlcv', 'balance', 'ticker')}
+
+    def _get(self, kind, key, expires_at, function):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[0]:
+                self.stats[kind]['hits'] += 1
+                return entry[1]
+
+        result, shared = self._flight.do(key, function)
+
+        with self._lock:
+            self.stats[kind]['shared' if shared else 'misses'] += 1
+            if not shared and result is not None and expires_at > now:
+                if len(self._entries) >= self._max_entries:
+                    self._entries = {key: entry for key, entry in self._entries.items() if now < entry[0]}
+                self._entries[key] = (expires_at, result)
+        return result
+
+    def get_ohlcv(self, symbol, timeframe, since=None, limit=None, client=None, arrays=False):
+        """
+        Get OHLCV data, fetching it only once per candle for identical requests.
+
+        :param symbol: Trading pair symbol.
+        :param timeframe: Timeframe for OHLCV data.
+        :param since: Timestamp indicating the start time for data retrieval.
+        :param limit: Limit the number of data points to retrieve.
+        :param client: Exchange to use (see api.get_exchange), the default one if None.
+        :param arrays: True to get the column arrays instead of a DataFrame (see api.get_ohlcv).
+        :return: Pandas DataFrame or dictionary of NumPy arrays with OHLCV data, shared by the callers:
+                 it must not be modified.
+        """
+        duration = timeframe_to_milliseconds(timeframe)
+        next_close = (int(self._clock() * 1000) // duration + 1) * duration / 1000
+        # The optional arguments are only given when used, for the fetch functions without them
+        options = {}
+        if client is not None:
+            options['client'] = client
+        if arrays:
+            options['arrays'] = True
+        fetch = lambda: self._fetch_ohlcv(symbol, timeframe, since=since, limit=limit, **options)
+        return self._get('ohlcv', ('ohlcv', client, symbol, timeframe, since, limit, arrays), next_close, fetch)
+
+    def fetch_balance(self, client=None):
+        """
+        Fetch the balance of the account, sharing the call with the concurrent callers.
+
+        :param client: Exchange to use (see api.get_exchange), the default one if None.
+        :return: Balance in the ccxt format.
+        """
+        return self._get('balance', ('balance', client), 0, lambda: self._fetch_balance(client))
+
+    def fetch_ticker(self, symbol, client=None):
+        """
+        Fetch the ticker of a pair, reused for ticker_ttl seconds.
+
+        :param symbol: Trading pair symbol.
+        :param client: Exchange to use (see api.get_exchange), the default one if None.
+        :return: Ticker in the ccxt format.
+        """
+        return self._get('ticker', ('ticker', client, symbol), self._clock() + self._ticker_ttl,
+                         lambda: self._fetch_ticker(symbol, client))
+
+    def get_stats(self):
+        """
+        Get the hit and miss counters.
+
+        :return: Dictionary {kind: {'hits', 'shared', 'misses'}} for 'ohlcv', 'balance' and 'ticker';
+                 hits are served from the cache, shared from a call in flight, misses from the exchange.
+        """
+        with self._lock:
+            return {kind: dict(counters) for kind, counters in self.stats.items()}
+
+# Market data requests of the bots and the dashboard of the process
+cache = MarketDataCache()
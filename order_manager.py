@@ -0,0 +1,444 @@
+"""
+This script contains the code for sending orders to the exchange and following them.
+
+The live loop hands its orders to an OrderManager and goes on at once: the orders
+are queued and sent by a background thread, several at a time with create_orders
+when the exchange supports it. Every order has a client order id, sent to the
+exchange, so an order whose answer was lost is found again instead of being sent
+twice. The open orders are polled (or updated from a websocket feed through
+handle_update) until they are filled, and the delays between submission,
+acknowledgement and fill are recorded in latency histograms.
+
+MockExchange simulates the acknowledgements and partial fills of an exchange
+locally, for the tests and for paper trading.
+"""
+import time
+import queue
+import bisect
+import hashlib
+import logging
+import itertools
+import threading
+
+import api
+from lazy import lazy_import
+
+# ccxt is only imported when an error of the exchange is handled
+ccxt = lazy_import('ccxt')
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+# Statuses after which an order no longer changes
+FINAL_STATUSES = ('closed', 'canceled', 'rejected', 'expired')
+
+def make_client_order_id(*parts):
+    """
+    Make a client order id from the parts identifying an order.
+
+    The same parts (e.g. bot, candle close and side) always give the same id, so an
+    order sent again for the same decision is recognized by the exchange and by the
+    OrderManager.
+
+    :param parts: Values identifying the order.
+    :return: Alphanumeric id of 25 characters.
+
+    Example:
+    >>> make_client_order_id('BTC/USDT', 1686441600000, 'buy') == make_client_order_id('BTC/USDT', 1686441600000, 'buy')
+    True
+    >>> len(make_client_order_id('BTC/USDT', 1686441600000, 'buy'))
+    25
+    """
+    return 'x' + hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Initialize a LatencyHistogram object, which counts durations in fixed buckets.
+
+        :param buckets: Sorted upper bounds of the buckets, in milliseconds.
+        """
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """
+        Add a duration.
+
+        :param seconds: Duration in seconds.
+        """
+        milliseconds = seconds * 1000
+        with self._lock:
+            self._counts[bisect.bisect_left(self._buckets, milliseconds)] += 1
+            self.count += 1
+            self.max = max(self.max, milliseconds)
+
+    def percentile(self, q):
+        """
+        Get the upper bound of the bucket holding a percentile.
+
+        :param q: Percentile, between 0 and 100.
+        :return: Duration in milliseconds (the largest duration recorded for the last bucket), None if empty.
+
+        Example:
+        >>> histogram = LatencyHistogram()
+        >>> for seconds in (0.003, 0.004, 0.040, 0.300):
+        ...     histogram.record(seconds)
+        >>> histogram.percentile(50), histogram.percentile(100)
+        (5, 500)
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = max(1, -(-q * self.count // 100))
+            for index, cumulative in enumerate(itertools.accumulate(self._counts)):
+                if cumulative >= rank:
+                    return self._buckets[index] if index < len(self._buckets) else self.max
+
+    def summary(self):
+        """
+        Summarize the histogram.
+
+        :return: Dictionary with the count, the 50th, 90th and 99th percentiles and the maximum, in milliseconds.
+        """
+        return {'count': self.count, 'p50': self.percentile(50), 'p90': self.percentile(90),
+                'p99': self.percentile(99), 'max': round(self.max, 3)}
+
+class OrderManager:
+    def __init__(self, client=None, batch_size=10, poll_interval=1.0, max_retries=3, retry_delay=0.5,
+                 clock=time.time):
+        """
+        Initialize an OrderManager object and start its submission and tracking threads.
+
+        :param client: ccxt exchange (or MockExchange) receiving the orders, api.exchange if None.
+        :param batch_size: Maximum number of orders sent in one create_orders call.
+        :param poll_interval: Seconds between two polls of the open orders.
+        :param max_retries: Number of times an order is sent again after a network error.
+        :param retry_delay: Seconds waited before the first retry, doubled at each retry.
+        :param clock: Function returning the current time in seconds.
+        """
+        self._client = client or api.exchange
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_retries = max_retries
+        self._retry_delay = retry_delay
+        self._clock = clock
+        self._orders = {}
+        self._condition = threading.Condition()
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self.latencies = {'submit_to_ack': LatencyHistogram(), 'ack_to_fill': LatencyHistogram(),
+                          'submit_to_fill': LatencyHistogram()}
+
+        self._threads = [threading.Thread(target=self._submit_loop, name="OrderSubmitter", daemon=True),
+                         threading.Thread(target=self._track_loop, name="OrderTracker", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, pair, side, amount, order_type='market', price=None, params=None, client_order_id=None):
+        """
+        Queue an order, without waiting for the exchange.
+
+        Submitting again a client order id which is already known does not send a
+        second order.
+
+        :param pair: Trading pair symbol.
+        :param side: 'buy' or 'sell'.
+        :param amount: Amount of the base currency.
+        :param order_type: 'market' or 'limit'.
+        :param price: Limit price, None for market orders.
+        :param params: Extra parameters of the exchange (e.g., stop loss).
+        :param client_order_id: Id of the order on our side, a new one if None.
+        :return: Client order id.
+        """
+        with self._condition:
+            if client_order_id is None:
+                client_order_id = make_client_order_id(pair, side, amount, self._clock(), len(self._orders))
+            if client_order_id in self._orders:
+                return client_order_id
+
+            order = {
+                'client_order_id': client_order_id,
+                'exchange_order_id': None,
+                'pair': pair,
+                'side': side,
+                'type': order_type,
+                'amount': amount,
+                'price': price,
+                'params': dict(params or {}),
+                'status': 'queued',
+                'filled': 0.0,
+                'cost': 0.0,
+                'submitted_at': self._clock(),
+                'acked_at': None,
+                'filled_at': None,
+                'error': None,
+            }
+            self._orders[client_order_id] = order
+
+        self._record(order)
+        self._queue.put(client_order_id)
+        return client_order_id
+
+    def _submit_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            # The orders queued meanwhile are sent together
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._condition:
+                orders = [self._orders[client_order_id] for client_order_id in batch]
+            self._send(orders)
+
+    def _send(self, orders, attempt=0):
+        requests = [{'symbol': order['pair'], 'type': order['type'], 'side': order['side'], 'amount': order['amount'],
+                     'price': order['price'], 'params': {**order['params'], 'clientOrderId': order['client_order_id']}}
+                    for order in orders]
+        batched = len(orders) > 1 and self._client.has.get('createOrders')
+        responses = []
+        error = None
+        try:
+            if batched:
+                responses = self._client.create_orders(requests)
+            else:
+                for request in requests:
+                    responses.append(self._client.create_order(**request))
+        except Exception as e:
+            error = e
+
+        # The orders answered before an error are live on the exchange: they are never sent again
+        for order, response in zip(orders, responses):
+            self.handle_update(response, order['client_order_id'])
+        if error is None:
+            return
+        orders = orders[len(responses):]
+
+        if isinstance(error, (ccxt.NetworkError, ccxt.DuplicateOrderId)):
+            # The exchange may have received the orders: look for them before sending them again
+            pending = [order for order in orders if not self._find(order)]
+            if not pending:
+                return
+            if attempt >= self._max_retries or isinstance(error, ccxt.DuplicateOrderId):
+                for order in pending:
+                    self._reject(order, error)
+                return
+            logging.warning(f"Order submission failed ({type(error).__name__}), retry {attempt + 1} of {self._max_retries}")
+            time.sleep(self._retry_delay * 2 ** attempt)
+            self._send(pending, attempt + 1)
+        elif batched:
+            # One rejected order must not reject the others of the batch
+            for order in orders:
+                self._send([order], attempt)
+        else:
+            # Only the order which failed is rejected, the next ones were not sent yet
+            self._reject(orders[0], error)
+            if len(orders) > 1:
+                self._send(orders[1:], attempt)
+
+    def _find(self, order):
+        for fetch in (self._client.fetch_open_orders, self._client.fetch_closed_orders):
+            try:
+                found = [response for response in fetch(order['pair'])
+                         if response.get('clientOrderId') == order['client_order_id']]
+            except Exception:
+                continue
+            if found:
+                self.handle_update(found[0], order['client_order_id'])
+                return True
+        return False
+
+    def _reject(self, order, error):
+        with self._condition:
+            order['status'] = 'rejected'
+            order['error'] = f"{type(error).__name__}: {error}"
+        logging.info(f"Order {order['client_order_id']} rejected: {order['error']}")
+        api.add_data(f"Order {order['client_order_id']} rejected: {order['error']}", str(api.datetime.now()))
+        self._record(order)
+        with self._condition:
+            self._condition.notify_all()
+
+    def handle_update(self, response, client_order_id=None):
+        """
+        Update an order from an order structure of the exchange.
+
+        Used with the answers of create_order and fetch_order, and with the updates of a
+        websocket feed (e.g., the orders returned by ccxt.pro watch_orders).
+
+        :param response: ccxt order structure.
+        :param client_order_id: Id of the order on our side, response['clientOrderId'] if None.
+        """
+        now = self._clock()
+        client_order_id = client_order_id or response.get('clientOrderId')
+        with self._condition:
+            order = self._orders.get(client_order_id)
+            if order is None or order['status'] in FINAL_STATUSES:
+                return
+
+            if order['acked_at'] is None:
+                order['acked_at'] = now
+                order['exchange_order_id'] = response.get('id')
+                self.latencies['submit_to_ack'].record(now - order['submitted_at'])
+
+            filled = response.get('filled') or 0.0
+            cost = response.get('cost') or 0.0
+            new_fill = None
+            if filled > order['filled']:
+                amount = filled - order['filled']
+                price = (cost - order['cost']) / amount if cost > order['cost'] else response.get('average') or response.get('price')
+                new_fill = (amount, price)
+                order['filled'], order['cost'] = filled, cost
+
+            status = response.get('status') or 'open'
+            if status == 'open' and order['filled'] > 0:
+                status = 'partially_filled'
+            changed = status != order['status']
+            order['status'] = status
+
+            if status == 'closed' and order['filled_at'] is None:
+                order['filled_at'] = now
+                self.latencies['ack_to_fill'].record(now - order['acked_at'])
+                self.latencies['submit_to_fill'].record(now - order['submitted_at'])
+
+        if new_fill is not None:
+            api.add_fill(client_order_id, order['pair'], now * 1000, new_fill[1] or 0.0, new_fill[0],
+                         (response.get('fee') or {}).get('cost') or 0.0)
+        if changed:
+            self._record(order)
+        # The waiting callers are woken up once the fill and the status are recorded
+        with self._condition:
+            self._condition.notify_all()
+
+    def _record(self, order):
+        api.add_order(order['client_order_id'], order['pair'], order['side'], order['type'], order['amount'],
+                      order['price'], order['status'], self._clock() * 1000, order['exchange_order_id'])
+
+    def _track_loop(self):
+        while not self._stop_event.wait(self._poll_interval):
+            with self._condition:
+                open_orders = [dict(order) for order in self._orders.values()
+                               if order['exchange_order_id'] is not None and order['status'] not in FINAL_STATUSES]
+            for order in open_orders:
+                try:
+                    self.handle_update(self._client.fetch_order(order['exchange_order_id'], order['pair']),
+                                       order['client_order_id'])
+                except Exception as e:
+                    logging.warning(f"Could not poll order {order['client_order_id']}: {type(e).__name__}: {e}")
+
+    def get_order(self, client_order_id):
+        """
+        Get the state of an order.
+
+        :param client_order_id: Id of the order on our side.
+        :return: Copy of the order dictionary (status, filled amount, timestamps...).
+        """
+        with self._condition:
+            return dict(self._orders[client_order_id])
+
+    def wait(self, client_order_id, timeout=None, statuses=FINAL_STATUSES):
+        """
+        Wait until an order reaches one of some statuses.
+
+        :param client_order_id: Id of the order on our side.
+        :param timeout: Maximum waiting time in seconds, None to wait without limit.
+        :param statuses: Statuses waited for, the final ones by default.
+        :return: Copy of the order dictionary.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._orders[client_order_id]['status'] in statuses, timeout)
+            return dict(self._orders[client_order_id])
+
+    def get_latencies(self):
+        """
+        Get the summary of the latency histograms.
+
+        :return: Dictionary {stage: summary} for submit_to_ack, ack_to_fill and submit_to_fill.
+        """
+        return {stage: histogram.summary() for stage, histogram in self.latencies.items()}
+
+    def stop(self):
+        """
+        Stop the submission and tracking threads.
+        """
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+
+class MockExchange:
+    def __init__(self, price=100.0, fill_steps=1, latency=0.0, lost_acks=0, reject=()):
+        """
+        Initialize a MockExchange object, a local exchange with the ccxt order methods.
+
+        Every order is acknowledged open, then each fetch_order fills another
+        1 / fill_steps of its amount at the current price.
+
+        :param price: Execution price of the orders.
+        :param fill_steps: Number of partial fills of an order.
+        :param latency: Seconds spent by each call.
+        :param lost_acks: Number of orders created whose answer is lost (raising RequestTimeout).
+        :param reject: Client order ids rejected with InvalidOrder.
+        """
+        self.has = {'createOrders': True}
+        self.price = price
+        self.fill_steps = fill_steps
+        self.latency = latency
+        self.lost_acks = lost_acks
+        self.reject = set(reject)
+        self.orders = {}
+        self.calls = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self.calls.append('create_order')
+        return self._create(symbol, type, side, amount, price, params or {})
+
+    def create_orders(self, orders):
+        self.calls.append('create_orders')
+        return [self._create(order['symbol'], order['type'], order['side'], order['amount'], order.get('price'),
+                             order.get('params') or {}) for order in orders]
+
+    def _create(self, symbol, type, side, amount, price, params):
+        time.sleep(self.latency)
+        client_order_id = params.get('clientOrderId')
+        with self._lock:
+            if client_order_id in self.reject:
+                raise ccxt.InvalidOrder(f"Order {client_order_id} rejected")
+            if any(order['clientOrderId'] == client_order_id for order in self.orders.values()):
+                raise ccxt.DuplicateOrderId(f"Order {client_order_id} already exists")
+            order = {'id': str(next(self._ids)), 'clientOrderId': client_order_id, 'symbol': symbol, 'type': type,
+                     'side': side, 'amount': amount, 'price': price, 'status': 'open', 'filled': 0.0, 'cost': 0.0,
+                     'average': None, 'fee': {'cost': 0.0}}
+            self.orders[order['id']] = order
+            if self.lost_acks > 0:
+                self.lost_acks -= 1
+                raise ccxt.RequestTimeout("Answer of create_order lost")
+            return dict(order)
+
+    def fetch_order(self, id, symbol=None):
+        time.sleep(self.latency)
+        with self._lock:
+            order = self.orders[id]
+            if order['status'] == 'open':
+                order['filled'] = min(order['amount'], order['filled'] + order['amount'] / self.fill_steps)
+                if order['amount'] - order['filled'] < 1e-12 * order['amount']:
+                    order['filled'], order['status'] = order['amount'], 'closed'
+                order['cost'] = order['filled'] * self.price
+                order['average'] = self.price
+            return dict(order)
+
+    def fetch_open_orders(self, symbol=None):
+        with self._lock:
+            return [dict(order) for order in self.orders.values() if order['status'] == 'open']
+
+    def fetch_closed_orders(self, symbol=None):
+        with self._lock:
+            return [dict(order) for order in self.orders.values() if order['status'] != 'open']
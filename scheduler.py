@@ -0,0 +1,141 @@
+"""
+This script contains the code for waking the live strategies when a candle closes.
+
+The live loop asks an event source for the next candle close instead of polling
+the exchange: CandleScheduler waits for the next timeframe boundary of the clock,
+KlineEventSource hands out the closes pushed to it (by a test, a replay or the
+websocket feed of WebsocketKlineSource).
+"""
+import time
+import queue
+import logging
+import threading
+
+import api
+from candle_store import timeframe_to_milliseconds
+
+# Longest sleep between two checks of the stop flag, in seconds
+STOP_CHECK_INTERVAL = 0.25
+
+class CandleScheduler:
+    def __init__(self, timeframe, delay=1.0, clock=time.time):
+        """
+        Initialize a CandleScheduler object.
+
+        :param timeframe: Timeframe of the candles (e.g., '5m').
+        :param delay: Seconds waited after the boundary so the exchange has closed the candle.
+        :param clock: Function returning the current time in seconds.
+        """
+        self._duration = timeframe_to_milliseconds(timeframe)
+        self._delay = delay
+        self._clock = clock
+        self._last_close = None
+
+    def next_close(self, now=None):
+        """
+        Get the time of the next candle close.
+
+        :param now: Current time in seconds, the clock time if None.
+        :return: Timestamp of the next close in milliseconds.
+
+        Example:
+        >>> CandleScheduler('5m').next_close(now=1654905720)
+        1654905900000
+        """
+        now_ms = int((self._clock() if now is None else now) * 1000)
+        return (now_ms // self._duration + 1) * self._duration
+
+    def wait(self, trading_logic):
+        """
+        Wait for the next candle close.
+
+        :param trading_logic: Dictionary holding trading logic parameters, the wait stops with its stop flag.
+        :return: Timestamp of the close in milliseconds, or None if trading was stopped.
+        """
+        close = self.next_close()
+        if self._last_close is not None and close <= self._last_close:
+            close = self._last_close + self._duration
+
+        wake_up = close / 1000 + self._delay
+        while not trading_logic['stop_flag']:
+            remaining = wake_up - self._clock()
+            if remaining <= 0:
+                self._last_close = close
+                return close
+            time.sleep(min(remaining, STOP_CHECK_INTERVAL))
+        return None
+
+class KlineEventSource:
+    def __init__(self):
+        """
+        Initialize a KlineEventSource object, which hands out the candle closes pushed to it.
+        """
+        self._closes = queue.Queue()
+
+    def push(self, close):
+        """
+        Signal that a candle closed.
+
+        :param close: Timestamp of the close (open time of the next candle) in milliseconds.
+        """
+        self._closes.put(close)
+
+    def wait(self, trading_logic):
+        """
+        Wait for the next candle close.
+
+        :param trading_logic: Dictionary holding trading logic parameters, the wait stops with its stop flag.
+        :return: Timestamp of the close in milliseconds, or None if trading was stopped.
+        """
+        while not trading_logic['stop_flag']:
+            try:
+                return self._closes.get(timeout=STOP_CHECK_INTERVAL)
+            except queue.Empty:
+                pass
+        return None
+
+class WebsocketKlineSource(KlineEventSource):
+    def __init__(self, pair, timeframe, exchange_id='mexc'):
+        """
+        Initialize a WebsocketKlineSource object, which pushes a close each time the
+        websocket kline stream of the exchange starts a new candle.
+
+        :param pair: Trading pair (e.g., 'BTC/USDT').
+        :param timeframe: Timeframe of the candles (e.g., '5m').
+        :param exchange_id: Id of the ccxt.pro exchange.
+        """
+        super().__init__()
+        self._pair = pair
+        self._timeframe = timeframe
+        self._exchange_id = exchange_id
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"Kline {pair} {timeframe}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop listening to the websocket.
+        """
+        self._running = False
+
+    def _run(self):
+        import asyncio
+        asyncio.run(self._watch())
+
+    async def _watch(self):
+        import ccxt.pro
+
+        client = getattr(ccxt.pro, self._exchange_id)()
+        last_open = None
+        try:
+            while self._running:
+                candles = await client.watch_ohlcv(self._pair, self._timeframe)
+                current_open = candles[-1][0]
+                if last_open is not None and current_open > last_open:
+                    self.push(current_open)
+                last_open = current_open
+        except Exception as e:
+            logging.warning(f"Kline stream of {self._pair} stopped: {type(e).__name__} {e}")
+            api.add_data(f"Kline stream of {self._pair} stopped", str(api.datetime.now()))
+        finally:
+            await client.close()
@@ -1,13 +1,105 @@
 """
 This script contains the code of the differents strategies.
 """
-import os
 import api
 import logging
+import functools
+import indicators
+import downsampling
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from tqdm import tqdm
+from lazy import lazy_import
+from candle_store import candles_to_arrays
+from candle_window import CandleWindow
+
+# plotly is only imported when a figure is drawn
+go = lazy_import('plotly.graph_objects')
+plotly_subplots = lazy_import('plotly.subplots')
+
+def plot_backtest(plot_data, max_points=downsampling.PLOT_POINTS, x_range=None):
+    """
+    Build the backtest figure, every trace being downsampled to max_points with WebGL lines.
+
+    :param plot_data: Dictionary returned by BaseStrategy.get_plot_data.
+    :param max_points: Maximum number of points per trace.
+    :param x_range: Optional (start, end) range of dates to draw, the whole backtest if None.
+    :return: Plotly figure object.
+    """
+    price = downsampling.downsample(*plot_data['price'], max_points, x_range)
+    portfolio = downsampling.downsample(*plot_data['portfolio'], max_points, x_range)
+    changes = downsampling.downsample(*plot_data['changes'], max_points, x_range, method='minmax')
+
+    fig = plotly_subplots.make_subplots(rows=3, cols=1, shared_xaxes=True)
+    fig.add_trace(go.Scattergl(x=price[0], y=price[1], mode='lines', name=f"Values of {plot_data['pair']}"),
+                  row=1, col=1)
+    fig.add_trace(go.Scattergl(x=portfolio[0], y=portfolio[1], mode='lines', name='Portfolio Values'), row=2, col=1)
+    fig.add_trace(go.Bar(x=changes[0], y=changes[1], name='Portfolio Changes'), row=3, col=1)
+    fig.update_layout(title_text=plot_data['title'], showlegend=True, uirevision=plot_data['title'])
+    fig.update_layout(xaxis_rangeslider_visible=False)
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    return fig
+
+def run_vectorized_backtest(close, signals, start=0, fees=0.0, initial_value=1000):
+    """
+    Turn a signal array into positions, trades and an equity curve.
+
+    A buy signal (1) opens a position when flat, a sell signal (-1) closes it when
+    long and a hold signal (0) keeps the current state, exactly like the per-bar loops.
+
+    :param close: Array of close prices.
+    :param signals: Array of signals (1 buy, -1 sell, 0 hold), aligned with close.
+    :param start: Index of the first bar allowed to trade (indicator warm-up).
+    :param fees: Fees on the buy price taken at each sell (e.g. 0.001 for 0.1%).
+    :param initial_value: Portfolio value before the first trade.
+    :return: Dictionary of NumPy arrays describing positions, trades and equity.
+
+    Example:
+    >>> result = run_vectorized_backtest([100, 110, 120, 90], [1, 0, -1, 1])
+    >>> result['entries'], result['exits']
+    (array([0]), array([2]))
+    >>> result['portfolio_values']
+    array([1200.])
+    >>> result['position']
+    array([1, 1, 0, 1], dtype=int8)
+    """
+    close = np.asarray(close, dtype=np.float64)
+    signals = np.asarray(signals, dtype=np.int8).copy()
+    signals[:start] = 0
+    index = np.arange(len(close))
+
+    # The position only depends on the last non-zero signal seen so far
+    last_event = np.maximum.accumulate(np.where(signals != 0, index, -1))
+    position = ((last_event >= 0) & (signals[np.maximum(last_event, 0)] == 1)).astype(np.int8)
+
+    changes = np.diff(position, prepend=np.int8(0))
+    all_entries = np.flatnonzero(changes == 1)
+    exits = np.flatnonzero(changes == -1)
+    entries = all_entries[:len(exits)]
+
+    entry_prices = close[entries]
+    exit_prices = close[exits]
+    differences = exit_prices - entry_prices - entry_prices * fees
+    portfolio_values = initial_value * np.cumprod(1 + differences / entry_prices)
+
+    # Realized value after each bar, marked to market while a position is open
+    realized = np.concatenate(([float(initial_value)], portfolio_values))
+    realized = realized[np.searchsorted(exits, index, side='right')]
+    open_entry = all_entries[np.maximum(np.searchsorted(all_entries, index, side='right') - 1, 0)] \
+        if len(all_entries) else index
+    equity = np.where(position == 1, realized * close / close[open_entry], realized)
+
+    return {
+        'position': position,
+        'entries': entries,
+        'exits': exits,
+        'open_entry': all_entries[len(exits):],
+        'entry_prices': entry_prices,
+        'exit_prices': exit_prices,
+        'differences': differences,
+        'portfolio_values': portfolio_values,
+        'equity': equity,
+    }
 
 class BaseStrategy:
     def __init__(self, pair, timeframe):
@@ -30,6 +122,9 @@ class BaseStrategy:
         self._live_trade = False
         self._portfolio_values = []
         self._last_portfolio_value = 1000
+        self._fees = 0.0
+        self._fetch_ohlcv = functools.partial(api.get_ohlcv, arrays=True)
+        self._window = None
 
     def set_live_trade(self, side):
         """
@@ -80,6 +175,70 @@ class BaseStrategy:
         """
         return self._df
 
+    def set_market_data(self, fetch_ohlcv):
+        """
+        Set the function used to fetch live candles, which can be shared between strategies.
+
+        :param fetch_ohlcv: Function with the signature of api.get_ohlcv, returning a DataFrame or column arrays.
+        """
+        self._fetch_ohlcv = fetch_ohlcv
+
+    def get_warmup(self):
+        """
+        Get the number of closed candles needed before the live signal is defined.
+
+        :return: Number of candles.
+        """
+        return 1
+
+    def update_indicators(self, close):
+        """
+        Update the streaming indicators with the close of a candle which closed.
+
+        :param close: Close price of the candle.
+        """
+        return
+
+    def update_data(self):
+        """
+        Fetch the new live candles and update the streaming indicators.
+
+        The candles are kept in a CandleWindow of get_warmup() + 1 candles: the last
+        one is still forming and is updated in place, it is only added to the
+        indicators once a newer candle shows that it closed. Memory and work per
+        candle stay the same whatever the length of the session.
+
+        Example:
+        >>> import pandas as pd
+        >>> strategy = BaseStrategy('BTC/USD', '1h')
+        >>> strategy.set_market_data(lambda *args, **kwargs: pd.DataFrame(
+        ...     {'Timestamp': pd.to_datetime(['2022-06-11 00:00:00', '2022-06-11 01:00:00']),
+        ...      'Open': [1.0, 2.0], 'High': [1.0, 2.0], 'Low': [1.0, 2.0], 'Close': [1.0, 2.0], 'Volume': [1.0, 1.0]}))
+        >>> strategy.update_data()
+        >>> strategy.get_last_close()
+        2.0
+        """
+        if self._window is None:
+            self._window = CandleWindow(self.get_warmup() + 1)
+            candles = self._fetch_ohlcv(self._pair, self._timeframe, limit=self._window.get_capacity())
+        else:
+            candles = self._fetch_ohlcv(self._pair, self._timeframe, since=self._window.get_last_timestamp())
+        if candles is None:
+            return
+
+        for close in self._window.update(candles_to_arrays(candles)):
+            self.update_indicators(close)
+
+    def get_last_close(self):
+        """
+        Get the close price of the forming live candle.
+
+        :return: Close price, or None before the first live candle.
+        """
+        if self._window is None:
+            return None
+        return self._window.get_last('Close')
+
     def set_last_portfolio_value(self, value):
         """
         Set the last portfolio value.
@@ -107,25 +266,6 @@ class BaseStrategy:
         """
         return self._last_portfolio_value
     
-    def prepare_backtest_data(self, since):
-        """
-        Generate the path for saving backtest data.
-
-        :param since: Start date for backtesting.
-        :return: Path to store backtest data.
-
-        Example:
-        >>> strategy = BaseStrategy('BTC/USD', '1h')
-        >>> strategy.prepare_backtest_data('2022-01-01')
-        'BTC_USD_data/BTC_USD_1h_2022-01-01.csv'
-        """
-        pair_dir = self._pair.replace('/', '_')
-        output_dir = f"{pair_dir}_data"
-        formatted_since = since.replace(':', '-').replace(' ', '_')
-        filename = f"{pair_dir}_{self._timeframe}_{formatted_since}.csv"
-        path = os.path.join(output_dir, filename)
-        return path
-    
     def is_data_empty(self):
         """
         Check if historical data is empty.
@@ -144,40 +284,194 @@ class BaseStrategy:
             return True
         return False
     
-    def load_data(self, path, since):
+    def load_data(self, since, until=None):
         """
-        Load historical data for backtesting.
+        Load historical data for backtesting from the candle store, downloading only the missing candles.
 
-        :param path: Path to historical data file.
         :param since: Start date for loading data.
+        :param until: End date (excluded) for loading data, None to load up to the last candle.
         :return: DataFrame containing historical data.
 
         Example:
-        >>> import pandas as pd
         >>> strategy = BaseStrategy('BTC/USD', '1h')
-        >>> path = 'BTC_USD_data/BTC_USD_1h_2022-01-01.csv'
-        >>> df = pd.DataFrame({'Timestamp': [1, 2, 3], 'Close': [100, 110, 95]})
-        >>> df.to_csv(path, index=False)
-        >>> strategy.load_data(path, '2022-01-01').equals(df)
-        True
-        """
-        if not os.path.exists(path):
-            logging.info("Need to download data...")
-            api.add_data("Need to download data...", str(api.datetime.now()))
-
-            historical_data = api.get_historical_data(self._pair, self._timeframe, since)
-            historical_data = pd.read_csv(path)
+        >>> api.candle_store.write(api.get_exchange().id, 'BTC/USD', '1h', [[1654905600000, 1, 2, 0.5, 1.5, 10]],
+        ...                        covered=[(1654905600000, 1654909200000)])
+        1
+        >>> strategy.load_data('2022-06-11 00:00:00', '2022-06-11 01:00:00')['Close'].tolist()
+        [1.5]
+        """
+        if api.sync_historical_data(self._pair, self._timeframe, since, until):
+            logging.info("Downloaded missing data...")
+            api.add_data("Downloaded missing data...", str(api.datetime.now()))
         else:
             logging.info("Using existing data...")
             api.add_data("Using existing data...", str(api.datetime.now()))
 
-            historical_data = pd.read_csv(path)
-        return historical_data
+        return api.candle_store.load(api.get_exchange().id, self._pair, self._timeframe, since, until)
     
-    def plot_figure(self):
+    def compute_signals(self):
+        """
+        Compute the signal column of the strategy on the historical data.
+
+        :return: Array of signals (1 buy, -1 sell, 0 hold), one per row of the data.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not provide signals")
+
+    def backtest(self, since):
+        """
+        Perform a backtest of the strategy.
+
+        :param since: Start date for the backtest.
+        :return: Dictionary of NumPy arrays describing the trades (see run_vectorized_backtest).
+        """
+        logging.info("Calculating backtest...")
+        api.add_data("Calculating backtest...", str(api.datetime.now()))
+
+        if since is None:
+            since = '2023-06-11 00:00:00'
+
+        self.set_data(self.load_data(since))
+        return self.run_backtest()
+
+    def run_backtest(self):
+        """
+        Perform a backtest of the strategy on the data already set.
+
+        :return: Dictionary of NumPy arrays describing the trades (see run_vectorized_backtest).
+        """
+        initial_portfolio_value = 1000
+        self.set_live_trade(False)
+        self.set_last_portfolio_value(initial_portfolio_value)
+        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
+        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
+
+        signals = self.compute_signals()
+        result = self.execute_signals(signals, initial_portfolio_value)
+        result['run_id'] = self.record_backtest(result, initial_portfolio_value)
+
+        logging.info("Backtest complete. Performance metrics:")
+        api.add_data("Backtest complete. Performance metrics:", str(api.datetime.now()))
+
+        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
+        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
+
+        logging.info(f"Final Portfolio Value: {round(self.get_last_portfolio_value(), 2)}")
+        api.add_data(f"Final Portfolio Value: {round(self.get_last_portfolio_value(), 2)}", str(api.datetime.now()))
+
+        logging.info(f"Portfolio Return: {100 * (self.get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%")
+        api.add_data(f"Portfolio Return: {100 * (self.get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%", str(api.datetime.now()))
+        return result
+
+    def execute_signals(self, signals, initial_portfolio_value=1000):
+        """
+        Run the vectorized backtest engine on a signal column and store the trades.
+
+        :param signals: Array of signals (1 buy, -1 sell, 0 hold), one per row of the data.
+        :param initial_portfolio_value: Portfolio value before the first trade.
+        :return: Dictionary of NumPy arrays describing the trades (see run_vectorized_backtest).
+        """
+        close_prices = self._df['Close'].to_numpy()
+
+        result = run_vectorized_backtest(close_prices, signals, fees=self._fees,
+                                         initial_value=initial_portfolio_value)
+
+        self._df['Signal'] = signals
+        self._df['Position'] = result['position']
+        self._df['Equity'] = result['equity']
+
+        entries = np.concatenate((result['entries'], result['open_entry']))
+        buy_times = self._df['Timestamp'].iloc[entries].tolist()
+        sell_times = self._df['Timestamp'].iloc[result['exits']].tolist()
+
+        self._portfolio_values = [
+            (timestamp, round(prix_achat, 2), round(valeur, 2), round(difference, 2))
+            for timestamp, prix_achat, valeur, difference in zip(
+                sell_times, result['entry_prices'], result['portfolio_values'], result['differences'])
+        ]
+
+        if len(result['portfolio_values']):
+            self.set_last_portfolio_value(result['portfolio_values'][-1])
+        self.set_live_trade(len(result['open_entry']) > 0)
+
+        for k, entry in enumerate(entries):
+            logging.info(f"Buy Signal: {buy_times[k]}, Price: {close_prices[entry]}")
+
+            if k < len(sell_times):
+                exit_price = close_prices[result['exits'][k]]
+                valeur = round(result['portfolio_values'][k], 2)
+                logging.info(f"Sell Signal: {sell_times[k]}, Price: {exit_price}, Portfolio Value: {valeur}")
+
+        return result
+
+    def record_backtest(self, result, initial_portfolio_value=1000):
+        """
+        Save a backtest run, its signals and its equity in the database.
+
+        The equity is recorded at the first bar, after each sell and at the last bar.
+
+        :param result: Dictionary returned by execute_signals.
+        :param initial_portfolio_value: Portfolio value before the first trade.
+        :return: Id of the backtest run.
+        """
+        timestamps = pd.to_datetime(self._df['Timestamp']).to_numpy().astype('datetime64[ms]').astype(np.int64)
+        close_prices = self._df['Close'].to_numpy()
+        entries = np.concatenate((result['entries'], result['open_entry']))
+
+        run_id = api.add_backtest_run(type(self).__name__, self._pair, self._timeframe, self.get_params(),
+                                      int(timestamps[0]) if len(timestamps) else None,
+                                      int(timestamps[-1]) if len(timestamps) else None,
+                                      initial_portfolio_value)
+
+        signals = [(timestamps[i], 'buy', close_prices[i]) for i in entries]
+        signals += [(timestamps[i], 'sell', close_prices[i]) for i in result['exits']]
+        api.add_signals(run_id, self._pair, sorted(signals))
+
+        points = np.unique(np.concatenate(([0], result['exits'], [len(timestamps) - 1])))
+        points = points[(points >= 0) & (points < len(timestamps))]
+        api.add_equity_points(run_id, zip(timestamps[points], result['equity'][points]))
+
+        api.finish_backtest_run(run_id, self.get_last_portfolio_value(), len(result['exits']))
+        return run_id
+
+    def get_params(self):
+        """
+        Get the parameters of the strategy.
+
+        :return: Dictionary of parameters.
+
+        Example:
+        >>> BaseStrategy('BTC/USD', '1h').get_params()
+        {}
+        """
+        return {}
+
+    def get_plot_data(self):
+        """
+        Get the full resolution series drawn in the backtest figure.
+
+        :return: Dictionary with the title and the (x, y) arrays of the price, portfolio values and changes.
+        """
+        if self._portfolio_values:
+            sell, prix, portfolio_values, changes = zip(*self._portfolio_values)
+        else:
+            sell, portfolio_values, changes = [], [], []
+        sell = pd.to_datetime(pd.Series(sell, dtype=object)).to_numpy()
+        dates = pd.to_datetime(self._df['Timestamp']).to_numpy()
+
+        return {
+            'title': 'Backtest ' + self._pair,
+            'pair': self._pair,
+            'price': (dates, self._df['Close'].to_numpy(dtype=np.float64)),
+            'portfolio': (sell, np.asarray(portfolio_values, dtype=np.float64)),
+            'changes': (sell, np.asarray(changes, dtype=np.float64)),
+        }
+
+    def plot_figure(self, max_points=downsampling.PLOT_POINTS, x_range=None):
         """
         Plot a figure showing candlestick chart, portfolio values, and portfolio changes.
 
+        :param max_points: Maximum number of points per trace.
+        :param x_range: Optional (start, end) range of dates to draw at full resolution.
         :return: Plotly figure object.
 
         Example:
@@ -185,19 +479,10 @@ class BaseStrategy:
         >>> strategy = BaseStrategy('BTC/USD', '1h')
         >>> df = pd.DataFrame({'Timestamp': [1, 2, 3], 'Close': [100, 110, 95]})
         >>> strategy.set_data(df)
-        >>> strategy.plot_figure()  # The actual output can vary
+        >>> isinstance(strategy.plot_figure(), go.Figure)
+        True
         """
-        sell, prix, portfolio_values, changes = zip(*self._portfolio_values)
-        dates = self._df.index
-
-        fig = make_subplots(rows=3, cols=1, shared_xaxes=True)
-        fig.add_trace(go.Scatter(x=dates, y=self._df['Close'], mode='lines', name=f"Values of {self._pair}"), row=1, col=1)
-        fig.add_trace(go.Scatter(x=sell, y=portfolio_values, mode='lines', name='Portfolio Values'), row=2, col=1)
-        fig.add_trace(go.Bar(x=sell, y=changes, name='Portfolio Changes'), row=3, col=1)
-        title = 'Backtest ' + self._pair
-        fig.update_layout(title_text=title, showlegend=True)
-        fig.update_layout(xaxis_rangeslider_visible=False)
-        return fig
+        return plot_backtest(self.get_plot_data(), max_points, x_range)
 
     def __del__(self):
         """
@@ -216,91 +501,46 @@ class SimpleSMALive(BaseStrategy):
         """
         super().__init__(pair, timeframe)
         self.__sma = sma
+        self.__sma_indicator = indicators.SMA(sma)
 
-    def update_data(self):
-        """
-        Update historical data for SMA calculation.
+    def get_params(self):
         """
-        if self._df is None:
-            self._df = api.get_ohlcv(self._pair, self._timeframe, limit=self.__sma + 1)
-        new_data = api.get_ohlcv(self._pair, self._timeframe, limit=1)
-        self._df = pd.concat([self._df, new_data], ignore_index=True)
-        self._df = self._df.drop_duplicates(subset=['Timestamp'], keep='last')
+        Get the parameters of the strategy.
 
-
-    def backtest(self, since):
+        :return: Dictionary of parameters.
         """
-        Perform a backtest using the Simple Moving Average (SMA) strategy.
+        return {'sma': self.__sma}
 
-        :param since: Start date for the backtest.
+    def get_warmup(self):
         """
-        # Utilize inherited methods and attributes
-        logging.info("Calculating backtest...")
-        api.add_data("Calculating backtest...", str(api.datetime.now()))
-
-        if since is None:
-            since = '2023-06-11 00:00:00'
-
-        self.set_live_trade(False)
-        self._portfolio_values = []
-
-        path = self.prepare_backtest_data(since)
-        historical_data = super().load_data(path, since)
-        super().set_data(historical_data.copy())
-
-        initial_portfolio_value = 1000
-        super().set_last_portfolio_value(initial_portfolio_value)
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
-
-        close_prices = super().get_data()['Close']
-        timestamps = super().get_data()['Timestamp']
-
-        super().get_data()['SMA'] = close_prices.rolling(self.__sma).mean()
-
-        for i in tqdm(range(self.__sma, len(super().get_data())), desc="Backtesting Progress"):
-            close_price = close_prices.iloc[i]
-            timestamp = timestamps.iloc[i]
-
-            last_sma = super().get_data()['SMA'].iloc[i - 1]
-            signal = "buy" if close_price > last_sma else "sell" if close_price < last_sma else 0
-
-            if signal == "buy" and not self.get_live_trade():
-                self.set_live_trade(True)
-                prix_achat = close_price
-                logging.info(f"Buy Signal: {timestamp}, Price: {prix_achat}")
-                api.add_data(f"Buy Signal: {timestamp}, Price: {prix_achat}", str(api.datetime.now()))
-
-
-            elif signal == "sell" and self.get_live_trade():
-                self.set_live_trade(False)
-                difference_de_prix = close_price - prix_achat
-
-                valeur_apres_vente = super().get_last_portfolio_value() + \
-                     super().get_last_portfolio_value() * (difference_de_prix / prix_achat)
-
-                super().set_last_portfolio_value(valeur_apres_vente)
-                self._portfolio_values.append(
-                    (timestamp, round(prix_achat, 2), round(super().get_last_portfolio_value(), 2),
-                     round(difference_de_prix, 2)))
-                
-                logging.info(f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}")
-                api.add_data(f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}", str(api.datetime.now()))
+        Get the number of closed candles needed before the live signal is defined.
 
+        :return: Number of candles.
+        """
+        return self.__sma
 
-        logging.info("Backtest complete. Performance metrics:")
-        api.add_data("Backtest complete. Performance metrics:", str(api.datetime.now()))
+    def update_indicators(self, close):
+        """
+        Update the streaming SMA with the close of a candle which closed.
 
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
+        :param close: Close price of the candle.
+        """
+        self.__sma_indicator.update(close)
 
-        logging.info(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}")
-        api.add_data(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}", str(api.datetime.now()))
+    def compute_signals(self):
+        """
+        Compute the SMA signal column: buy when the close is above the previous SMA,
+        sell when it is below.
 
-        logging.info(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%")
-        api.add_data(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%", str(api.datetime.now()))
+        :return: Array of signals (1 buy, -1 sell, 0 hold).
+        """
+        close_prices = self._df['Close']
+        self._df['SMA'] = indicators.sma(close_prices, self.__sma)
+        last_sma = self._df['SMA'].shift(1)
 
-        return
+        signals = np.select([close_prices > last_sma, close_prices < last_sma], [1, -1], 0).astype(np.int8)
+        signals[:self.__sma] = 0
+        return signals
 
     def calculate_signal(self):
         """
@@ -309,27 +549,26 @@ class SimpleSMALive(BaseStrategy):
         :return: Buy, sell, or hold signal.
         """
         self.update_data()
-        if super().is_data_empty():
+        if self.get_last_close() is None:
             return 0
 
-        self.calculate_sma()
-        signal = self.generate_signal()
-        return signal
+        return SimpleSMALive.generate_signal(self)
 
     def calculate_sma(self):
         """
         Calculate SMA values and add them to the DataFrame.
         """
-        self._df['SMA'] = self._df['Close'].rolling(self.__sma).mean()
+        self._df['SMA'] = indicators.sma(self._df['Close'], self.__sma)
 
     def generate_signal(self):
         """
-        Generate buy, sell, or hold signal based on SMA values.
+        Generate buy, sell, or hold signal: the close of the current candle against
+        the SMA of the previous ones.
 
         :return: Buy, sell, or hold signal.
         """
-        last_value = self._df['Close'].iloc[-1]
-        last_sma = self._df['SMA'].iloc[-2]
+        last_value = self.get_last_close()
+        last_sma = self.__sma_indicator.value
 
         if pd.isnull(last_sma):
             return 0
@@ -342,7 +581,7 @@ class SimpleSMALive(BaseStrategy):
         return 0
 
 class RSIStrategy(BaseStrategy): 
-    def __init__(self, pair, timeframe, rsi_period=14):
+    def __init__(self, pair, timeframe, rsi_period=14, overbought_threshold=70, oversold_threshold=30):
         """
         Initialize RSIStrategy object.
 
@@ -354,134 +593,78 @@ class RSIStrategy(BaseStrategy):
         """
         super().__init__(pair, timeframe)
         self.__rsi_period = rsi_period
-        self.__overbought_threshold = 70
-        self.__oversold_threshold = 30
+        self.__overbought_threshold = overbought_threshold
+        self.__oversold_threshold = oversold_threshold
+        self.__rsi_indicator = indicators.RSI(rsi_period)
 
-    def update_data(self):
-        """
-        Update historical data for RSI calculation.
+    def get_params(self):
         """
-        if self._df is None:
-            self._df = api.get_ohlcv(self._pair, self._timeframe, limit=self.__rsi_period + 1)
-        new_data = api.get_ohlcv(self._pair, self._timeframe, limit=1)
-        self._df = pd.concat([self._df, new_data], ignore_index=True)
-        self._df = self._df.drop_duplicates(subset=['Timestamp'], keep='last')
+        Get the parameters of the strategy.
 
-    def backtest(self, since):
+        :return: Dictionary of parameters.
         """
-        Perform a backtest using the Relative Strength Index (RSI) strategy.
+        return {'rsi_period': self.__rsi_period, 'overbought_threshold': self.__overbought_threshold,
+                'oversold_threshold': self.__oversold_threshold}
 
-        :param since: Start date for the backtest.
+    def get_warmup(self):
         """
-        # Utilize inherited methods and attributes
-        logging.info("Calculating backtest ...")
-        api.add_data("Calculating backtest ...", str(api.datetime.now()))
+        Get the number of closed candles needed before the live signal is defined.
 
-        if since is None:
-            since = '2023-06-11 00:00:00'
-
-        self.set_live_trade(False)
-        self._portfolio_values = []
-
-        path = self.prepare_backtest_data(since)
-        historical_data = super().load_data(path, since)
-        super().set_data(historical_data.copy())
-
-        initial_portfolio_value = 1000
-        super().set_last_portfolio_value(initial_portfolio_value)
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
-
-        close_prices = super().get_data()['Close']
-        timestamps = super().get_data()['Timestamp']
-
-        super().get_data()['RSI'] = self.calculate_rsi(close_prices)
-
-        for i in tqdm(range(self.__rsi_period, len(super().get_data())), desc="Backtesting Progress"):
-            close_price = close_prices.iloc[i]
-            timestamp = timestamps.iloc[i]
-
-            last_rsi = super().get_data()['RSI'].iloc[i - 1]
-
-            signal = "buy" if last_rsi < self.__oversold_threshold else "sell" if last_rsi > self.__overbought_threshold else 0
-
-            if signal == "buy" and not self.get_live_trade():
-                self.set_live_trade(True)
-                prix_achat = close_price
-                logging.info(f"Buy Signal: {timestamp}, Price: {prix_achat}")
-                api.add_data(f"Buy Signal: {timestamp}, Price: {prix_achat}", str(api.datetime.now()))
-
-            elif signal == "sell" and self.get_live_trade():
-                self.set_live_trade(False)
-                difference_de_prix = close_price - prix_achat
-
-                valeur_apres_vente = super().get_last_portfolio_value() + \
-                                     super().get_last_portfolio_value() * difference_de_prix / prix_achat
-                
-                super().set_last_portfolio_value(valeur_apres_vente)
-                self._portfolio_values.append(
-                    (timestamp, round(prix_achat, 2), round(super().get_last_portfolio_value(), 2),
-                    round(difference_de_prix, 2)))
-                logging.info(
-                    f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}")
-                api.add_data(f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}", str(api.datetime.now()))
+        :return: Number of candles.
+        """
+        return self.__rsi_period + 1
 
-            elif signal == "0":
-                print("0")
+    def update_indicators(self, close):
+        """
+        Update the streaming RSI with the close of a candle which closed.
 
-        logging.info("Backtest complete. Performance metrics:")
-        api.add_data("Backtest complete. Performance metrics:", str(api.datetime.now()))
+        :param close: Close price of the candle.
+        """
+        self.__rsi_indicator.update(close)
 
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
+    def compute_signals(self):
+        """
+        Compute the RSI signal column: buy when the previous RSI is oversold,
+        sell when it is overbought.
 
-        logging.info(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}")
-        api.add_data(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}", str(api.datetime.now()))
+        :return: Array of signals (1 buy, -1 sell, 0 hold).
+        """
+        self._df['RSI'] = self.calculate_rsi(self._df['Close'])
+        last_rsi = self._df['RSI'].shift(1)
 
-        logging.info(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%")
-        api.add_data(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%", str(api.datetime.now()))
-        return
+        signals = np.select([last_rsi < self.__oversold_threshold, last_rsi > self.__overbought_threshold],
+                            [1, -1], 0).astype(np.int8)
+        signals[:self.__rsi_period] = 0
+        return signals
 
     def calculate_rsi(self, close_prices):
         """
-        Calculate RSI values and add them to the DataFrame.
+        Calculate the Wilder RSI of the close prices (see indicators.wilder_rsi).
 
-        :param close_prices: Series containing closing prices.
+        :param close_prices: Series or array containing closing prices.
+        :return: Read-only float64 NumPy array aligned with close_prices, NaN for the first rsi_period values.
         """
+        return indicators.rsi(close_prices, self.__rsi_period)
 
-        daily_returns = close_prices.diff().dropna()
-        
-        gain = daily_returns.apply(lambda x: x if x>0 else 0)
-        loss = daily_returns.apply(lambda x: -x if x<0 else 0)
-
-        # Case: division by zero
-        if loss.empty or (loss == 0).all():
-            return pd.Series([100.0] * len(close_prices), index=close_prices.index)
-
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-
-        # Create a new Series with None values and the appropriate index
-        none_values = pd.Series([None] * (self.__rsi_period - 1), index=range(self.__rsi_period - 1))
+    def calculate_signal(self):
+        """
+        Calculate RSI signal based on the current data.
 
-        # Concatenate the None values and the calculated RSI values
-        if isinstance(rsi, pd.Series):
-            return pd.concat([none_values, rsi], ignore_index=True)
-        else:
-            # If rsi is a scalar, create a Series with the same index and fill it with the scalar value
-            return pd.Series([rsi] * len(close_prices), index=close_prices.index)
+        :return: Buy, sell, or hold signal.
+        """
+        self.update_data()
+        if self.get_last_close() is None:
+            return 0
 
+        return RSIStrategy.generate_signal(self)
 
     def generate_signal(self):
         """
-        Generate buy, sell, or hold signal based on RSI values.
+        Generate buy, sell, or hold signal based on the RSI of the previous candles.
 
         :return: Buy, sell, or hold signal.
         """
-        if super().is_data_empty():
-            return 0
-
-        last_rsi = super().get_data()['RSI'].iloc[-1]
+        last_rsi = self.__rsi_indicator.value
 
         if pd.isnull(last_rsi):
             return 0
@@ -508,92 +691,49 @@ class MACDLive(BaseStrategy):
         self.__short_window = short_window
         self.__long_window = long_window
         self.__signal_window = signal_window
+        self.__macd_indicator = indicators.MACD(short_window, long_window, signal_window)
 
-    def update_data(self):
-        """
-        Update historical data for MACD calculation.
+    def get_params(self):
         """
-        if self._df is None:
-            self._df = api.get_ohlcv(self._pair, self._timeframe, limit=self.__long_window + self.__signal_window)
-        new_data = api.get_ohlcv(self._pair, self._timeframe, limit=1)
-        self._df = pd.concat([self._df, new_data], ignore_index=True)
-        self._df = self._df.drop_duplicates(subset=['Timestamp'], keep='last')
+        Get the parameters of the strategy.
 
-    def backtest(self, since):
+        :return: Dictionary of parameters.
         """
-        Perform a backtest using the Moving Average Convergence Divergence (MACD) strategy.
+        return {'short_window': self.__short_window, 'long_window': self.__long_window,
+                'signal_window': self.__signal_window}
 
-        :param since: Start date for the backtest.
+    def get_warmup(self):
         """
-        # Utilize inherited methods and attributes
-        logging.info("Calculating backtest ...")
-        api.add_data("Calculating backtest ...", str(api.datetime.now()))
-
-        if since is None:
-            since = '2023-06-11 00:00:00'
-
-        self.set_live_trade(False)
-        self._portfolio_values = []
-
-        path = self.prepare_backtest_data(since)
-        historical_data = super().load_data(path, since)
-        super().set_data(historical_data.copy())
-
-        initial_portfolio_value = 1000
-        super().set_last_portfolio_value(initial_portfolio_value)
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
-
-        close_prices = super().get_data()['Close']
-        timestamps = super().get_data()['Timestamp']
-
-        super().get_data()['Short_MA'] = close_prices.rolling(self.__short_window).mean()
-        super().get_data()['Long_MA'] = close_prices.rolling(self.__long_window).mean()
-
-        super().get_data()['MACD'] = self.calculate_macd(close_prices)
-
-        for i in tqdm(range(self.__long_window + self.__signal_window, len(super().get_data())), desc="Backtesting Progress"):
-            close_price = close_prices.iloc[i]
-            timestamp = timestamps.iloc[i]
+        Get the number of closed candles needed before the live signal is defined.
 
-            last_macd = super().get_data()['MACD'].iloc[i - 1]
-
-            signal = "buy" if last_macd > 0 else "sell" if last_macd < 0 else 0
-
-            if signal == "buy" and not self.get_live_trade():
-                self.set_live_trade(True)
-                prix_achat = close_price
-                logging.info(f"Buy Signal: {timestamp}, Price: {prix_achat}")
-                api.add_data(f"Buy Signal: {timestamp}, Price: {prix_achat}", str(api.datetime.now()))
-
-
-            elif signal == "sell" and self.get_live_trade():
-                self.set_live_trade(False)
-                difference_de_prix = close_price - prix_achat
-
-                valeur_apres_vente = super().get_last_portfolio_value() + \
-                                     super().get_last_portfolio_value() * difference_de_prix / prix_achat
+        :return: Number of candles.
+        """
+        return self.__long_window + self.__signal_window
 
-                super().set_last_portfolio_value(valeur_apres_vente)
-                self._portfolio_values.append(
-                    (timestamp, round(prix_achat, 2), round(super().get_last_portfolio_value(), 2),
-                    round(difference_de_prix, 2)))
-                logging.info(
-                    f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}")
-                api.add_data(f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}", str(api.datetime.now()))
+    def update_indicators(self, close):
+        """
+        Update the streaming MACD with the close of a candle which closed.
 
-        logging.info("Backtest complete. Performance metrics:")
-        api.add_data("Backtest complete. Performance metrics:", str(api.datetime.now()))
+        :param close: Close price of the candle.
+        """
+        self.__macd_indicator.update(close)
 
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
+    def compute_signals(self):
+        """
+        Compute the MACD signal column: buy when the previous MACD histogram is positive,
+        sell when it is negative.
 
-        logging.info(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}")
-        api.add_data(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}", str(api.datetime.now()))
+        :return: Array of signals (1 buy, -1 sell, 0 hold).
+        """
+        close_prices = self._df['Close']
+        self._df['Short_MA'] = indicators.sma(close_prices, self.__short_window)
+        self._df['Long_MA'] = indicators.sma(close_prices, self.__long_window)
+        self._df['MACD'] = self.calculate_macd(close_prices)
+        last_macd = self._df['MACD'].shift(1)
 
-        logging.info(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%")
-        api.add_data(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%", str(api.datetime.now()))
-        return
+        signals = np.select([last_macd > 0, last_macd < 0], [1, -1], 0).astype(np.int8)
+        signals[:self.__long_window + self.__signal_window] = 0
+        return signals
 
     def calculate_macd(self, close_prices):
         """
@@ -602,22 +742,25 @@ class MACDLive(BaseStrategy):
         :param close_prices: Series containing closing prices.
         :return: MACD values.
         """
-        short_ema = close_prices.ewm(span=self.__short_window, adjust=False).mean()
-        long_ema = close_prices.ewm(span=self.__long_window, adjust=False).mean()
-        macd = short_ema - long_ema
-        signal_line = macd.ewm(span=self.__signal_window, adjust=False).mean()
-
-        return macd - signal_line
+        return indicators.macd(close_prices, self.__short_window, self.__long_window, self.__signal_window)
     
     def calculate_signal(self):
+        """
+        Calculate MACD signal based on the MACD histogram of the previous candles.
 
-        last_macd = super().get_data()['MACD'].iloc[-1]
+        :return: Buy, sell, or hold signal.
+        """
+        self.update_data()
+        if self.get_last_close() is None or self.__macd_indicator.count < self.get_warmup():
+            return 0
+
+        last_macd = self.__macd_indicator.value
 
         signal = "buy" if last_macd > 0 else "sell" if last_macd < 0 else 0
         return signal
 
 class SMA_RSI_Strategy(SimpleSMALive, RSIStrategy):
-    def __init__(self, pair, timeframe, sma=14, rsi_period=28):
+    def __init__(self, pair, timeframe, sma=14, rsi_period=28, overbought_threshold=70, oversold_threshold=30):
         """
         Initialize Strategy3 object.
 
@@ -625,94 +768,65 @@ class SMA_RSI_Strategy(SimpleSMALive, RSIStrategy):
         :param timeframe: Timeframe for analysis (e.g., '1h').
         :param sma: Simple Moving Average parameter.
         :param rsi_period: RSI period for calculation.
+        :param overbought_threshold: Overbought threshold for RSI (default is 70).
+        :param oversold_threshold: Oversold threshold for RSI (default is 30).
         """
         # Initialize both parent classes
         self.__sma = sma
         self.__rsi_period = rsi_period
-        self.__overbought_threshold = 70
-        self.__oversold_threshold = 30
+        self.__overbought_threshold = overbought_threshold
+        self.__oversold_threshold = oversold_threshold
 
         SimpleSMALive.__init__(self, pair, timeframe, sma)
-        RSIStrategy.__init__(self, pair, timeframe, rsi_period)
+        RSIStrategy.__init__(self, pair, timeframe, rsi_period, overbought_threshold, oversold_threshold)
+        self._fees = 0.00 # = 0.001 for 0.1% trading fees
 
-    def backtest(self, since):
+    def get_params(self):
         """
-        Perform a backtest using a combination of Simple Moving Average (SMA) and Relative Strength Index (RSI) strategies.
+        Get the parameters of the strategy.
 
-        :param since: Start date for the backtest.
+        :return: Dictionary of parameters.
         """
-        # Utilize inherited methods and attributes
-        logging.info("Calculating backtest ...")
-        api.add_data("Calculating backtest ...", str(api.datetime.now()))
-
-        if since is None:
-            since = '2023-06-11 00:00:00'
-
-        self.set_live_trade(False)
-        self._portfolio_values = []
-
-        path = self.prepare_backtest_data(since)
-        historical_data = super().load_data(path, since)
-        super().set_data(historical_data.copy())
-
-        initial_portfolio_value = 1000
-        super().set_last_portfolio_value(initial_portfolio_value)
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
-
+        return {'sma': self.__sma, 'rsi_period': self.__rsi_period,
+                'overbought_threshold': self.__overbought_threshold,
+                'oversold_threshold': self.__oversold_threshold}
 
-        close_prices = super().get_data()['Close']
-        timestamps = super().get_data()['Timestamp']
-
-        super().get_data()['RSI'] = self.calculate_rsi(close_prices)
-        super().get_data()['SMA'] = close_prices.rolling(self.__sma).mean()
-
-        for i in tqdm(range(self.__rsi_period, len(super().get_data())), desc="Backtesting Progress"):
-            close_price = close_prices.iloc[i]
-            timestamp = timestamps.iloc[i]
-
-            last_sma = super().get_data()['SMA'].iloc[i - 1]
-            signal1 = "buy" if close_price > last_sma else "sell" if close_price < last_sma else 0
-
-            last_rsi = super().get_data()['RSI'].iloc[i - 1]
-            signal2 = "buy" if last_rsi < self.__oversold_threshold else "sell" if last_rsi > self.__overbought_threshold else 0
-
-            if signal1 == "buy" and signal2 == "buy" and not self.get_live_trade():
-                self.set_live_trade(True)
-                prix_achat = close_price
-                logging.info(f"Buy Signal: {timestamp}, Price: {prix_achat}")
-                api.add_data(f"Buy Signal: {timestamp}, Price: {prix_achat}", str(api.datetime.now()))
+    def get_warmup(self):
+        """
+        Get the number of closed candles needed before the live signal is defined.
 
+        :return: Number of candles.
+        """
+        return max(SimpleSMALive.get_warmup(self), RSIStrategy.get_warmup(self))
 
-            elif signal1 == "sell" and signal2 == "sell" and self.get_live_trade():
-                self.set_live_trade(False)
-                difference_de_prix = close_price - prix_achat
-                frais_de_vente = 0.00 # = 0.001 for 0.1% trading fees
-                difference_de_prix -= prix_achat * frais_de_vente  # Apply fees
+    def update_indicators(self, close):
+        """
+        Update the streaming SMA and RSI with the close of a candle which closed.
 
-                valeur_apres_vente = super().get_last_portfolio_value() + \
-                                     super().get_last_portfolio_value() * difference_de_prix / prix_achat
-                
-                super().set_last_portfolio_value(valeur_apres_vente)
-                self._portfolio_values.append(
-                    (timestamp, round(prix_achat, 2), round(super().get_last_portfolio_value(), 2),
-                    round(difference_de_prix, 2)))
-                logging.info(
-                    f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}")
-                api.add_data(f"Sell Signal: {timestamp}, Price: {close_price}, Portfolio Value: {round(valeur_apres_vente, 2)}", str(api.datetime.now()))
+        :param close: Close price of the candle.
+        """
+        SimpleSMALive.update_indicators(self, close)
+        RSIStrategy.update_indicators(self, close)
 
-        logging.info("Backtest complete. Performance metrics:")
-        api.add_data("Backtest complete. Performance metrics:", str(api.datetime.now()))
+    def compute_signals(self):
+        """
+        Compute the combined signal column: buy (or sell) only when both the SMA
+        and the RSI signals agree.
 
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
+        :return: Array of signals (1 buy, -1 sell, 0 hold).
+        """
+        close_prices = self._df['Close']
+        self._df['RSI'] = self.calculate_rsi(close_prices)
+        self._df['SMA'] = indicators.sma(close_prices, self.__sma)
+        last_sma = self._df['SMA'].shift(1)
+        last_rsi = self._df['RSI'].shift(1)
 
-        logging.info(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}")
-        api.add_data(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}", str(api.datetime.now()))
+        buy = (close_prices > last_sma) & (last_rsi < self.__oversold_threshold)
+        sell = (close_prices < last_sma) & (last_rsi > self.__overbought_threshold)
 
-        logging.info(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%")
-        api.add_data(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%", str(api.datetime.now()))
-        return
+        signals = np.select([buy, sell], [1, -1], 0).astype(np.int8)
+        signals[:self.__rsi_period] = 0
+        return signals
 
     def calculate_signal(self):
         """
@@ -720,10 +834,13 @@ class SMA_RSI_Strategy(SimpleSMALive, RSIStrategy):
 
         :return: Buy, sell, or hold signal.
         """
+        self.update_data()
+        if self.get_last_close() is None:
+            return 0
+
         # Calculate signals from both SMA and RSI
-        sma_signal = super(SimpleSMALive, self).calculate_signal()
-        #rsi_signal = RSIStrategy.calculate_signal(self)  # Use the class name directly instead of super()
-        rsi_signal = super(RSIStrategy, self).generate_signal()
+        sma_signal = SimpleSMALive.generate_signal(self)
+        rsi_signal = RSIStrategy.generate_signal(self)
 
         # Combine signals (For simplicity, considering only buy and sell signals)
         if sma_signal == "buy" and rsi_signal == "buy":
@@ -733,7 +850,7 @@ class SMA_RSI_Strategy(SimpleSMALive, RSIStrategy):
 
         return 0
 
-class MixStrategy(BaseStrategy): # TODO Trop long à s'éxecuter
+class MixStrategy(BaseStrategy):
     def __init__(self, pair, timeframe, sma, rsi_period=14, short_window=12, long_window=26, signal_window=9):
         """
         Initialize MixStrategy object.
@@ -750,88 +867,60 @@ class MixStrategy(BaseStrategy): # TODO Trop long à s'éxecuter
         self.sma_strategy = SimpleSMALive(pair, timeframe, sma)
         self.rsi_strategy = RSIStrategy(pair, timeframe, rsi_period)
         self.macd_strategy = MACDLive(pair, timeframe, short_window, long_window, signal_window)
-        self._fees = 0.001  # 0.1% fees
+        # 0.1% of the buy price per trade (the per-bar loop took 0.001 off the portfolio value instead)
+        self._fees = 0.001
 
-    def backtest(self, since):
+    def get_params(self):
         """
-        Perform a backtest using a combination of SMA, RSI, and MACD strategies.
+        Get the parameters of the strategy.
 
-        :param since: Start date for the backtest.
+        :return: Dictionary of parameters.
         """
-        # Utilize inherited methods and attributes
-        logging.info("Calculating backtest ...")
-        api.add_data("Calculating backtest ...", str(api.datetime.now()))
-
-        if since is None:
-            since = '2023-06-11 00:00:00'
-
-        self.set_live_trade(False)
-        self._portfolio_values = []
-
-        path = self.prepare_backtest_data(since)
-        historical_data = super().load_data(path, since)
-        super().set_data(historical_data.copy())
-
-        initial_portfolio_value = 1000
-        super().set_last_portfolio_value(initial_portfolio_value)
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
-
-
-        close_prices = super().get_data()['Close']
-        timestamps = super().get_data()['Timestamp']
-
-        self.sma_strategy.set_data(super().get_data())
-        self.rsi_strategy.set_data(super().get_data())
-        self.macd_strategy.set_data(super().get_data())
-
-        self.sma_strategy.backtest(since)
-        self.rsi_strategy.backtest(since)
-        self.macd_strategy.backtest(since)
-
-        for i in tqdm(range(len(super().get_data())), desc="MixStrategy Backtesting Progress"):
-            timestamp = timestamps.iloc[i]
-
-            sma_signal = self.sma_strategy.calculate_signal()
-            rsi_signal = self.rsi_strategy.generate_signal()
-            macd_signal = self.macd_strategy.calculate_signal()
+        return {**self.sma_strategy.get_params(), **self.rsi_strategy.get_params(),
+                **self.macd_strategy.get_params()}
 
-            # Apply a combination strategy: buy if at least two strategies give a buy signal, sell if at least two give a sell signal
-
-            signals = [sma_signal, rsi_signal, macd_signal]
-            buy_signals = sum([1 for signal in signals if signal == "buy"])
-            sell_signals = sum([1 for signal in signals if signal == "sell"])
-
-            if buy_signals >= 2 and not self.get_live_trade():
-                self.set_live_trade(True)
-                prix_achat = close_prices.iloc[i]
-                logging.info(f"Buy Signal: {timestamp}, Price: {prix_achat}")
-                api.add_data(f"Buy Signal: {timestamp}, Price: {prix_achat}", str(api.datetime.now()))
+    def set_market_data(self, fetch_ohlcv):
+        """
+        Set the function used to fetch live candles, for the strategy and its sub-strategies.
 
+        :param fetch_ohlcv: Function with the signature of api.get_ohlcv.
+        """
+        super().set_market_data(fetch_ohlcv)
+        for strategy in (self.sma_strategy, self.rsi_strategy, self.macd_strategy):
+            strategy.set_market_data(fetch_ohlcv)
 
-            elif sell_signals >= 2 and self.get_live_trade():
-                self.set_live_trade(False)
-                difference_de_prix = close_prices.iloc[i] - prix_achat
+    def calculate_signal(self):
+        """
+        Calculate the live signal: buy if at least two strategies give a buy signal,
+        sell if at least two give a sell signal.
 
-                valeur_apres_vente = super().get_last_portfolio_value() + \
-                                     super().get_last_portfolio_value() * difference_de_prix / prix_achat - self._fees
+        :return: Buy, sell, or hold signal.
+        """
+        signals = [self.sma_strategy.calculate_signal(), self.rsi_strategy.calculate_signal(),
+                   self.macd_strategy.calculate_signal()]
 
-                super().set_last_portfolio_value(valeur_apres_vente)
-                self._portfolio_values.append(
-                    (timestamp, round(prix_achat, 2), round(super().get_last_portfolio_value(), 2),
-                     round(difference_de_prix, 2)))
-                logging.info(
-                    f"Sell Signal: {timestamp}, Price: {close_prices.iloc[i]}, Portfolio Value: {round(valeur_apres_vente, 2)}")
+        if signals.count("buy") >= 2:
+            return "buy"
+        elif signals.count("sell") >= 2:
+            return "sell"
+        return 0
 
-        logging.info("Backtest complete. Performance metrics:")
-        api.add_data("Backtest complete. Performance metrics:", str(api.datetime.now()))
+    def compute_signals(self):
+        """
+        Compute the combined signal column: buy if at least two strategies give a buy
+        signal, sell if at least two give a sell signal.
 
-        logging.info(f"Initial Portfolio Value: {initial_portfolio_value}")
-        api.add_data(f"Initial Portfolio Value: {initial_portfolio_value}", str(api.datetime.now()))
+        The three signal columns are computed once on the same data and the vote is
+        done on the arrays.
 
-        logging.info(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}")
-        api.add_data(f"Final Portfolio Value: {round(super().get_last_portfolio_value(), 2)}", str(api.datetime.now()))
+        :return: Array of signals (1 buy, -1 sell, 0 hold).
+        """
+        votes = []
+        for strategy in (self.sma_strategy, self.rsi_strategy, self.macd_strategy):
+            strategy.set_data(self._df)
+            votes.append(strategy.compute_signals())
+        votes = np.vstack(votes)
 
-        logging.info(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%")
-        api.add_data(f"Portfolio Return: {100 * (super().get_last_portfolio_value() / initial_portfolio_value - 1):.2f}%", str(api.datetime.now()))
-        return
+        buy = (votes == 1).sum(axis=0) >= 2
+        sell = (votes == -1).sum(axis=0) >= 2
+        return np.select([buy, sell], [1, -1], 0).astype(np.int8)
@@ -1,12 +1,27 @@
 """
 This script contains the code for the strategy gestion.
 """
+import time
 import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
 import api
+import scheduler
 import strategies
+from order_manager import make_client_order_id
 
 result = None
 
+# Strategies available in the dashboard, by name
+STRATEGIES = {
+    'SimpleSMA': strategies.SimpleSMALive,
+    'RSIStrategy': strategies.RSIStrategy,
+    'SMA_RSI': strategies.SMA_RSI_Strategy,
+    'MACD': strategies.MACDLive,
+    'Mix': strategies.MixStrategy
+}
+
 def create_trading_logic():
     """
     Create a dictionary to hold trading logic parameters.
@@ -20,44 +35,104 @@ def create_trading_logic():
     """
     return {'stop_flag': False}
 
+# Results of the last backtests, by (strategy, params, pair, timeframe, data range, data version)
+BACKTEST_CACHE_SIZE = 32
+backtest_cache = OrderedDict()
+backtest_cache_lock = threading.Lock()
+
 def backtest(value, timeframe, pair, strategy, date):
     """
-    Perform backtesting using SimpleSMALive strategy.
-    
-    :param value: Some value.
+    Perform backtesting of a strategy, reusing the result of an identical previous run.
+
+    The result (trades, equity curve and figure) is cached by strategy, parameters,
+    pair, timeframe, data range and version of the candle series, so it is computed
+    again only when the parameters change or new candles are written to the store.
+
+    :param value: Main parameter of the strategy (e.g. the SMA window).
     :param timeframe: Timeframe for backtesting.
     :param pair: Trading pair for backtesting.
+    :param strategy: Trading strategy to use (e.g., 'SimpleSMA').
+    :param date: Start date for the backtest.
     :return: Figure object for plotting.
 
     Example:
     >>> fig = backtest(10, '1h', 'BTC/USDT', 'SimpleSMA', '2022-01-01')
-    >>> isinstance(fig, strategies.SimpleSMALive)
+    >>> isinstance(fig, strategies.go.Figure)
     True
     """
-    strategies_dict = {
-        'SimpleSMA': strategies.SimpleSMALive,
-        'RSIStrategy': strategies.RSIStrategy,
-        'SMA_RSI': strategies.SMA_RSI_Strategy,
-        'MACD': strategies.MACDLive,
-        'Mix': strategies.MixStrategy
+    if strategy not in STRATEGIES:
+        raise NotImplementedError(f"{strategy} is not implemented")
+
+    strategy_instance = STRATEGIES[strategy](pair, timeframe, value)
+    data = strategy_instance.load_data(date)
+
+    version = api.candle_store.get_version(api.get_exchange().id, pair, timeframe)
+    data_range = (str(data['Timestamp'].iloc[0]), str(data['Timestamp'].iloc[-1])) if len(data) else None
+    key = (strategy, tuple(sorted(strategy_instance.get_params().items())), pair, timeframe, data_range, version)
+
+    with backtest_cache_lock:
+        entry = backtest_cache.get(key)
+        if entry is not None:
+            backtest_cache.move_to_end(key)
+
+    if entry is not None:
+        logging.info(f"Backtest of {strategy} on {pair} {timeframe} loaded from cache")
+        api.add_data(f"Backtest of {strategy} on {pair} {timeframe} loaded from cache", str(api.datetime.now()))
+        return entry['figure']
+
+    strategy_instance.set_data(data)
+    result = strategy_instance.run_backtest()
+    entry = {
+        'run_id': result['run_id'],
+        'trades': list(strategy_instance._portfolio_values),
+        'equity': result['equity'],
+        'plot_data': strategy_instance.get_plot_data(),
     }
+    entry['figure'] = strategies.plot_backtest(entry['plot_data'])
 
-    if strategy not in strategies_dict:
-        raise NotImplementedError(f"{strategy} is not implemented")
+    with backtest_cache_lock:
+        # Results computed on an older version of the series can not be requested again
+        for old_key in [old_key for old_key in backtest_cache if old_key[2:4] == key[2:4] and old_key[5] != version]:
+            del backtest_cache[old_key]
+        backtest_cache[key] = entry
+        while len(backtest_cache) > BACKTEST_CACHE_SIZE:
+            backtest_cache.popitem(last=False)
 
-    strategy_instance = strategies_dict[strategy](pair, timeframe, value)
-    strategy_instance.backtest(date)
-    fig = strategy_instance.plot_figure()
-    return fig
+    return entry['figure']
 
-def start_trade(trading_logic, timeframe, pair, strategy, percentage):
+def zoom_backtest(figure, x_range):
+    """
+    Draw the zoomed range of a backtest figure at full resolution.
+
+    :param figure: Figure returned by backtest.
+    :param x_range: (start, end) range of dates selected in the graph, or 'auto' for the whole backtest.
+    :return: Figure of the range, downsampled to the width of the graph, or figure if it is not cached.
+    """
+    with backtest_cache_lock:
+        entry = next((entry for entry in backtest_cache.values() if entry['figure'] is figure), None)
+
+    if entry is None or x_range == 'auto':
+        return figure
+    return strategies.plot_backtest(entry['plot_data'], x_range=x_range)
+
+def start_trade(trading_logic, timeframe, pair, strategy, percentage, event_source=None, market_data=None,
+                order_manager=None):
     """
     Start live trading based on the specified strategy.
 
+    The strategy is evaluated once per candle close, when the event source wakes up,
+    and the delay between the close and the evaluation is recorded in trading_logic.
+    An optional trading_logic['on_evaluation'] function is called after each evaluation.
+
     :param trading_logic: Dictionary holding trading logic parameters.
     :param timeframe: Timeframe for live trading.
     :param pair: Trading pair for live trading.
     :param strategy: Trading strategy to use (e.g., 'SimpleSMA').
+    :param event_source: Object whose wait(trading_logic) returns the next candle close,
+                         a CandleScheduler on the timeframe if None.
+    :param market_data: Function with the signature of api.get_ohlcv used to fetch the candles,
+                        api.get_ohlcv if None.
+    :param order_manager: OrderManager sending the orders, None to only log the decisions.
     
     Example:
     >>> trading_logic = create_trading_logic()
@@ -65,32 +140,45 @@ def start_trade(trading_logic, timeframe, pair, strategy, percentage):
     """
     investment_threshold = 6
     
-    strategies_dict = {
-        'SimpleSMA': strategies.SimpleSMALive,
-        'RSIStrategy': strategies.RSIStrategy,
-        'SMA_RSI': strategies.SMA_RSI_Strategy,
-        'MACD': strategies.MACDLive,
-        'Mix': strategies.MixStrategy
-    }
-
-    if strategy not in strategies_dict:
+    if strategy not in STRATEGIES:
         raise NotImplementedError(f"{strategy} is not implemented")
 
-    strategy_instance = strategies_dict[strategy](pair, timeframe, 10)
+    strategy_instance = STRATEGIES[strategy](pair, timeframe, 10)
+    if market_data is not None:
+        strategy_instance.set_market_data(market_data)
+    event_source = event_source or scheduler.CandleScheduler(timeframe)
+    trading_logic.setdefault('lateness', deque(maxlen=1000))
+    trading_logic.setdefault('evaluations', 0)
+
+    logging.info("Live trading is running")
+    api.add_data("Live trading is running", str(api.datetime.now()))
 
     while not trading_logic['stop_flag']:
-        logging.info("Live trading is running")
-        api.add_data("Live trading is running", str(api.datetime.now()))
+        close = event_source.wait(trading_logic)
+        if close is None:
+            break
 
         result = strategy_instance.calculate_signal()
 
+        lateness = time.time() - close / 1000
+        trading_logic['last_close'] = close
+        trading_logic['lateness'].append(lateness)
+        trading_logic['evaluations'] += 1
+        logging.info(f"Candle {datetime.fromtimestamp(close / 1000, timezone.utc)} evaluated {lateness:.3f} s after its close")
+        if trading_logic.get('on_evaluation'):
+            trading_logic['on_evaluation']()
+
         if not strategy_instance.get_live_trade():
 
             if result == "buy":
                 quantity_buy = api.get_quantity(pair, "buy")
                 investment = get_investment(quantity_buy, percentage) 
                 logging.info("Launch buy order")
-                # place_order(pair, "buy", investment, "market")
+                last_close = strategy_instance.get_last_close()
+                if order_manager is not None and last_close:
+                    # The id depends on the candle: the same decision is never sent twice
+                    order_manager.submit(pair, "buy", investment / last_close,
+                                         client_order_id=make_client_order_id(pair, strategy, close, "buy"))
                 strategy_instance.set_live_trade(True)
 
         elif result == "sell":
@@ -100,7 +188,9 @@ def start_trade(trading_logic, timeframe, pair, strategy, percentage):
                 logging.info("Launch sell order")
                 api.add_data("Launch sell order", str(api.datetime.now()))
 
-                # place_order(pair, "sell", investment, "market")
+                if order_manager is not None:
+                    order_manager.submit(pair, "sell", quantity_sell,
+                                         client_order_id=make_client_order_id(pair, strategy, close, "sell"))
                 strategy_instance.set_live_trade(False)
                 
             else:
@@ -0,0 +1,188 @@
+"""
+This script contains the code for backtesting a grid of strategy parameters at once.
+
+The candles are loaded once, their close prices are copied into shared memory and
+every worker process of the pool reads them from there. The workers compute the
+signals of their configurations with the vectorized engine and only send back a
+few metrics per configuration, which are ranked in a DataFrame.
+
+The workers are started with forkserver (spawn where it is not available), not
+fork: forking a process whose log writer thread holds a lock could deadlock the
+worker. Only the sweep tracks the shared memory segment, the workers attach to it
+without registering it, so they never unlink it or report it as leaked.
+"""
+import os
+import logging
+import itertools
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import api
+import strategies
+import strategy_gestion
+
+# Default grid of each strategy of the dashboard
+DEFAULT_GRIDS = {
+    'SimpleSMA': {'sma': list(range(2, 51))},
+    'RSIStrategy': {'rsi_period': [7, 10, 14, 21, 28], 'overbought_threshold': [65, 70, 75, 80],
+                    'oversold_threshold': [20, 25, 30, 35]},
+    'SMA_RSI': {'sma': [10, 14, 20, 30, 50], 'rsi_period': [14, 21, 28]},
+    'MACD': {'short_window': [6, 8, 12, 16], 'long_window': [20, 26, 35, 50], 'signal_window': [5, 9, 12]},
+    'Mix': {'sma': [10, 20, 50], 'rsi_period': [14, 21], 'long_window': [26, 35]},
+}
+
+def expand_grid(grid):
+    """
+    Get every combination of a parameter grid.
+
+    Combinations where a MACD short window is not shorter than the long window, or
+    where the RSI oversold threshold is not below the overbought one, are skipped.
+
+    :param grid: Dictionary {parameter: list of values}.
+    :return: List of parameter dictionaries.
+
+    Example:
+    >>> expand_grid({'short_window': [12, 26], 'long_window': [26]})
+    [{'short_window': 12, 'long_window': 26}]
+    """
+    names = list(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    return [params for params in combinations
+            if params.get('short_window', 0) < params.get('long_window', float('inf'))
+            and params.get('oversold_threshold', 0) < params.get('overbought_threshold', float('inf'))]
+
+def backtest_metrics(close, signals, fees=0.0, initial_value=1000):
+    """
+    Backtest a signal array and summarize the result.
+
+    :param close: Array of close prices.
+    :param signals: Array of signals (1 buy, -1 sell, 0 hold).
+    :param fees: Fees on the buy price taken at each sell.
+    :param initial_value: Portfolio value before the first trade.
+    :return: Dictionary with the final value, return, number of trades, win rate and max drawdown.
+    """
+    result = strategies.run_vectorized_backtest(close, signals, fees=fees, initial_value=initial_value)
+    equity = result['equity']
+    final_value = result['portfolio_values'][-1] if len(result['portfolio_values']) else float(initial_value)
+    drawdown = equity / np.maximum.accumulate(equity) - 1 if len(equity) else np.zeros(1)
+
+    return {
+        'final_value': round(float(final_value), 2),
+        'return_pct': round(100 * (final_value / initial_value - 1), 2),
+        'trades': len(result['exits']),
+        'win_rate': round(float((result['differences'] > 0).mean()), 4) if len(result['exits']) else 0.0,
+        'max_drawdown_pct': round(100 * float(drawdown.min()), 2),
+    }
+
+# Close prices of the worker process, attached from shared memory
+_worker_data = {}
+
+def get_context():
+    """
+    Get the multiprocessing context of the worker processes.
+
+    :return: forkserver context, spawn context where forkserver is not available.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+def open_shared_memory(name):
+    """
+    Attach to an existing shared memory segment without registering it with the resource tracker.
+
+    :param name: Name of the segment.
+    :return: SharedMemory object.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching always registers the segment
+        register = resource_tracker.register
+
+        def register_except_shared_memory(resource_name, resource_type):
+            if resource_type != 'shared_memory':
+                register(resource_name, resource_type)
+
+        resource_tracker.register = register_except_shared_memory
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+def _attach(name, length):
+    shm = open_shared_memory(name)
+    _worker_data['shm'] = shm
+    _worker_data['close'] = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+
+def _run_chunk(strategy, pair, timeframe, param_sets):
+    close = _worker_data['close']
+    df = pd.DataFrame({'Close': close})
+    rows = []
+    for params in param_sets:
+        strategy_instance = strategy_gestion.STRATEGIES[strategy](pair, timeframe, **params)
+        strategy_instance.set_data(df)
+        signals = strategy_instance.compute_signals()
+        rows.append({**params, **backtest_metrics(close, signals, strategy_instance._fees)})
+    return rows
+
+def run_sweep(strategy, grid=None, pair='BTC/USDT', timeframe='5m', since=None, until=None, data=None,
+              max_workers=None, chunk_size=None):
+    """
+    Backtest every combination of a parameter grid on the same candles, in parallel.
+
+    :param strategy: Name of the strategy (e.g., 'SimpleSMA', see strategy_gestion.STRATEGIES).
+    :param grid: Dictionary {parameter: list of values}, DEFAULT_GRIDS[strategy] if None.
+    :param pair: Trading pair.
+    :param timeframe: Timeframe of the candles.
+    :param since: Start date of the backtest.
+    :param until: End date (excluded) of the backtest, None for the last candle.
+    :param data: DataFrame of candles to use instead of loading them.
+    :param max_workers: Number of worker processes, the number of CPUs if None.
+    :param chunk_size: Number of configurations sent at once to a worker.
+    :return: DataFrame with one row per configuration, best final value first.
+
+    Example:
+    >>> import benchmark
+    >>> results = run_sweep('SimpleSMA', {'sma': [10, 20, 50]}, data=benchmark.make_candles(500), max_workers=1)
+    >>> list(results.columns[:2])
+    ['sma', 'final_value']
+    """
+    if strategy not in strategy_gestion.STRATEGIES:
+        raise NotImplementedError(f"Sweep of {strategy} is not implemented")
+
+    param_sets = expand_grid(grid or DEFAULT_GRIDS[strategy])
+    if data is None:
+        data = strategy_gestion.STRATEGIES[strategy](pair, timeframe, **param_sets[0]).load_data(
+            since or '2023-06-11 00:00:00', until)
+    close = np.ascontiguousarray(data['Close'], dtype=np.float64)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, len(param_sets) // (4 * max_workers))
+    chunks = [param_sets[i:i + chunk_size] for i in range(0, len(param_sets), chunk_size)]
+
+    logging.info(f"Sweeping {len(param_sets)} configurations of {strategy} on {len(close)} candles...")
+    api.add_data(f"Sweeping {len(param_sets)} configurations of {strategy} on {len(close)} candles...",
+                 str(api.datetime.now()))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+    try:
+        np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context(), initializer=_attach,
+                                 initargs=(shm.name, len(close))) as executor:
+            futures = [executor.submit(_run_chunk, strategy, pair, timeframe, chunk) for chunk in chunks]
+            rows = [row for future in futures for row in future.result()]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results = pd.DataFrame(rows)
+    results = results.sort_values(['final_value', 'max_drawdown_pct'], ascending=[False, False], ignore_index=True)
+    results.index += 1
+
+    logging.info(f"Sweep complete. Best configuration: {results.iloc[0].to_dict()}")
+    api.add_data(f"Sweep complete. Best configuration: {results.iloc[0].to_dict()}", str(api.datetime.now()))
+    return results
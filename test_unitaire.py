@@ -1,11 +1,1365 @@
+import os
+import logging
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
+import numpy as np
+import pandas as pd
+
+import api
+import balance
+import benchmark
+import bot_runner
+import candle_store
+import downsampling
+import events
+import exchanges
+import indicators
+import market_data
+import order_manager
+import scheduler
 import strategies
+import strategy_gestion
+import sweep
+from candle_store import CandleStore, timeframe_to_milliseconds
+from candle_window import CandleWindow
+from log_tail import LogTail
 
 class TestSMA(unittest.TestCase):
     def test_SMA_is_instance_of_SimpleSMA(self):
         s = strategies.SimpleSMALive("BTC/USDT","2023-06_06", 20)
         self.assertIsInstance(s, strategies.SimpleSMALive)
 
+def loop_backtest(close, signals, fees=0.0):
+    """
+    Per-bar reference of the backtest engine, following the original loops.
+    """
+    live_trade = False
+    value = 1000
+    trades = []
+    for i in range(len(close)):
+        if signals[i] == 1 and not live_trade:
+            live_trade = True
+            prix_achat = close[i]
+        elif signals[i] == -1 and live_trade:
+            live_trade = False
+            difference = close[i] - prix_achat - prix_achat * fees
+            value = value + value * difference / prix_achat
+            trades.append((i, round(prix_achat, 2), round(value, 2), round(difference, 2)))
+    return trades
+
+class TestVectorizedBacktest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        api.create_database()
+        self.candles = benchmark.make_candles(3000, seed=1)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_engine_matches_loop(self):
+        rng = np.random.default_rng(2)
+        close = self.candles['Close'].to_numpy()
+        signals = rng.choice([-1, 0, 1], size=len(close))
+        result = strategies.run_vectorized_backtest(close, signals, fees=0.001)
+        expected = loop_backtest(close, signals, fees=0.001)
+
+        self.assertEqual([t[0] for t in expected], list(result['exits']))
+        np.testing.assert_allclose([t[2] for t in expected], np.round(result['portfolio_values'], 2))
+
+    def test_sma_matches_legacy_loop(self):
+        strategy = strategies.SimpleSMALive('BTC/USDT', '5m', 25)
+        strategy.set_data(self.candles.copy())
+        strategy.run_backtest()
+        expected = benchmark.legacy_sma_backtest(self.candles.copy(), 25)
+        self.assertEqual(expected, strategy._portfolio_values)
+
+    def test_strategies_match_loop(self):
+        for strategy in [strategies.RSIStrategy('BTC/USDT', '5m', 14),
+                         strategies.MACDLive('BTC/USDT', '5m'),
+                         strategies.SMA_RSI_Strategy('BTC/USDT', '5m', 10)]:
+            strategy.set_data(self.candles.copy())
+            strategy.run_backtest()
+            signals = strategy.get_data()['Signal'].to_numpy()
+            expected = loop_backtest(self.candles['Close'].to_numpy(), signals)
+            self.assertEqual([t[2] for t in expected], [t[2] for t in strategy._portfolio_values])
+
+    def test_strategies_match_legacy_loops(self):
+        close = self.candles['Close']
+
+        strategy = strategies.MACDLive('BTC/USDT', '5m')
+        strategy.set_data(self.candles.copy())
+        strategy.run_backtest()
+        expected = benchmark.legacy_macd_backtest(self.candles.copy())
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(expected, strategy._portfolio_values)
+
+        strategy = strategies.RSIStrategy('BTC/USDT', '5m', 14)
+        strategy.set_data(self.candles.copy())
+        strategy.run_backtest()
+        expected = benchmark.legacy_rsi_backtest(self.candles.copy(), indicators.wilder_rsi(close, 14), 14)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(expected, strategy._portfolio_values)
+
+        strategy = strategies.SMA_RSI_Strategy('BTC/USDT', '5m', 10, 14)
+        strategy.set_data(self.candles.copy())
+        strategy.run_backtest()
+        expected = benchmark.legacy_sma_rsi_backtest(self.candles.copy(), 10, indicators.wilder_rsi(close, 14), 14)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(expected, strategy._portfolio_values)
+
+    def test_equity_follows_open_position(self):
+        result = strategies.run_vectorized_backtest([100, 110, 120, 90, 100], [1, 0, -1, 1, 0])
+        np.testing.assert_allclose(result['equity'], [1000, 1100, 1200, 1200, 1200 * 100 / 90])
+
+class TestLogWriter(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        api.create_database()
+
+    def tearDown(self):
+        api.close_logs()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def count_rows(self):
+        conn = sqlite3.connect(api.DATABASE)
+        count = conn.execute('SELECT count(*) FROM logs').fetchone()[0]
+        conn.close()
+        return count
+
+    def test_rows_are_written_in_order(self):
+        for i in range(2000):
+            api.add_data(f"row {i}", str(api.datetime.now()))
+        api.flush_logs()
+        self.assertEqual(self.count_rows(), 2000)
+
+        conn = sqlite3.connect(api.DATABASE)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(conn.execute('SELECT name FROM logs ORDER BY id DESC LIMIT 1').fetchone()[0], 'row 1999')
+        conn.close()
+
+    def test_rows_are_committed_without_flush(self):
+        api.add_data("row", str(api.datetime.now()))
+        time.sleep(1)
+        self.assertEqual(self.count_rows(), 1)
+
+class TestDatabaseSchema(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        api.create_database()
+
+    def tearDown(self):
+        api.close_logs()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_backtest_is_recorded(self):
+        strategy = strategies.SimpleSMALive('BTC/USDT', '5m', 25)
+        strategy.set_data(benchmark.make_candles(2000))
+        result = strategy.run_backtest()
+
+        run = api.query('SELECT * FROM backtest_runs WHERE id = ?', (result['run_id'],)).iloc[0]
+        self.assertEqual(run['strategy'], 'SimpleSMALive')
+        self.assertEqual(run['params'], '{"sma": 25}')
+        self.assertEqual(run['trades'], len(result['exits']))
+        self.assertAlmostEqual(run['final_value'], strategy.get_last_portfolio_value())
+
+        signals = api.get_signals('BTC/USDT', run['since'], run['until'] + 1)
+        self.assertEqual(len(signals), len(result['entries']) + len(result['open_entry']) + len(result['exits']))
+        equity = api.get_equity_curve(result['run_id'])
+        self.assertEqual(len(equity), len(result['exits']) + 2)
+
+    def test_data_persists_and_is_indexed(self):
+        api.add_data("kept", str(api.datetime.now()))
+        api.create_database()
+        self.assertEqual(api.query('SELECT name FROM logs')['name'].tolist(), ['kept'])
+
+        plan = api.query('EXPLAIN QUERY PLAN SELECT * FROM signals WHERE pair = ? AND timestamp >= ?', ('BTC/USDT', 0))
+        self.assertIn('signals_pair_timestamp', plan['detail'].iloc[0])
+
+class TestLogTail(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'app.log')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, text, mode='a'):
+        with open(self.path, mode) as log_file:
+            log_file.write(text)
+
+    def test_only_new_lines_are_read(self):
+        tail = LogTail(self.path, max_lines=3)
+        self.assertEqual(tail.poll(), [])
+
+        self.write("a\nb\nc")
+        self.assertEqual(tail.poll(), ["a\n", "b\n"])
+        self.write("d\ne\n")
+        self.assertEqual(tail.poll(), ["cd\n", "e\n"])
+        self.assertEqual(tail.poll(), [])
+        self.assertEqual(tail.get_lines(), ["b\n", "cd\n", "e\n"])
+        self.assertEqual(tail.get_lines(1), ["e\n"])
+
+    def test_rotation_and_truncation(self):
+        tail = LogTail(self.path)
+        self.write("old 1\nold 2\n")
+        tail.poll()
+
+        os.rename(self.path, self.path + '.1')
+        self.write("new 1\n")
+        self.assertEqual(tail.poll(), ["new 1\n"])
+
+        self.write("", mode='w')
+        self.write("restart\n")
+        self.assertEqual(tail.poll(), ["restart\n"])
+
+    def test_large_file_is_read_from_the_end(self):
+        self.write("".join(f"line {i}\n" for i in range(200_000)))
+        tail = LogTail(self.path, max_lines=7, initial_bytes=1024)
+        lines = tail.poll()
+
+        self.assertLess(len(lines), 100)
+        self.assertEqual(lines[0][:5], "line ")
+        self.assertEqual(tail.get_lines()[-1], "line 199999\n")
+
+class TestEvents(unittest.TestCase):
+    def test_waiting_client_is_woken_up_by_publish(self):
+        bus = events.EventBus()
+        received = []
+        waiter = threading.Thread(target=lambda: received.extend(bus.wait(0, timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+
+        start = time.perf_counter()
+        bus.publish('bots', [{'bot_id': 'sma', 'state': 'running'}])
+        waiter.join()
+
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(received, [{'id': 1, 'channel': 'bots', 'data': [{'bot_id': 'sma', 'state': 'running'}]}])
+        self.assertEqual(bus.wait(1, timeout=0.01), [])
+
+    def test_log_records_are_published(self):
+        bus = events.EventBus()
+        logger = logging.getLogger('test_events')
+        handler = events.EventLogHandler(bus)
+        handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        logger.warning("Not enough funds")
+        self.assertEqual(bus.get_events(), [{'id': 1, 'channel': 'log', 'data': 'WARNING - Not enough funds'}])
+
+    def test_poll_requests_are_not_published(self):
+        from urllib.request import urlopen
+        from flask import Flask
+        from werkzeug.serving import make_server
+
+        bus = events.EventBus()
+        handler = events.EventLogHandler(bus)
+        logging.getLogger().addHandler(handler)
+        self.addCleanup(logging.getLogger().removeHandler, handler)
+
+        server = Flask(__name__)
+        events.register_routes(server, bus, poll_timeout=0.05)
+        http_server = make_server('127.0.0.1', 0, server)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        self.addCleanup(http_server.shutdown)
+
+        bus.publish('bots', [])
+        for _ in range(2):
+            with urlopen(f"http://127.0.0.1:{http_server.server_port}/events/poll?since=1") as response:
+                self.assertEqual(response.status, 200)
+        # The access log line of each request is not an event
+        self.assertEqual(bus.get_last_id(), 1)
+
+    def test_stream_and_long_polling_routes(self):
+        from flask import Flask
+
+        bus = events.EventBus(max_events=2)
+        server = Flask(__name__)
+        events.register_routes(server, bus, poll_timeout=0.05)
+        client = server.test_client()
+
+        response = client.get('/events/poll?since=0')
+        self.assertEqual(response.get_json()['events'], [])
+        for i in range(3):
+            bus.publish('fill', {'price': 100 + i})
+        result = client.get('/events/poll?since=1').get_json()
+        self.assertEqual([event['data']['price'] for event in result['events']], [101, 102])
+        self.assertEqual(result['last_id'], 3)
+
+        response = client.get('/events/stream', headers={'Last-Event-ID': f"{bus.epoch}-2"})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = response.iter_encoded()
+        self.assertEqual(next(chunks), b"retry: 1000\n\n")
+        self.assertEqual(next(chunks), f'event: epoch\ndata: "{bus.epoch}"\n\n'.encode())
+        self.assertEqual(next(chunks), f'id: {bus.epoch}-3\nevent: fill\ndata: {{"price": 102}}\n\n'.encode())
+        response.close()
+
+    def test_ids_of_a_previous_server_are_reset(self):
+        from flask import Flask
+
+        old_bus = events.EventBus()
+        for i in range(5):
+            old_bus.publish('log', f"old {i}")
+        bus = events.EventBus()
+        bus.publish('log', 'new')
+        self.assertNotEqual(bus.epoch, old_bus.epoch)
+        self.assertEqual([event['data'] for event in bus.wait(5, timeout=1)], ['new'])
+
+        server = Flask(__name__)
+        events.register_routes(server, bus, poll_timeout=1)
+        client = server.test_client()
+
+        result = client.get(f"/events/poll?since=1&epoch={old_bus.epoch}").get_json()
+        self.assertEqual([event['data'] for event in result['events']], ['new'])
+        self.assertEqual(result['epoch'], str(bus.epoch))
+
+        response = client.get('/events/stream', headers={'Last-Event-ID': f"{old_bus.epoch}-1"})
+        chunks = response.iter_encoded()
+        next(chunks)
+        next(chunks)
+        self.assertEqual(next(chunks), f'id: {bus.epoch}-1\nevent: log\ndata: "new"\n\n'.encode())
+        response.close()
+
+class TestBalanceCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.balance = {'total': {'USDT': 100.0, 'BTC': 0.5}, 'free': {'USDT': 80.0, 'BTC': 0.5},
+                        'used': {'USDT': 20.0, 'BTC': 0.0}}
+        self.balances = balance.BalanceCache(lambda: self.balance, ttl=5, clock=lambda: self.now)
+
+    def set_currency(self, currency, total, free, used):
+        self.balance = {key: dict(values) for key, values in self.balance.items()}
+        for key, value in (('total', total), ('free', free), ('used', used)):
+            if value is None:
+                self.balance[key].pop(currency, None)
+            else:
+                self.balance[key][currency] = value
+
+    def test_balance_is_fetched_once_per_ttl(self):
+        self.assertEqual(self.balances.get_free('USDT'), 80.0)
+        self.assertEqual(self.balances.get_free('BTC'), 0.5)
+        self.assertEqual(self.balances.get_free('ETH'), 0)
+        self.assertEqual(self.balances.fetches, 1)
+
+        self.set_currency('USDT', 100.0, 60.0, 40.0)
+        self.now = 4.9
+        self.assertEqual(self.balances.get_free('USDT'), 80.0)
+        self.now = 5.0
+        self.assertEqual(self.balances.get_free('USDT'), 60.0)
+        self.assertEqual(self.balances.fetches, 2)
+
+    def test_orders_invalidate_the_balance(self):
+        self.balances.get('USDT')
+        self.set_currency('USDT', 100.0, 70.0, 30.0)
+        with mock.patch.object(api, 'balances', self.balances), \
+             mock.patch.object(api, 'add_data', lambda name, date: None), \
+             mock.patch.object(api, 'get_log_writer'):
+            api.add_order('bot-1', 'BTC/USDT', 'buy', 'limit', 0.01, 1000.0, 'open', 0)
+            self.assertEqual(api.get_quantity('BTC/USDT', 'buy'), 70.0)
+            self.assertEqual(api.get_quantity('BTC/USDT', 'sell'), 0.5)
+            self.assertEqual(api.get_quantity('ETH/USDT', 'sell'), 0)
+        self.assertEqual(self.balances.fetches, 2)
+
+    def test_malformed_balance_gives_no_funds(self):
+        balances = balance.BalanceCache(lambda: {'total': {'USDT': 10.0}})
+        with mock.patch.object(api, 'balances', balances), \
+             mock.patch.object(api, 'add_data', lambda name, date: None):
+            self.assertEqual(api.get_quantity('BTC/USDT', 'buy'), 0)
+
+    def test_concurrent_callers_share_one_fetch(self):
+        fetched = []
+
+        def fetch_balance():
+            fetched.append(1)
+            time.sleep(0.05)
+            return self.balance
+
+        balances = balance.BalanceCache(fetch_balance)
+        threads = [threading.Thread(target=balances.get, args=('USDT',)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(fetched), 1)
+
+    def test_only_changed_rows_are_returned(self):
+        version, changed, removed = self.balances.get_changes()
+        self.assertEqual(sorted(changed), ['BTC', 'USDT'])
+
+        self.set_currency('BTC', 0.4, 0.4, 0.0)
+        self.set_currency('ETH', 2.0, 2.0, 0.0)
+        self.balances.invalidate()
+        version, changed, removed = self.balances.get_changes(version)
+        self.assertEqual(changed, {'BTC': {'Total': 0.4, 'Free': 0.4, 'Used': 0.0},
+                                   'ETH': {'Total': 2.0, 'Free': 2.0, 'Used': 0.0}})
+        self.assertEqual(removed, [])
+
+        self.set_currency('ETH', None, None, None)
+        self.balances.invalidate()
+        self.assertEqual(self.balances.get_changes(version)[1:], ({}, ['ETH']))
+        self.balances.invalidate()
+        self.assertEqual(self.balances.get_changes(version + 1), (version + 1, {}, []))
+
+class TestOrderManager(unittest.TestCase):
+    def setUp(self):
+        self.fills = []
+        for name, replacement in (('add_data', lambda name, date: None),
+                                  ('add_order', lambda *args: None),
+                                  ('add_fill', lambda *args: self.fills.append(args))):
+            patcher = mock.patch.object(api, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_manager(self, exchange):
+        manager = order_manager.OrderManager(exchange, poll_interval=0.01, retry_delay=0.01)
+        self.addCleanup(manager.stop)
+        return manager
+
+    def test_partial_fills_are_tracked(self):
+        exchange = order_manager.MockExchange(price=200.0, fill_steps=4)
+        manager = self.make_manager(exchange)
+
+        client_order_id = manager.submit('BTC/USDT', 'buy', 0.2)
+        order = manager.wait(client_order_id, timeout=2)
+
+        self.assertEqual(order['status'], 'closed')
+        self.assertAlmostEqual(order['filled'], 0.2)
+        self.assertEqual(len(self.fills), 4)
+        self.assertAlmostEqual(sum(fill[4] for fill in self.fills), 0.2)
+        for fill in self.fills:
+            self.assertAlmostEqual(fill[3], 200.0)
+        latencies = manager.get_latencies()
+        self.assertEqual([latencies[stage]['count'] for stage in latencies], [1, 1, 1])
+
+    def test_lost_acknowledgement_is_not_sent_twice(self):
+        exchange = order_manager.MockExchange(lost_acks=1)
+        manager = self.make_manager(exchange)
+
+        client_order_id = manager.submit('BTC/USDT', 'sell', 1.0, client_order_id='bot-1')
+        self.assertEqual(manager.submit('BTC/USDT', 'sell', 1.0, client_order_id='bot-1'), client_order_id)
+        order = manager.wait(client_order_id, timeout=2)
+
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(len(exchange.orders), 1)
+        self.assertEqual(order['exchange_order_id'], '1')
+
+    def test_queued_orders_are_sent_in_batches(self):
+        exchange = order_manager.MockExchange(latency=0.05, reject=['bad'])
+        manager = self.make_manager(exchange)
+
+        start = time.perf_counter()
+        ids = [manager.submit('ETH/USDT', 'buy', 1.0, client_order_id=f"order-{i}") for i in range(5)]
+        ids.append(manager.submit('ETH/USDT', 'buy', 1.0, client_order_id='bad'))
+        self.assertLess(time.perf_counter() - start, 0.05)
+
+        orders = [manager.wait(client_order_id, timeout=5) for client_order_id in ids]
+        self.assertEqual([order['status'] for order in orders], ['closed'] * 5 + ['rejected'])
+        self.assertIn('InvalidOrder', orders[-1]['error'])
+        self.assertIn('create_orders', exchange.calls)
+        self.assertEqual(len(exchange.orders), 5)
+
+    def test_accepted_orders_of_a_batch_are_not_sent_again(self):
+        exchange = order_manager.MockExchange(latency=0.05, reject=['bad'])
+        exchange.has = {}
+        manager = self.make_manager(exchange)
+
+        ids = [manager.submit('ETH/USDT', 'buy', 1.0, client_order_id=client_order_id)
+               for client_order_id in ('order-0', 'order-1', 'bad', 'order-3')]
+        orders = [manager.wait(client_order_id, timeout=5) for client_order_id in ids]
+
+        self.assertEqual([order['status'] for order in orders], ['closed', 'closed', 'rejected', 'closed'])
+        # Each order is sent once, one by one, the orders sent before the rejected one are kept
+        self.assertEqual(exchange.calls.count('create_order'), 4)
+        self.assertEqual(len(exchange.orders), 3)
+
+class FakeMarketsClient:
+    """
+    Stand-in for a ccxt client whose load_markets is counted.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.markets = None
+        self.currencies = None
+        self.loads = 0
+
+    def load_markets(self, reload=False, params={}):
+        if self.markets is None or reload:
+            self.loads += 1
+            self.set_markets({'BTC/USDT': {'symbol': 'BTC/USDT', 'precision': {'amount': 0.0001}}},
+                             {'BTC': {'code': 'BTC'}})
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets, self.currencies = markets, currencies
+
+class TestExchangeRegistry(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.now = 1000.0
+        self.built = []
+
+    def make_registry(self):
+        def factory(class_name, config):
+            self.built.append(class_name)
+            return FakeMarketsClient(config)
+
+        return exchanges.ExchangeRegistry({'spot': ('mexc', lambda: {'apiKey': 'key'}),
+                                           'futures': ('mexc', lambda: {'options': {'defaultType': 'swap'}})},
+                                          default='spot', directory=self._tmp.name, ttl=60, factory=factory,
+                                          clock=lambda: self.now)
+
+    def test_clients_are_built_on_first_use(self):
+        registry = self.make_registry()
+        self.assertEqual(self.built, [])
+
+        spot = registry.get()
+        self.assertIs(registry.get('spot'), spot)
+        self.assertEqual(spot.config, {'enableRateLimit': True, 'apiKey': 'key'})
+        self.assertEqual(registry.get('futures').config['options'], {'defaultType': 'swap'})
+        self.assertEqual(self.built, ['mexc', 'mexc'])
+        with self.assertRaises(KeyError):
+            registry.get('kraken')
+
+    def test_markets_are_saved_until_the_ttl(self):
+        client = self.make_registry().get()
+        client.load_markets()
+        client.load_markets()
+        self.assertEqual(client.loads, 1)
+
+        # A new process reuses the saved markets
+        self.now += 59
+        client = self.make_registry().get()
+        self.assertEqual(client.load_markets()['BTC/USDT']['precision'], {'amount': 0.0001})
+        self.assertEqual(client.currencies, {'BTC': {'code': 'BTC'}})
+        self.assertEqual(client.loads, 0)
+
+        self.now += 1
+        client = self.make_registry().get()
+        client.load_markets()
+        self.assertEqual(client.loads, 1)
+
+    def test_api_uses_the_registry(self):
+        self.assertIs(api.get_exchange('binance'), exchanges.registry.get('binance'))
+        self.assertIs(api.binance, exchanges.registry.get('binance'))
+        fake = FakeMarketsClient({})
+        self.assertIs(api.get_exchange(fake), fake)
+
+class TestStartup(unittest.TestCase):
+    def test_heavy_libraries_are_not_imported_by_the_strategies(self):
+        code = ("import sys, strategies, strategy_gestion, exchanges; "
+                "print(sorted(name for name in ('ccxt', 'plotly', 'dontshare_config') if name in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_lazy_module_is_imported_on_first_use(self):
+        from lazy import lazy_import
+
+        module = lazy_import('plotly.graph_objects')
+        self.assertIn('not imported yet', repr(module))
+        self.assertTrue(callable(module.Figure))
+        self.assertIn('(imported)', repr(module))
+
+class TestCandleScheduler(unittest.TestCase):
+    def test_wakes_up_on_candle_close(self):
+        start = time.time()
+        offset = 60 - start % 60 - 0.1
+        clock = lambda: time.time() + offset
+        candle_scheduler = scheduler.CandleScheduler('1m', delay=0, clock=clock)
+
+        close = candle_scheduler.wait(strategy_gestion.create_trading_logic())
+        self.assertEqual(close % 60_000, 0)
+        self.assertLess(time.time() - start, 0.3)
+        self.assertGreaterEqual(clock() * 1000, close)
+
+    def test_stop_flag_interrupts_wait(self):
+        trading_logic = strategy_gestion.create_trading_logic()
+        threading.Timer(0.1, strategy_gestion.stop_trade, (trading_logic,)).start()
+        self.assertIsNone(scheduler.CandleScheduler('1d').wait(trading_logic))
+
+    def test_live_loop_runs_once_per_close(self):
+        trading_logic = strategy_gestion.create_trading_logic()
+        source = scheduler.KlineEventSource()
+        now = int(time.time() * 1000) // 60_000 * 60_000
+        for i in range(3):
+            source.push(now - (2 - i) * 60_000)
+        calls = []
+
+        def calculate_signal(strategy):
+            calls.append(strategy)
+            if len(calls) == 3:
+                strategy_gestion.stop_trade(trading_logic)
+            return 0
+
+        with mock.patch.object(strategies.SimpleSMALive, 'calculate_signal', calculate_signal), \
+             mock.patch.object(api, 'add_data', lambda name, date: None):
+            strategy_gestion.start_trade(trading_logic, '1m', 'BTC/USDT', 'SimpleSMA', 5, event_source=source)
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(trading_logic['last_close'], now)
+        self.assertEqual(len(trading_logic['lateness']), 3)
+        self.assertGreater(trading_logic['lateness'][0], trading_logic['lateness'][2])
+
+def wilder_rsi(close, period):
+    """
+    Reference Wilder RSI written as a plain loop.
+    """
+    rsi = np.full(len(close), np.nan)
+    changes = np.diff(close)
+    gains, losses = np.maximum(changes, 0), np.maximum(-changes, 0)
+    average_gain, average_loss = gains[:period].mean(), losses[:period].mean()
+    for i in range(period, len(close)):
+        if i > period:
+            average_gain = (average_gain * (period - 1) + gains[i - 1]) / period
+            average_loss = (average_loss * (period - 1) + losses[i - 1]) / period
+        rsi[i] = 100.0 if average_loss == 0 else 100 - 100 / (1 + average_gain / average_loss)
+    return rsi
+
+def replay_live_signals(strategy, df):
+    """
+    Evaluate a live strategy once per candle, the candles being revealed one by one.
+    """
+    df = df.assign(Timestamp=pd.to_datetime(df['Timestamp']))
+    visible = [0]
+
+    def fetch_ohlcv(symbol, timeframe, since=None, limit=None):
+        candles = df.iloc[:visible[0]]
+        if since is not None:
+            return candles[candles['Timestamp'] >= pd.Timestamp(since, unit='ms')]
+        return candles.tail(limit)
+
+    strategy.set_market_data(fetch_ohlcv)
+    signals = []
+    for i in range(len(df)):
+        visible[0] = i + 1
+        signal = strategy.calculate_signal()
+        signals.append(1 if signal == "buy" else -1 if signal == "sell" else 0)
+    return np.array(signals, dtype=np.int8)
+
+class TestRSI(unittest.TestCase):
+    def test_matches_reference(self):
+        close = benchmark.make_candles(5000, seed=8)['Close']
+        rsi = strategies.RSIStrategy('BTC/USDT', '5m', 14).calculate_rsi(close)
+
+        self.assertEqual(rsi.dtype, np.float64)
+        self.assertEqual(len(rsi), len(close))
+        self.assertTrue(np.isnan(rsi[:14]).all())
+        np.testing.assert_allclose(rsi, wilder_rsi(close.to_numpy(), 14), rtol=1e-9, equal_nan=True)
+
+    def test_edge_cases(self):
+        np.testing.assert_array_equal(indicators.wilder_rsi([5.0] * 6, 3), [np.nan] * 3 + [100.0] * 3)
+        np.testing.assert_array_equal(indicators.wilder_rsi([3.0, 2.0, 1.0], 2), [np.nan, np.nan, 0.0])
+        self.assertTrue(np.isnan(indicators.wilder_rsi([1.0, 2.0], 14)).all())
+
+    def test_million_bars(self):
+        close = 100 + np.cumsum(np.random.default_rng(9).normal(0, 1, 1_000_000))
+        start = time.perf_counter()
+        rsi = indicators.wilder_rsi(close, 14)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        np.testing.assert_allclose(rsi[-1000:], wilder_rsi(close, 14)[-1000:], rtol=1e-6)
+
+class TestStreamingIndicators(unittest.TestCase):
+    def setUp(self):
+        self.close = benchmark.make_candles(2000, seed=3)['Close']
+
+    def replay(self, indicator):
+        return np.array([indicator.update(value) for value in self.close])
+
+    def test_sma_matches_rolling_mean(self):
+        np.testing.assert_allclose(self.replay(indicators.SMA(25)), self.close.rolling(25).mean(),
+                                   rtol=1e-12, equal_nan=True)
+
+    def test_ema_matches_ewm(self):
+        np.testing.assert_allclose(self.replay(indicators.EMA(12)), self.close.ewm(span=12, adjust=False).mean(),
+                                   rtol=1e-12)
+
+    def test_rsi_matches_wilder(self):
+        np.testing.assert_allclose(self.replay(indicators.RSI(14)), wilder_rsi(self.close.to_numpy(), 14),
+                                   rtol=1e-9, equal_nan=True)
+
+    def test_macd_matches_batch(self):
+        batch = strategies.MACDLive('BTC/USDT', '5m').calculate_macd(self.close)
+        np.testing.assert_allclose(self.replay(indicators.MACD()), batch, rtol=1e-9, atol=1e-9)
+
+    def test_live_signals_match_backtest(self):
+        df = benchmark.make_candles(400, seed=4)
+        with mock.patch.object(api, 'add_data', lambda name, date: None):
+            for strategy in (strategies.SimpleSMALive('BTC/USDT', '5m', 20), strategies.MACDLive('BTC/USDT', '5m'),
+                             strategies.RSIStrategy('BTC/USDT', '5m', 6, 60, 40),
+                             strategies.SMA_RSI_Strategy('BTC/USDT', '5m', 10, 6, 60, 40)):
+                strategy.set_data(df.copy())
+                np.testing.assert_array_equal(replay_live_signals(strategy, df), strategy.compute_signals())
+
+class TestIndicatorCache(unittest.TestCase):
+    def test_same_content_is_computed_once(self):
+        cache = indicators.IndicatorCache()
+        calls = []
+
+        def double(values, factor):
+            calls.append(factor)
+            return values * factor
+
+        first = cache.get('double', np.arange(10.0), double, factor=2)
+        second = cache.get('double', pd.Series(np.arange(10.0)), double, factor=2)
+        cache.get('double', np.arange(10.0), double, factor=3)
+        cache.get('double', np.arange(11.0), double, factor=2)
+
+        self.assertIs(first, second)
+        self.assertFalse(first.flags.writeable)
+        self.assertEqual(calls, [2, 3, 2])
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = indicators.IndicatorCache(max_bytes=2 * 800)
+        for factor in (1, 2, 1, 3):
+            cache.get('double', np.arange(100.0), lambda values, factor: values * factor, factor=factor)
+        self.assertEqual(cache.get_size(), 1600)
+
+        cache.get('double', np.arange(100.0), lambda values, factor: values * factor, factor=1)
+        self.assertEqual(cache.hits, 2)
+        cache.get('double', np.arange(100.0), lambda values, factor: values * factor, factor=2)
+        self.assertEqual(cache.misses, 4)
+
+    def test_disk_entries_are_shared_between_caches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            indicators.IndicatorCache(directory=directory).get('double', np.arange(5.0), lambda values: values * 2)
+            cache = indicators.IndicatorCache(directory=directory)
+            result = cache.get('double', np.arange(5.0), lambda values: self.fail("computed again"))
+
+        np.testing.assert_array_equal(result, np.arange(5.0) * 2)
+        self.assertEqual(cache.disk_hits, 1)
+
+    def test_combined_strategy_reuses_parent_indicators(self):
+        df = benchmark.make_candles(1000, seed=7)
+        with mock.patch.object(indicators, 'cache', indicators.IndicatorCache()):
+            for strategy in (strategies.SimpleSMALive('BTC/USDT', '5m', 14), strategies.RSIStrategy('BTC/USDT', '5m', 28)):
+                strategy.set_data(df.copy())
+                strategy.compute_signals()
+            misses = indicators.cache.misses
+
+            strategy = strategies.SMA_RSI_Strategy('BTC/USDT', '5m', 14, 28)
+            strategy.set_data(df.copy())
+            strategy.compute_signals()
+            self.assertEqual(indicators.cache.misses, misses)
+            self.assertEqual(indicators.cache.hits, 2)
+
+class TestMixStrategy(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        api.create_database()
+
+    def tearDown(self):
+        api.flush_logs()
+        api.close_logs()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_vote_without_network(self):
+        df = benchmark.make_candles(3000, seed=6)
+        mix = strategies.MixStrategy('BTC/USDT', '5m', 20)
+
+        def fetch_ohlcv(*args, **kwargs):
+            raise AssertionError("the backtest must not fetch candles")
+
+        mix.set_market_data(fetch_ohlcv)
+        mix.set_data(df.copy())
+        signals = mix.compute_signals()
+
+        votes = []
+        for strategy in (strategies.SimpleSMALive('BTC/USDT', '5m', 20), strategies.RSIStrategy('BTC/USDT', '5m'),
+                         strategies.MACDLive('BTC/USDT', '5m')):
+            strategy.set_data(df.copy())
+            votes.append(strategy.compute_signals())
+        expected = [1 if list(bar).count(1) >= 2 else -1 if list(bar).count(-1) >= 2 else 0 for bar in zip(*votes)]
+
+        np.testing.assert_array_equal(signals, expected)
+        self.assertTrue({'SMA', 'RSI', 'MACD'} <= set(mix.get_data().columns))
+
+    def test_fees_are_a_share_of_the_buy_price(self):
+        df = pd.DataFrame({'Timestamp': pd.date_range('2022-06-11', periods=4, freq='5min'),
+                           'Open': 100.0, 'High': 100.0, 'Low': 100.0, 'Close': [100.0, 110.0, 100.0, 90.0],
+                           'Volume': 1.0})
+        mix = strategies.MixStrategy('BTC/USDT', '5m', 20)
+        mix.set_data(df)
+        with mock.patch.object(mix, 'compute_signals', lambda: np.array([1, -1, 1, -1], dtype=np.int8)):
+            mix.run_backtest()
+
+        # 0.1% of the buy price is taken from the gain of each trade
+        first = 1000 * (1 + (110 - 100 - 0.1) / 100)
+        self.assertAlmostEqual(mix.get_last_portfolio_value(), first * (1 + (90 - 100 - 0.1) / 100))
+
+class TestDownsampling(unittest.TestCase):
+    def test_extremes_are_kept(self):
+        y = np.random.default_rng(10).normal(0, 1, 100_000)
+        y[12_345], y[67_890] = 50, -50
+        x = np.arange(len(y))
+
+        for method in ('lttb', 'minmax'):
+            sampled_x, sampled_y = downsampling.downsample(x, y, 1000, method=method)
+            self.assertLessEqual(len(sampled_x), 1000)
+            self.assertTrue(np.all(np.diff(sampled_x) > 0))
+            self.assertEqual((sampled_x[0], sampled_x[-1]), (0, len(y) - 1))
+            self.assertIn(12_345, sampled_x)
+            self.assertIn(67_890, sampled_x)
+
+    def test_figure_payload_is_bounded(self):
+        df = benchmark.make_candles(105_120, seed=11)
+        strategy = strategies.SimpleSMALive('BTC/USDT', '5m', 20)
+        strategy.set_data(df)
+        strategy.execute_signals(strategy.compute_signals())
+
+        figure = strategy.plot_figure(max_points=1000)
+        self.assertEqual(figure.data[0].type, 'scattergl')
+        self.assertTrue(all(len(trace.x) <= 1000 for trace in figure.data))
+
+        # Zooming on one day draws its 288 candles at full resolution
+        zoomed = strategies.plot_backtest(strategy.get_plot_data(), 1000,
+                                          ('2022-07-01 00:00:00', '2022-07-01 23:55:00'))
+        self.assertEqual(len(zoomed.data[0].x), 288 + 2)
+        self.assertEqual(list(zoomed.layout.xaxis.range), ['2022-07-01 00:00:00', '2022-07-01 23:55:00'])
+
+    def test_zoom_range_of_relayout_data(self):
+        self.assertIsNone(downsampling.get_x_range({'autosize': True}))
+        self.assertEqual(downsampling.get_x_range({'xaxis2.range': ['a', 'b']}), ('a', 'b'))
+
+class TestSweep(unittest.TestCase):
+    def test_expand_grid_skips_invalid_combinations(self):
+        params = sweep.expand_grid({'short_window': [12, 26], 'long_window': [26, 50], 'signal_window': [9]})
+        self.assertEqual(len(params), 3)
+        self.assertTrue(all(p['short_window'] < p['long_window'] for p in params))
+
+    def test_sweep_matches_single_backtests(self):
+        df = benchmark.make_candles(3000, seed=5)
+        with mock.patch.object(api, 'add_data', lambda name, date: None):
+            results = sweep.run_sweep('SimpleSMA', {'sma': [5, 10, 20, 40]}, data=df, max_workers=2, chunk_size=1)
+
+        self.assertEqual(sorted(results['sma']), [5, 10, 20, 40])
+        self.assertTrue(results['final_value'].is_monotonic_decreasing)
+        for row in results.itertuples():
+            strategy = strategies.SimpleSMALive('BTC/USDT', '5m', row.sma)
+            strategy.set_data(df.copy())
+            expected = sweep.backtest_metrics(df['Close'].to_numpy(), strategy.compute_signals())
+            self.assertEqual(row.final_value, expected['final_value'])
+            self.assertEqual(row.trades, expected['trades'])
+
+    def test_workers_do_not_track_the_shared_memory(self):
+        from multiprocessing import resource_tracker, shared_memory
+
+        shm = shared_memory.SharedMemory(create=True, size=8)
+        self.addCleanup(shm.unlink)
+        self.addCleanup(shm.close)
+        with mock.patch.object(resource_tracker, 'register') as register:
+            attached = sweep.open_shared_memory(shm.name)
+            attached.close()
+        self.assertEqual([call for call in register.call_args_list if call.args[1] == 'shared_memory'], [])
+        self.assertIn(sweep.get_context().get_start_method(), ('forkserver', 'spawn'))
+
+class TestCandleWindow(unittest.TestCase):
+    def candles(self, timestamps, closes):
+        closes = np.asarray(closes, dtype=np.float64)
+        return {'Timestamp': np.asarray(timestamps, dtype=np.int64), 'Open': closes, 'High': closes,
+                'Low': closes, 'Close': closes, 'Volume': np.ones(len(closes))}
+
+    def test_forming_candle_is_updated_in_place(self):
+        window = CandleWindow(3)
+        self.assertEqual(window.update(self.candles([0], [1.0])), [])
+        self.assertEqual(window.update(self.candles([0], [1.5])), [])
+        self.assertEqual(len(window), 1)
+        self.assertEqual(window.get_last(), 1.5)
+
+        self.assertEqual(window.update(self.candles([0, 60], [1.7, 2.0])), [1.7])
+        self.assertEqual(window.update(self.candles([0], [9.0])), [])
+        np.testing.assert_array_equal(window.get_column('Close'), [1.7, 2.0])
+
+    def test_window_keeps_the_last_candles(self):
+        window = CandleWindow(4)
+        buffer = window._columns['Close']
+        closed = []
+        for i in range(10):
+            closed += window.update(self.candles([i * 60, (i + 1) * 60], [i, i + 1]))
+
+        self.assertEqual(closed, list(map(float, range(10))))
+        self.assertEqual(len(window), 4)
+        self.assertIs(window._columns['Close'], buffer)
+        self.assertEqual(window.get_last_timestamp(), 600)
+        np.testing.assert_array_equal(window.get_column('Close'), [7, 8, 9, 10])
+        self.assertEqual(window.to_dataframe()['Timestamp'].iloc[0], pd.Timestamp(420, unit='ms'))
+
+class TestGetOhlcv(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(api, 'add_data', lambda name, date: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = mock.Mock()
+        self.client.fetch_ohlcv.return_value = [[1654905600000, 1.0, 2.0, 0.5, 1.5, 10.0],
+                                                [1654905900000, 1.5, 2.5, 1.0, 2.0, None]]
+
+    def test_candles_are_decoded_by_column(self):
+        df = api.get_ohlcv('BTC/USDT', '5m', client=self.client)
+        self.assertEqual(list(df.columns), ['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
+        self.assertEqual(df['Timestamp'].iloc[1], pd.Timestamp('2022-06-11 00:05:00'))
+        self.assertEqual(df['Close'].tolist(), [1.5, 2.0])
+        self.assertTrue(np.isnan(df['Volume'].iloc[1]))
+
+    def test_arrays_skip_pandas(self):
+        arrays = api.get_ohlcv('BTC/USDT', '5m', client=self.client, arrays=True)
+        self.assertEqual(arrays['Timestamp'].dtype, np.int64)
+        np.testing.assert_array_equal(arrays['Timestamp'], [1654905600000, 1654905900000])
+        np.testing.assert_array_equal(arrays['High'], [2.0, 2.5])
+
+    def test_no_candles(self):
+        self.client.fetch_ohlcv.return_value = []
+        self.assertTrue(api.get_ohlcv('BTC/USDT', '5m', client=self.client).empty)
+
+class TestMarketDataCache(unittest.TestCase):
+    def test_identical_requests_fetch_once_per_candle(self):
+        now = [1654905720.0]
+        calls = []
+
+        def fetch_ohlcv(symbol, timeframe, since=None, limit=None):
+            calls.append(symbol)
+            time.sleep(0.05)
+            return pd.DataFrame({'Close': [1.0]})
+
+        cache = market_data.MarketDataCache(fetch_ohlcv=fetch_ohlcv, clock=lambda: now[0])
+        threads = [threading.Thread(target=cache.get_ohlcv, args=('BTC/USDT', '5m')) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+
+        cache.get_ohlcv('BTC/USDT', '5m')
+        cache.get_ohlcv('ETH/USDT', '5m')
+        self.assertEqual(len(calls), 2)
+
+        now[0] += 300
+        cache.get_ohlcv('BTC/USDT', '5m')
+        self.assertEqual(len(calls), 3)
+
+        stats = cache.get_stats()['ohlcv']
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['hits'] + stats['shared'], 8)
+        self.assertGreaterEqual(stats['hits'], 1)
+
+    def test_balance_calls_are_shared_but_not_kept(self):
+        calls = []
+        release = threading.Event()
+
+        def fetch_balance(client):
+            calls.append(client)
+            release.wait(1)
+            return {'total': {'USDT': 10.0}, 'free': {'USDT': 10.0}, 'used': {'USDT': 0.0}}
+
+        cache = market_data.MarketDataCache(fetch_balance=fetch_balance)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.fetch_balance())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+
+        cache.fetch_balance()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.get_stats()['balance'], {'hits': 0, 'shared': 3, 'misses': 2})
+
+    def test_ticker_is_kept_for_its_ttl(self):
+        now = [1000.0]
+        calls = []
+
+        def fetch_ticker(symbol, client):
+            calls.append(symbol)
+            return {'symbol': symbol, 'last': now[0]}
+
+        cache = market_data.MarketDataCache(fetch_ticker=fetch_ticker, ticker_ttl=2.0, clock=lambda: now[0])
+        self.assertEqual(cache.fetch_ticker('BTC/USDT')['last'], 1000.0)
+        now[0] += 1
+        self.assertEqual(cache.fetch_ticker('BTC/USDT')['last'], 1000.0)
+        now[0] += 1
+        self.assertEqual(cache.fetch_ticker('BTC/USDT')['last'], 1002.0)
+        self.assertEqual(cache.get_stats()['ticker'], {'hits': 1, 'shared': 0, 'misses': 2})
+
+    def test_errors_are_given_to_the_waiting_callers(self):
+        flight = market_data.SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            time.sleep(0.05)
+            raise ValueError("Exchange unavailable")
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(1)
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+class TestBotRunner(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(api, 'add_data', lambda name, date: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bots_run_in_background(self):
+        runner = bot_runner.BotRunner(market_data=lambda *args, **kwargs: None)
+        sources = {'sma': scheduler.KlineEventSource(), 'macd': scheduler.KlineEventSource()}
+
+        with mock.patch.object(strategies.SimpleSMALive, 'calculate_signal', lambda strategy: 0), \
+             mock.patch.object(strategies.MACDLive, 'calculate_signal', lambda strategy: 0):
+            start = time.perf_counter()
+            runner.start_bot('sma', 'BTC/USDT', 'SimpleSMA', '1m', event_source=sources['sma'])
+            runner.start_bot('macd', 'ETH/USDT', 'MACD', '1m', event_source=sources['macd'])
+            self.assertLess(time.perf_counter() - start, 0.1)
+            with self.assertRaises(ValueError):
+                runner.start_bot('sma', 'BTC/USDT', 'SimpleSMA', '1m', event_source=sources['sma'])
+
+            now = int(time.time() * 1000) // 60_000 * 60_000
+            sources['sma'].push(now)
+            sources['sma'].push(now)
+            deadline = time.time() + 2
+            while runner.get_status('sma')['evaluations'] < 2 and time.time() < deadline:
+                time.sleep(0.01)
+
+            self.assertEqual(runner.get_status('sma')['evaluations'], 2)
+            self.assertEqual(runner.get_status('sma')['last_close'], now)
+            self.assertEqual(runner.get_status('macd')['evaluations'], 0)
+            self.assertEqual([status['state'] for status in runner.list_bots()], ['running', 'running'])
+
+            runner.stop_all(wait=True)
+        self.assertEqual([status['state'] for status in runner.list_bots()], ['stopped', 'stopped'])
+
+    def test_failing_bot_is_reported(self):
+        runner = bot_runner.BotRunner(market_data=lambda *args, **kwargs: None)
+        source = scheduler.KlineEventSource()
+        source.push(int(time.time() * 1000))
+
+        def calculate_signal(strategy):
+            raise RuntimeError("exchange unavailable")
+
+        with mock.patch.object(strategies.SimpleSMALive, 'calculate_signal', calculate_signal):
+            runner.start_bot('sma', 'BTC/USDT', 'SimpleSMA', '1m', event_source=source)
+            deadline = time.time() + 2
+            while runner.get_status('sma')['state'] == 'running' and time.time() < deadline:
+                time.sleep(0.01)
+            status = runner.get_status('sma')
+
+        self.assertEqual(status['state'], 'failed')
+        self.assertEqual(status['error'], 'RuntimeError: exchange unavailable')
+
+class FakeExchange:
+    """
+    Local stand-in for a ccxt exchange serving a deterministic candle series.
+    """
+    def __init__(self, now, missing=(), rate_limit=50, latency=0):
+        self.id = 'fake'
+        self.rateLimit = rate_limit
+        self.now = now
+        self.missing = set(missing)
+        self.latency = latency
+        self.calls = []
+        self.call_times = []
+
+    def milliseconds(self):
+        return self.now
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        self.calls.append((symbol, timeframe, since, limit))
+        self.call_times.append(time.monotonic())
+        time.sleep(self.latency)
+        duration = timeframe_to_milliseconds(timeframe)
+        timestamp = -(-since // duration) * duration
+        candles = []
+        while timestamp <= self.now and len(candles) < (limit or 1000):
+            if timestamp not in self.missing:
+                price = float(timestamp // duration % 1000)
+                candles.append([timestamp, price, price + 1, price - 1, price + 0.5, 1.0])
+            timestamp += duration
+        return candles
+
+class TestSyncHistoricalData(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved = api.exchange, api.candle_store, api.add_data
+        self.minute = 60_000
+        self.exchange = FakeExchange(now=5000 * self.minute + 30_000)
+        api.exchange = self.exchange
+        api.candle_store = CandleStore(self._tmp.name)
+        api.add_data = lambda name, date: None
+
+    def tearDown(self):
+        api.exchange, api.candle_store, api.add_data = self._saved
+        self._tmp.cleanup()
+
+    def test_only_missing_candles_are_fetched(self):
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 0, 1500 * self.minute), 1500)
+        self.assertEqual(len(self.exchange.calls), 2)
+
+        self.exchange.calls.clear()
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 100 * self.minute, 1500 * self.minute), 0)
+        self.assertEqual(self.exchange.calls, [])
+
+        # Growing window: only the tail up to the last closed candle is downloaded
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 0), 3500)
+        self.assertEqual(self.exchange.calls[0][2], 1500 * self.minute)
+        self.assertEqual(api.candle_store.get_range('fake', 'BTC/USDT', '1m'), (0, 4999 * self.minute))
+
+    def test_gaps_are_filled(self):
+        api.candle_store.write('fake', 'BTC/USDT', '1m', [], covered=[(0, 100 * self.minute)])
+        api.candle_store.write('fake', 'BTC/USDT', '1m', [], covered=[(200 * self.minute, 300 * self.minute)])
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 0, 300 * self.minute), 100)
+        self.assertEqual([call[2] for call in self.exchange.calls], [100 * self.minute])
+
+    def test_exchange_holes_are_not_refetched(self):
+        self.exchange.missing = {i * self.minute for i in range(10, 20)}
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 0, 100 * self.minute), 90)
+        self.exchange.calls.clear()
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 0, 100 * self.minute), 0)
+        self.assertEqual(self.exchange.calls, [])
+
+    def test_range_after_an_empty_page_stays_missing(self):
+        # The second page comes back empty: the untried end of the range is not covered
+        self.exchange.missing = {i * self.minute for i in range(1000, 1500)}
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 0, 1500 * self.minute), 1000)
+        self.assertEqual(api.candle_store.get_missing_ranges('fake', 'BTC/USDT', '1m', 0, 1500 * self.minute),
+                         [(1000 * self.minute, 1500 * self.minute)])
+
+        self.exchange.missing = set()
+        self.exchange.calls.clear()
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1m', 0, 1500 * self.minute), 500)
+        self.assertEqual([call[2] for call in self.exchange.calls], [1000 * self.minute])
+
+class TestResample(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved = api.exchange, api.candle_store, api.add_data
+        self.minute = 60_000
+        self.exchange = FakeExchange(now=600 * self.minute + 30_000)
+        api.exchange = self.exchange
+        api.candle_store = CandleStore(self._tmp.name)
+        api.add_data = lambda name, date: None
+
+    def tearDown(self):
+        api.exchange, api.candle_store, api.add_data = self._saved
+        self._tmp.cleanup()
+
+    def test_higher_timeframe_is_computed_from_the_store(self):
+        api.sync_historical_data('BTC/USDT', '5m', 0, 600 * self.minute)
+        self.exchange.calls.clear()
+
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1h', 0, 600 * self.minute), 0)
+        self.assertEqual(self.exchange.calls, [])
+
+        hours = api.candle_store.read('fake', 'BTC/USDT', '1h')
+        base = api.candle_store.read('fake', 'BTC/USDT', '5m')
+        self.assertEqual(len(hours['Timestamp']), 10)
+        np.testing.assert_array_equal(hours['Timestamp'], np.arange(10) * 60 * self.minute)
+        np.testing.assert_array_equal(hours['Open'], base['Open'][::12])
+        np.testing.assert_array_equal(hours['Close'], base['Close'][11::12])
+        np.testing.assert_array_equal(hours['High'], base['High'].reshape(10, 12).max(axis=1))
+        np.testing.assert_array_equal(hours['Low'], base['Low'].reshape(10, 12).min(axis=1))
+        np.testing.assert_array_equal(hours['Volume'], np.full(10, 12.0))
+        self.assertEqual(api.candle_store.get_missing_ranges('fake', 'BTC/USDT', '1h', 0, 600 * self.minute), [])
+
+    def test_only_whole_candles_are_computed(self):
+        api.sync_historical_data('BTC/USDT', '5m', 0, 90 * self.minute)
+        self.exchange.calls.clear()
+
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1h', 0, 180 * self.minute), 2)
+        self.assertEqual([call[1:3] for call in self.exchange.calls], [('1h', 60 * self.minute)])
+        self.assertEqual(api.candle_store.read('fake', 'BTC/USDT', '1h')['Volume'].tolist(), [12.0, 1.0, 1.0])
+
+    def test_weeks_are_computed_on_the_grid_of_the_store(self):
+        day = 86_400_000
+        monday = pd.Timestamp('2022-06-13').value // 10**6
+        self.exchange.now = monday + 28 * day + day // 2
+        api.sync_historical_data('BTC/USDT', '1d', monday)
+        self.exchange.calls.clear()
+
+        self.assertEqual(api.sync_historical_data('BTC/USDT', '1w', monday), 0)
+        self.assertEqual(self.exchange.calls, [])
+        weeks = api.candle_store.read('fake', 'BTC/USDT', '1w')
+        self.assertEqual(weeks['Timestamp'].tolist(), [monday + i * 7 * day for i in range(4)])
+        self.assertEqual(weeks['Volume'].tolist(), [7.0] * 4)
+        self.assertEqual(api.get_missing_ranges('BTC/USDT', '1w', monday), [])
+
+    def test_weeks_start_on_monday(self):
+        monday = pd.Timestamp('2022-06-13').value // 10**6
+        candles = {'Timestamp': np.array([monday - 86_400_000, monday, monday + 86_400_000]),
+                   'Open': [1.0, 2.0, 3.0], 'High': [1.0, 2.0, 3.0], 'Low': [1.0, 2.0, 3.0],
+                   'Close': [1.0, 2.0, 3.0], 'Volume': [1.0, 1.0, 1.0]}
+        weeks = candle_store.resample_candles(candles, '1w')
+        self.assertEqual(weeks['Timestamp'].tolist(), [monday - 7 * 86_400_000, monday])
+        self.assertEqual(weeks['Open'].tolist(), [1.0, 2.0])
+        self.assertFalse(candle_store.can_resample('1d', '1M'))
+
+class TestBacktestCache(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        api.create_database()
+        self._saved = api.exchange, api.candle_store, api.add_data
+        self.exchange = FakeExchange(now=2000 * 60_000)
+        api.exchange = self.exchange
+        api.candle_store = CandleStore('candles')
+        api.add_data = lambda name, date: None
+        strategy_gestion.backtest_cache.clear()
+
+    def tearDown(self):
+        api.exchange, api.candle_store, api.add_data = self._saved
+        strategy_gestion.backtest_cache.clear()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_identical_backtests_are_computed_once(self):
+        with mock.patch.object(strategies.BaseStrategy, 'run_backtest', autospec=True,
+                               side_effect=strategies.BaseStrategy.run_backtest) as run_backtest:
+            figure = strategy_gestion.backtest(10, '1m', 'BTC/USDT', 'SimpleSMA', 0)
+            self.assertIs(strategy_gestion.backtest(10, '1m', 'BTC/USDT', 'SimpleSMA', 0), figure)
+            self.assertEqual(run_backtest.call_count, 1)
+
+            strategy_gestion.backtest(20, '1m', 'BTC/USDT', 'SimpleSMA', 0)
+            self.assertEqual(run_backtest.call_count, 2)
+
+            # New candles in the store invalidate the previous results
+            self.exchange.now += 5 * 60_000
+            self.assertIsNot(strategy_gestion.backtest(10, '1m', 'BTC/USDT', 'SimpleSMA', 0), figure)
+            self.assertEqual(run_backtest.call_count, 3)
+
+        self.assertEqual(len(strategy_gestion.backtest_cache), 1)
+        entry = next(iter(strategy_gestion.backtest_cache.values()))
+        self.assertEqual(len(entry['equity']), 2005)
+        self.assertGreater(len(entry['trades']), 0)
+        self.assertEqual(len(api.get_equity_curve(entry['run_id'])), len(entry['trades']) + 2)
+
+class TestFetchHistoricalData(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved = api.exchange, api.candle_store, api.add_data
+        self.minute = 60_000
+        self.exchange = FakeExchange(now=3000 * self.minute, rate_limit=10, latency=0.05)
+        api.exchange = self.exchange
+        api.candle_store = CandleStore(self._tmp.name)
+        api.add_data = lambda name, date: None
+        market_data._rate_limiters.clear()
+
+    def tearDown(self):
+        api.exchange, api.candle_store, api.add_data = self._saved
+        market_data._rate_limiters.clear()
+        self._tmp.cleanup()
+
+    def test_universe_is_fetched_concurrently_within_rate_limit(self):
+        pairs = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+        start = time.monotonic()
+        downloaded, failed = market_data.warm_universe(pairs, ['1m', '5m'], 0)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(downloaded[('ETH/USDT', '1m')], 3000)
+        self.assertEqual(downloaded[('SOL/USDT', '5m')], 600)
+        self.assertEqual(failed, {})
+        self.assertEqual(len(self.exchange.calls), 12)
+        # Serially, the latency alone would take 12 * 50 ms
+        self.assertLess(elapsed, 0.4)
+        # ... while the calls are still spread by the 10 ms rate limit
+        call_times = sorted(self.exchange.call_times)
+        self.assertGreaterEqual(call_times[-1] - call_times[0], 0.9 * 11 * 0.010)
+
+        self.exchange.calls.clear()
+        self.assertEqual(market_data.warm_universe(pairs, ['1m', '5m'], 0)[0][('BTC/USDT', '1m')], 0)
+        self.assertEqual(self.exchange.calls, [])
+
+    def test_failed_page_does_not_lose_the_others(self):
+        fetch_ohlcv = self.exchange.fetch_ohlcv
+
+        def failing_fetch_ohlcv(symbol, timeframe='1m', since=None, limit=None):
+            if symbol == 'ETH/USDT' and since == 1000 * self.minute:
+                raise ConnectionError("connection reset")
+            return fetch_ohlcv(symbol, timeframe, since, limit)
+
+        self.exchange.fetch_ohlcv = failing_fetch_ohlcv
+        downloaded, failed = market_data.warm_universe(['BTC/USDT', 'ETH/USDT'], ['1m'], 0)
+
+        self.assertEqual(downloaded, {('BTC/USDT', '1m'): 3000, ('ETH/USDT', '1m'): 2000})
+        self.assertEqual(failed, {('ETH/USDT', '1m'): [(1000 * self.minute, 2000 * self.minute,
+                                                         'ConnectionError: connection reset')]})
+        self.assertEqual(api.candle_store.get_missing_ranges('fake', 'ETH/USDT', '1m', 0, 3000 * self.minute),
+                         [(1000 * self.minute, 2000 * self.minute)])
+
+        # The next call only fetches the failed page
+        self.exchange.fetch_ohlcv = fetch_ohlcv
+        self.exchange.calls.clear()
+        self.assertEqual(market_data.warm_universe(['BTC/USDT', 'ETH/USDT'], ['1m'], 0)[0],
+                         {('BTC/USDT', '1m'): 0, ('ETH/USDT', '1m'): 1000})
+        self.assertEqual([call[:3] for call in self.exchange.calls], [('ETH/USDT', '1m', 1000 * self.minute)])
+
+    def test_token_bucket_rate(self):
+        bucket = market_data.TokenBucket(rate=200)
+        start = time.monotonic()
+        for _ in range(21):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.095)
+
+class TestCandleStore(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.store = CandleStore(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_merge_and_slice(self):
+        minute = 60_000
+        self.store.write('mexc', 'BTC/USDT', '1m', [[i * minute, 1, 2, 0.5, i, 10] for i in range(0, 10)])
+        length = self.store.write('mexc', 'BTC/USDT', '1m', [[i * minute, 1, 2, 0.5, -i, 10] for i in range(5, 15)])
+        self.assertEqual(length, 15)
+
+        candles = self.store.read('mexc', 'BTC/USDT', '1m', since=3 * minute, until=7 * minute)
+        self.assertEqual(candles['Timestamp'].dtype, np.int64)
+        self.assertEqual(list(candles['Close']), [3, 4, -5, -6])
+        self.assertEqual(self.store.get_range('mexc', 'BTC/USDT', '1m'), (0, 14 * minute))
+
+    def test_load_dataframe(self):
+        df = benchmark.make_candles(100)
+        self.store.write('mexc', 'BTC/USDT', '5m', df.assign(Timestamp=pd.to_datetime(df['Timestamp'])))
+        loaded = self.store.load('mexc', 'BTC/USDT', '5m', since='2022-06-11 01:00:00')
+        self.assertEqual(len(loaded), 88)
+        self.assertEqual(str(loaded['Timestamp'].iloc[0]), '2022-06-11 01:00:00')
+        np.testing.assert_array_equal(loaded['Close'].to_numpy(), df['Close'].to_numpy()[12:])
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()